@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+# Typed assets with __slots__ for the block-* and span-* objects of the converter. With TYPED_ASSETS=1 the
+# converters in helpers.py build these objects instead of dicts. Every asset is also a view with the dict API
+# (asset['text'], asset['text'] = ..., keys(), == with dicts), so merge_spans, custom converters and the callers
+# of json_from_markdown work with both. Callers which need real dicts, like json.dumps(), get them from
+# to_plain(). write_json() writes assets into a byte buffer without turning them into dicts first and gives the
+# same bytes as fast_json.dumps().
+import itertools
+import operator
+import os
+import fast_json
+
+TYPED_ASSETS = os.environ.get("TYPED_ASSETS", "0") == "1"
+
+
+class Asset:
+    __slots__ = ()
+    __getitem__ = object.__getattribute__
+    __setitem__ = object.__setattr__
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__
+
+    def as_dict(self) -> dict:
+        # Nested assets become dicts as well.
+        return to_plain(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Asset):
+            other = other.as_dict()
+        elif type(other) is not dict:
+            return NotImplemented
+        return self.as_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.as_dict())
+
+
+class TextSpan(Asset):
+    __slots__ = ("type", "text")
+
+    def __init__(self, span_type: str, text: str):
+        self.type = span_type
+        self.text = text
+
+
+class ListingSpan(Asset):
+    __slots__ = ("type", "listing_text")
+
+    def __init__(self, listing_text: str):
+        self.type = "span-listing"
+        self.listing_text = listing_text
+
+
+class ContainerSpan(Asset):
+    __slots__ = ("type", "spans")
+
+    def __init__(self, spans: list, span_type: str = "span-container"):
+        self.type = span_type
+        self.spans = spans
+
+
+class LinkSpan(Asset):
+    __slots__ = ("type", "link_text", "url")
+
+    def __init__(self, link_text: str, url: str, span_type: str = "span-link"):
+        self.type = span_type
+        self.link_text = link_text
+        self.url = url
+
+
+class PathSpan(Asset):
+    __slots__ = ("type", "path")
+
+    def __init__(self, path: str):
+        self.type = "span-path"
+        self.path = path
+
+
+class ProgramSpan(Asset):
+    __slots__ = ("type", "program_name")
+
+    def __init__(self, program_name: str):
+        self.type = "span-program"
+        self.program_name = program_name
+
+
+class AbbreviationSpan(Asset):
+    __slots__ = ("type", "abbreviation", "long_name")
+
+    def __init__(self, abbreviation: str, long_name: str):
+        self.type = "span-abbreviation"
+        self.abbreviation = abbreviation
+        self.long_name = long_name
+
+
+class MathmlSpan(Asset):
+    __slots__ = ("type", "formula")
+
+    def __init__(self, formula: str):
+        self.type = "span-mathml"
+        self.formula = formula
+
+
+class CtLinkSpan(Asset):
+    __slots__ = ("type",)
+
+    def __init__(self):
+        self.type = "span-ct-link"
+
+
+class ImageBlock(Asset):
+    __slots__ = ("type", "image_uri", "caption", "alt")
+
+    def __init__(self, image_uri: str, caption: list, alt: str):
+        self.type = "block-image"
+        self.image_uri = image_uri
+        self.caption = caption
+        self.alt = alt
+
+
+class ParagraphBlock(Asset):
+    __slots__ = ("type", "spans")
+
+    def __init__(self, spans: list):
+        self.type = "block-paragraph"
+        self.spans = spans
+
+
+class HeadingBlock(Asset):
+    __slots__ = ("type", "heading")
+
+    def __init__(self, block_type: str, heading: str):
+        self.type = block_type
+        self.heading = heading
+
+
+class CitationBlock(Asset):
+    __slots__ = ("type", "statement", "attribution")
+
+    def __init__(self, statement: str, attribution: str):
+        self.type = "block-citation"
+        self.statement = statement
+        self.attribution = attribution
+
+
+class ListBlock(Asset):
+    __slots__ = ("type", "items")
+
+    def __init__(self, block_type: str, items: list):
+        self.type = block_type
+        self.items = items
+
+
+class ListingBlock(Asset):
+    __slots__ = ("type", "language", "code")
+
+    def __init__(self, language: str, code: str):
+        self.type = "block-listing"
+        self.language = language
+        self.code = code
+
+
+def text_span(span_type: str, text: str):
+    if span_type == "span-listing":
+        return ListingSpan(text)
+    return TextSpan(span_type, text)
+
+
+# The dict factories of the same name in helpers.py which these replace.
+TYPED_FACTORIES = {
+    "create_span": text_span,
+    "container_span": ContainerSpan,
+    "link_span": LinkSpan,
+    "path_span": PathSpan,
+    "program_span": ProgramSpan,
+    "abbreviation_span": AbbreviationSpan,
+    "mathml_span": MathmlSpan,
+    "ct_link_span": CtLinkSpan,
+    "image_block": ImageBlock,
+    "paragraph_block": ParagraphBlock,
+    "heading_block": HeadingBlock,
+    "citation_block": CitationBlock,
+    "list_block": ListBlock,
+    "listing_block": ListingBlock
+}
+ASSET_CLASSES = [TextSpan, ListingSpan, ContainerSpan, LinkSpan, PathSpan, ProgramSpan, AbbreviationSpan,
+                 MathmlSpan, CtLinkSpan, ImageBlock, ParagraphBlock, HeadingBlock, CitationBlock, ListBlock,
+                 ListingBlock]
+# Per class: the keys with the bytes in front of their values and a getter for all values.
+ASSET_LAYOUTS = {asset_class: (tuple((b"{" if i == 0 else b",") + fast_json.dumps(key) + b":"
+                                     for i, key in enumerate(asset_class.__slots__)),
+                               operator.attrgetter(*asset_class.__slots__) if len(asset_class.__slots__) > 1
+                               else (lambda asset, key=asset_class.__slots__[0]: (getattr(asset, key),)))
+                 for asset_class in ASSET_CLASSES}
+TEXT_PREFIXES = {}
+encode_string = fast_json.orjson.dumps if fast_json.orjson is not None else fast_json.dumps
+SCALARS = {True: b"true", False: b"false", None: b"null"}
+
+
+def plain_copy(value):
+    # An empty plain copy of a list, dict or asset and its (key, item) pairs, or None for any other value.
+    if type(value) is list:
+        return [None] * len(value), enumerate(value)
+    if type(value) is dict:
+        return {}, iter(value.items())
+    if isinstance(value, Asset):
+        return {}, ((key, getattr(value, key)) for key in value.__slots__)
+    return None
+
+
+def to_plain(value):
+    # Copies lists, dicts and assets with plain lists and dicts, on an explicit stack like write_json().
+    root = [value]
+    frames = [(root, enumerate(root))]
+    while len(frames) > 0:
+        copy, items = frames.pop()
+        for key, item in items:
+            item_copy = plain_copy(item)
+            if item_copy is None:
+                copy[key] = item
+                continue
+            copy[key] = item_copy[0]
+            frames.append((copy, items))
+            frames.append(item_copy)
+            break
+    return root[0]
+
+
+def key_bytes(key) -> bytes:
+    # Keys which are no strings (YAML allows numbers) become strings like in fast_json.dumps.
+    if type(key) is not str:
+        key = fast_json.dumps(key).decode('utf-8').strip('"')
+    return fast_json.dumps(key)
+
+
+def write_json(value, out: bytearray) -> None:
+    # Nested lists, dicts and assets go on an explicit stack of (prefix, item) iterators and their closing bytes.
+    frames = [(iter(((b"", value),)), b"")]
+    while len(frames) > 0:
+        items, closing = frames[-1]
+        for prefix, item in items:
+            out += prefix
+            item_type = type(item)
+            if item_type is str:
+                out += encode_string(item)
+            elif item_type is TextSpan:
+                # Most assets are text spans: one prefix per span type and no frame.
+                text_prefix = TEXT_PREFIXES.get(item.type)
+                if text_prefix is None:
+                    text_prefix = TEXT_PREFIXES[item.type] = b'{"type":' + fast_json.dumps(item.type) + b',"text":'
+                out += text_prefix
+                out += encode_string(item.text)
+                out += b"}"
+            elif item_type is list:
+                if len(item) == 0:
+                    out += b"[]"
+                    continue
+                out += b"["
+                frames.append((zip(itertools.chain((b"",), itertools.repeat(b",")), item), b"]"))
+                break
+            elif item_type in ASSET_LAYOUTS:
+                prefixes, getter = ASSET_LAYOUTS[item_type]
+                frames.append((zip(prefixes, getter(item)), b"}"))
+                break
+            elif item_type is dict:
+                if len(item) == 0:
+                    out += b"{}"
+                    continue
+                frames.append((((("{" if i == 0 else ",").encode() + key_bytes(key) + b":", dict_value)
+                                 for i, (key, dict_value) in enumerate(item.items())), b"}"))
+                break
+            elif item_type is bool or item is None:
+                out += SCALARS[item]
+            else:
+                out += fast_json.dumps(item)
+        else:
+            frames.pop()
+            out += closing
+
+
+def dumps(value) -> bytes:
+    out = bytearray()
+    write_json(value, out)
+    return bytes(out)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import compact_ast
+import os
+import threading
+from pandoc_backend import convert_markdown
+from block_chunks import can_be_joined, join_chunks, split_blocks
+
+PANDOC_BATCHING = os.environ.get("PANDOC_BATCHING", "0") == "1"
+PANDOC_BATCH_WINDOW = float(os.environ.get("PANDOC_BATCH_WINDOW", "0.005"))  # seconds
+PANDOC_BATCH_SIZE = int(os.environ.get("PANDOC_BATCH_SIZE", "32"))
+PANDOC_BATCH_MAX_BYTES = int(os.environ.get("PANDOC_BATCH_MAX_BYTES", str(16 * 1024)))  # bigger alone, 0 disables
+
+
+class Batch:
+    def __init__(self):
+        self.markdowns = []
+        self.results = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+# The first request of a batch waits for the window to pass (or the batch to fill up) and converts
+# all markdowns which arrived in the meantime with one pandoc run. The other requests wait for its result.
+# Markdowns of more than max_bytes are converted alone right away: Their pandoc run would hold up the small ones.
+# There is one batcher per process, so only requests handled by threads of the same process share runs.
+class MicroBatcher:
+    def __init__(self, window: float = 0.005, max_batch: int = 32, convert=None, max_bytes: int = 0):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.convert_function = convert if convert is not None else convert_markdown
+        self.batches = 0
+        self.documents = 0
+        self.fallbacks = 0
+        self.fill_counts = {}
+        self._open_batch = None  # type: Batch
+        self._lock = threading.Lock()
+
+    def is_too_big(self, markdown: str) -> bool:
+        if self.max_bytes <= 0:
+            return False
+        return len(markdown) > self.max_bytes or len(markdown.encode('utf-8')) > self.max_bytes
+
+    def convert(self, markdown: str) -> dict:
+        if self.is_too_big(markdown) or not can_be_joined(markdown):
+            return compact_ast.loads_tree(self.convert_function(markdown))
+        with self._lock:
+            batch = self._open_batch
+            leader = batch is None
+            if leader:
+                batch = Batch()
+                self._open_batch = batch
+            index = len(batch.markdowns)
+            batch.markdowns.append(markdown)
+            if len(batch.markdowns) >= self.max_batch:
+                self._open_batch = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open_batch is batch:
+                    self._open_batch = None
+            self._run(batch)
+        else:
+            batch.done.wait()
+        result = batch.results[index]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _convert_single(self, markdown: str):
+        try:
+            return compact_ast.loads_tree(self.convert_function(markdown))
+        except Exception as error:
+            return error
+
+    def _run(self, batch: Batch) -> None:
+        try:
+            if len(batch.markdowns) == 1:
+                batch.results = [self._convert_single(batch.markdowns[0])]
+                return
+            joined_markdown, separator = join_chunks(batch.markdowns)
+            try:
+                pandoc_tree = compact_ast.loads_tree(self.convert_function(joined_markdown))
+                document_blocks = split_blocks(pandoc_tree['blocks'], separator)
+            except Exception:
+                document_blocks = []
+            if len(document_blocks) != len(batch.markdowns):
+                with self._lock:
+                    self.fallbacks += 1
+                batch.results = [self._convert_single(markdown) for markdown in batch.markdowns]
+                return
+            batch.results = [{"pandoc-api-version": pandoc_tree["pandoc-api-version"],
+                              "meta": pandoc_tree["meta"],
+                              "blocks": blocks} for blocks in document_blocks]
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.documents += len(batch.markdowns)
+                self.fill_counts[len(batch.markdowns)] = self.fill_counts.get(len(batch.markdowns), 0) + 1
+            batch.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"batches": self.batches,
+                    "documents": self.documents,
+                    "fallbacks": self.fallbacks,
+                    "mean_fill": self.documents / (self.batches * self.max_batch) if self.batches > 0 else 0.0,
+                    "fill_counts": {str(size): count for size, count in sorted(self.fill_counts.items())}}
+
+
+pandoc_batcher = MicroBatcher(PANDOC_BATCH_WINDOW, PANDOC_BATCH_SIZE, max_bytes=PANDOC_BATCH_MAX_BYTES)
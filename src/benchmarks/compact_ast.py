@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Compares the dict form and the compact form of the pandoc AST on the example corpus repeated [copies]
+# times. Every form runs in a new process, which reports the time to parse pandoc's JSON, the time to
+# convert the tree, the memory of the tree and the peak RSS of the process.
+#   python benchmarks/compact_ast.py [copies]
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import compact_ast  # noqa: E402
+import fast_json  # noqa: E402
+from helpers import json_from_pandoc_tree  # noqa: E402
+from pandoc_backend import convert_markdown  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+CORPUS = [os.path.join(TESTS, "examples", "1.md"), os.path.join(TESTS, "mixed_document.md")]
+
+
+def measure(form: str, json_path: str) -> None:
+    with open(json_path, "rb") as json_file:
+        pandoc_json = json_file.read()
+    loads = compact_ast.loads if form == "compact" else fast_json.loads
+    start = time.perf_counter()
+    pandoc_tree = loads(pandoc_json)
+    parsed = time.perf_counter()
+    json_from_pandoc_tree(pandoc_tree)
+    converted = time.perf_counter()
+    del pandoc_tree
+    tracemalloc.start()
+    pandoc_tree = loads(pandoc_json)
+    tree_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("{:<8} parse {:6.3f} s  convert {:6.3f} s  tree {:6.1f} MiB  peak RSS {:6.1f} MiB".format(
+        form, parsed - start, converted - parsed, tree_bytes / 2 ** 20,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main(copies: int) -> None:
+    markdown = "\n\n".join(open(path).read() for path in CORPUS for _ in range(copies))
+    with tempfile.NamedTemporaryFile(suffix=".json") as json_file:
+        json_file.write(convert_markdown(markdown))
+        json_file.flush()
+        print("{} copies, {:.1f} MiB of markdown".format(copies, len(markdown) / 2 ** 20))
+        for form in ["dict", "compact"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", form, json_file.name], check=True)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
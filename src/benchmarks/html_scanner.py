@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Times the html scanner against the regular expressions it replaced on tags with a long attribute, on
+# long magic comments and on long comments which are not empty. The time per character has to stay constant.
+#   python benchmarks/html_scanner.py [max_length]
+import os
+import re
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from html_scanner import scan_tag, is_empty_comment, magic_comment_text  # noqa: E402
+
+HTML_TAG_REGEX = re.compile(r"^<(?P<end_tag>/)?(?P<tag_name>[\w\-_]+)" +
+                            r"(?P<properties>( [\w\-_]+=\"[^\"]+\"))?(?P<empty_tag>[ ]?/)?>$")
+EMPTY_COMMENT_REGEX = re.compile(r"^<!---\s*-->$")
+MAGIC_COMMENT_REGEX = re.compile(r"^<!---(?P<yaml>[\s\S]*?)-->$")
+
+
+def attribute(length: int) -> str:
+    return '<mi mathvariant="' + "normal " * (length // 7) + '">'
+
+
+def broken_attribute(length: int) -> str:
+    return '<mi mathvariant="' + "normal " * (length // 7) + '" />x'
+
+
+def magic_comment(length: int) -> str:
+    return "<!---\n" + "key: value -->\n" * (length // 15) + "-->"
+
+
+def blank_comment(length: int) -> str:
+    return "<!---" + " " * length + "x-->"
+
+
+def main(max_length: int) -> None:
+    for name, create, regex_function, scanner_function in [
+            ("attribute", attribute, HTML_TAG_REGEX.match, scan_tag),
+            ("broken attribute", broken_attribute, HTML_TAG_REGEX.match, scan_tag),
+            ("magic comment", magic_comment, MAGIC_COMMENT_REGEX.match, magic_comment_text),
+            ("blank comment", blank_comment, EMPTY_COMMENT_REGEX.match, is_empty_comment)]:
+        length = 1000
+        while length <= max_length:
+            raw = create(length)
+            times = []
+            for function in [regex_function, scanner_function]:
+                start = time.perf_counter()
+                for _ in range(100):
+                    function(raw)
+                times.append((time.perf_counter() - start) / 100)
+            print("{:<18}{:>9} chars: regex {:9.2f} µs  scanner {:9.2f} µs".format(
+                name, length, times[0] * 1e6, times[1] * 1e6))
+            length *= 10
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Compares the normal conversion with LOW_MEMORY_CONVERSION=1 on the example corpus repeated [copies]
+# times. Every mode runs in a new process, which reports the time to parse and convert pandoc's JSON and
+# the peak RSS of the process.
+#   python benchmarks/low_memory.py [copies]
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import json_from_pandoc_tree, loads_pandoc_tree, LOW_MEMORY_CONVERSION  # noqa: E402
+from pandoc_backend import convert_markdown  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+CORPUS = [os.path.join(TESTS, "examples", "1.md"), os.path.join(TESTS, "mixed_document.md")]
+
+
+def measure(json_path: str) -> None:
+    with open(json_path, "rb") as json_file:
+        pandoc_json = json_file.read()
+    start = time.perf_counter()
+    json_from_pandoc_tree(loads_pandoc_tree(pandoc_json))
+    converted = time.perf_counter()
+    print("{:<10} convert {:6.3f} s  peak RSS {:6.1f} MiB".format(
+        "low-memory" if LOW_MEMORY_CONVERSION else "normal", converted - start,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main(copies: int) -> None:
+    markdown = "\n\n".join(open(path).read() for path in CORPUS for _ in range(copies))
+    with tempfile.NamedTemporaryFile(suffix=".json") as json_file:
+        json_file.write(convert_markdown(markdown))
+        json_file.flush()
+        print("{} copies, {:.1f} MiB of markdown".format(copies, len(markdown) / 2 ** 20))
+        for low_memory in ["0", "1"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", json_file.name],
+                           env=dict(os.environ, LOW_MEMORY_CONVERSION=low_memory), check=True)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Times convert_list on a single paragraph with a growing number of words. Each word and each space becomes
+# a span which is merged into one, so the time per word has to stay constant. The formatted paragraph wraps
+# every word in eight levels of emphasis and quotes.
+#   python benchmarks/merge_spans.py [max_words]
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import convert_list  # noqa: E402
+
+
+def paragraph(words: int) -> list:
+    inlines = []
+    for i in range(words):
+        if i > 0:
+            inlines.append({'t': 'Space'})
+        inlines.append({'t': 'Str', 'c': "word" + str(i)})
+        if i % 10 == 9:
+            inlines.append({'t': 'Code', 'c': [["", [], []], "code"]})
+    return inlines
+
+
+def formatted_paragraph(words: int) -> list:
+    inlines = []
+    for i in range(words):
+        node = {'t': 'Str', 'c': "word" + str(i)}
+        for level in range(8):
+            if level % 3 == 2:
+                node = {'t': 'Quoted', 'c': [{'t': 'DoubleQuote'}, [node, {'t': 'Space'}]]}
+            else:
+                node = {'t': ['Strong', 'Emph'][level % 3], 'c': [node, {'t': 'Space'}]}
+        inlines += [node, {'t': 'Space'}]
+    return inlines
+
+
+def main(max_words: int) -> None:
+    for name, create in [("plain", paragraph), ("formatted", formatted_paragraph)]:
+        words = 1000
+        while words <= max_words:
+            inlines = create(words)
+            start = time.perf_counter()
+            convert_list(inlines, [])
+            seconds = time.perf_counter() - start
+            print("{:<10}{:>8} words: {:8.3f} s  {:6.2f} µs/word".format(name, words, seconds, seconds / words * 1e6))
+            words *= 10
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
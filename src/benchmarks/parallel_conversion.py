@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Compares the serial conversion of the example corpus repeated [copies] times, including pandoc, with the
+# conversion of its segments in a pool of PARALLEL_WORKERS processes (default: one per CPU). Every mode runs
+# in a new process, which checks that the output is the same.
+#   python benchmarks/parallel_conversion.py [copies]
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fast_json  # noqa: E402
+from helpers import json_from_markdown, PARALLEL_CONVERSION_BYTES, PARALLEL_WORKERS  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+CORPUS = [os.path.join(TESTS, "examples", "1.md"), os.path.join(TESTS, "mixed_document.md")]
+
+
+def measure(markdown_path: str) -> None:
+    with open(markdown_path, "rb") as markdown_file:
+        markdown = markdown_file.read()
+    start = time.perf_counter()
+    assets = json_from_markdown(markdown)
+    converted = time.perf_counter()
+    print("{:<22} convert {:6.3f} s  output {}".format(
+        "parallel, {} workers".format(PARALLEL_WORKERS) if PARALLEL_CONVERSION_BYTES > 0 else "serial",
+        converted - start, hashlib.sha256(fast_json.dumps(assets)).hexdigest()[:12]))
+
+
+def main(copies: int) -> None:
+    markdown = "\n\n".join(open(path).read() for path in CORPUS for _ in range(copies))
+    with tempfile.NamedTemporaryFile(suffix=".md") as markdown_file:
+        markdown_file.write(markdown.encode('utf-8'))
+        markdown_file.flush()
+        print("{} copies, {:.1f} MiB of markdown, {} CPUs".format(copies, len(markdown) / 2 ** 20, os.cpu_count()))
+        for threshold in ["0", "1"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", markdown_file.name],
+                           env=dict(os.environ, PARALLEL_CONVERSION_BYTES=threshold), check=True)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Compares the conversion of the example corpus repeated [copies] times with and without PIPELINED_PARSING,
+# from the markdown to the last asset including pandoc. Every mode runs in a new process, which reports the
+# time until the first and the last asset and the peak RSS of the process.
+#   python benchmarks/pipelined_parsing.py [copies]
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import iter_json_from_markdown, PIPELINED_PARSING  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+CORPUS = [os.path.join(TESTS, "examples", "1.md"), os.path.join(TESTS, "mixed_document.md")]
+
+
+def measure(markdown_path: str) -> None:
+    with open(markdown_path, "rb") as markdown_file:
+        markdown = markdown_file.read()
+    start = time.perf_counter()
+    assets = iter_json_from_markdown(markdown)
+    next(assets)
+    first = time.perf_counter()
+    for _ in assets:
+        pass
+    last = time.perf_counter()
+    print("{:<10} first asset {:6.3f} s  last asset {:6.3f} s  peak RSS {:6.1f} MiB".format(
+        "pipelined" if PIPELINED_PARSING else "normal", first - start, last - start,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main(copies: int) -> None:
+    markdown = "\n\n".join(open(path).read() for path in CORPUS for _ in range(copies))
+    with tempfile.NamedTemporaryFile(suffix=".md") as markdown_file:
+        markdown_file.write(markdown.encode('utf-8'))
+        markdown_file.flush()
+        print("{} copies, {:.1f} MiB of markdown".format(copies, len(markdown) / 2 ** 20))
+        for pipelined in ["0", "1"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", markdown_file.name],
+                           env=dict(os.environ, PIPELINED_PARSING=pipelined), check=True)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Times consume_str, convert_list_text_only (a long block-citation) and convert_list_xml (a big formula)
+# with a growing number of elements. The time per element has to stay constant.
+#   python benchmarks/text_accumulation.py [max_elements]
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import consume_str, convert_list_text_only, convert_list_xml  # noqa: E402
+
+
+def words(count: int) -> list:
+    inlines = []
+    for i in range(count):
+        inlines += [{'t': 'Str', 'c': "word" + str(i)}, {'t': 'Space'}]
+    return inlines
+
+
+def citation(count: int) -> list:
+    return [{'t': 'Para', 'c': words(10) + [{'t': 'Emph', 'c': words(5)}, {'t': 'SoftBreak'}]}
+            for _ in range(count // 20)]
+
+
+def formula(count: int) -> list:
+    return [{'t': 'RawInline', 'c': ['html', '</mi>', [{'t': 'Str', 'c': "x" + str(i)}]]} for i in range(count)]
+
+
+def main(max_elements: int) -> None:
+    for name, function, create in [("consume_str", consume_str, words),
+                                   ("convert_list_text_only", convert_list_text_only, citation),
+                                   ("convert_list_xml", convert_list_xml, formula)]:
+        elements = 1000
+        while elements <= max_elements:
+            elem_list = create(elements)
+            start = time.perf_counter()
+            function(elem_list)
+            seconds = time.perf_counter() - start
+            print("{:<24}{:>8} elements: {:8.4f} s  {:6.2f} µs/element".format(
+                name, elements, seconds, seconds / elements * 1e6))
+            elements *= 10
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Compares dict assets with the typed assets of assets.py on the example corpus repeated [copies] times.
+# Every form runs in a new process with TYPED_ASSETS set, which reports the time to convert the pandoc tree,
+# the memory of the converted assets and the time to serialize them like converter.iter_response_parts.
+#   python benchmarks/typed_assets.py [copies]
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fast_json  # noqa: E402
+from assets import TYPED_ASSETS, write_json  # noqa: E402
+from helpers import json_from_pandoc_tree  # noqa: E402
+from pandoc_backend import convert_markdown  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+CORPUS = [os.path.join(TESTS, "examples", "1.md"), os.path.join(TESTS, "mixed_document.md")]
+
+
+def serialize(assets: list) -> bytes:
+    if not TYPED_ASSETS:
+        return b",".join(fast_json.dumps(asset) for asset in assets)
+    out = bytearray()
+    for i, asset in enumerate(assets):
+        if i > 0:
+            out += b","
+        write_json(asset, out)
+    return bytes(out)
+
+
+def measure(json_path: str) -> None:
+    with open(json_path, "rb") as json_file:
+        pandoc_json = json_file.read()
+    pandoc_tree = fast_json.loads(pandoc_json)
+    start = time.perf_counter()
+    assets = json_from_pandoc_tree(pandoc_tree)
+    converted = time.perf_counter()
+    serialize(assets)
+    serialized = time.perf_counter()
+    del assets
+    pandoc_tree = fast_json.loads(pandoc_json)
+    tracemalloc.start()
+    assets = json_from_pandoc_tree(pandoc_tree)
+    assets_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("{:<6} convert {:6.3f} s  assets {:6.1f} MiB  serialize {:6.3f} s".format(
+        "typed" if TYPED_ASSETS else "dict", converted - start, assets_bytes / 2 ** 20, serialized - converted))
+
+
+def main(copies: int) -> None:
+    markdown = "\n\n".join(open(path).read() for path in CORPUS for _ in range(copies))
+    with tempfile.NamedTemporaryFile(suffix=".json") as json_file:
+        json_file.write(convert_markdown(markdown))
+        json_file.flush()
+        print("{} copies, {:.1f} MiB of markdown".format(copies, len(markdown) / 2 ** 20))
+        for typed in ["0", "1"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", json_file.name],
+                           env=dict(os.environ, TYPED_ASSETS=typed), check=True)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
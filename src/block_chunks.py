@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import uuid
+from markdown_reader import BLANK_LINE_REGEX, FENCE_REGEX, REFERENCE_KEY_REGEX, BULLET_START_REGEX, \
+    ORDERED_START_REGEX, BLOCKQUOTE_START_REGEX, BLOCK_HTML_START_REGEX, BLOCK_HTML_TAGS
+
+
+def starts_chunk(line: str) -> bool:
+    # After a blank line every block ends unless the next line continues a list or a block quote
+    # or belongs to indented code.
+    if line[:1] in ["", " ", "\t", ">"]:
+        return False
+    return not (BULLET_START_REGEX.match(line) or ORDERED_START_REGEX.match(line) or
+                BLOCKQUOTE_START_REGEX.match(line))
+
+
+def split_chunks(markdown: str):
+    # Splits the markdown at top-level block boundaries, so every chunk can be read by pandoc on its own.
+    # Returns None if the document contains something which reaches across blocks, e.g. link references.
+    chunks = []
+    chunk_lines = []
+    fence = None
+    in_comment = False
+    previous_blank = False
+    for line in markdown.splitlines(keepends=True):
+        stripped_line = line.rstrip("\r\n")
+        if fence is None and not in_comment:
+            if REFERENCE_KEY_REGEX.match(stripped_line):
+                return None
+            block_html = BLOCK_HTML_START_REGEX.match(stripped_line.lstrip(" "))
+            if block_html and not stripped_line.lstrip(" ").startswith("<!--") and \
+                    (block_html.group(1) is None or block_html.group(1).lower() in BLOCK_HTML_TAGS):
+                return None
+            if previous_blank and starts_chunk(stripped_line) and len(chunk_lines) > 0:
+                chunks.append("".join(chunk_lines))
+                chunk_lines = []
+        chunk_lines.append(line)
+        previous_blank = BLANK_LINE_REGEX.match(stripped_line) is not None
+        if in_comment:
+            in_comment = "-->" not in stripped_line
+            continue
+        fence_match = FENCE_REGEX.match(stripped_line)
+        if fence is None:
+            if fence_match:
+                fence = fence_match.group(2)
+            elif "<!--" in stripped_line:
+                in_comment = "-->" not in stripped_line[stripped_line.rindex("<!--"):]
+        elif fence_match and fence_match.group(3) == "" and fence_match.group(2)[0] == fence[0] and \
+                len(fence_match.group(2)) >= len(fence):
+            fence = None
+    if len(chunk_lines) > 0:
+        chunks.append("".join(chunk_lines))
+    return chunks
+
+
+def join_chunks(chunks: list) -> tuple:
+    # Separator comments tell which blocks of the joined document belong to which chunk.
+    separator = "<!-- chunk " + uuid.uuid4().hex + " -->"
+    return ("\n\n" + separator + "\n\n").join(chunks), separator
+
+
+def split_blocks(blocks: list, separator: str) -> list:
+    chunk_blocks = [[]]
+    for block in blocks:
+        if block['t'] == 'RawBlock' and block['c'][1].strip() == separator:
+            chunk_blocks.append([])
+        else:
+            chunk_blocks[-1].append(block)
+    return chunk_blocks
+
+
+def can_be_joined(markdown: str) -> bool:
+    # True if the markdown ends outside of any block and defines no link references,
+    # so it converts the same on its own and as a chunk of a joined document.
+    chunks = split_chunks(markdown + "\n\n<!-- end -->\n")
+    return chunks is not None and chunks[-1] == "<!-- end -->\n"
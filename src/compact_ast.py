@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# An optional compact form of pandoc's JSON AST. Every node with only the keys 't' and 'c' becomes a Node
+# with two slots instead of a dict, the type names are shared by all nodes of a document and nodes without
+# content like Space or SoftBreak are a single object per type. node['t'] and node['c'] work like on the
+# dict, so the converters in helpers.py handle both forms.
+import json
+import os
+import fast_json
+
+COMPACT_AST = os.environ.get("COMPACT_AST", "0") == "1"
+
+
+class Node:
+    __slots__ = ("t", "c")
+    __getitem__ = object.__getattribute__  # no Python frame for node['t'], a missing 'c' raises AttributeError
+
+    def __init__(self, t: str, c=None):
+        self.t = t
+        if c is not None:
+            self.c = c
+
+    def keys(self) -> tuple:
+        if hasattr(self, "c"):
+            return "t", "c"
+        return "t",
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __eq__(self, other) -> bool:
+        if type(other) not in NODE_TYPES:
+            return NotImplemented
+        return {key: self[key] for key in self.keys()} == {key: other[key] for key in other.keys()}
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        # Like the dict, so error messages do not depend on the form of the tree.
+        if hasattr(self, "c"):
+            return "{'t': " + repr(self.t) + ", 'c': " + repr(self.c) + "}"
+        return "{'t': " + repr(self.t) + "}"
+
+
+NODE_TYPES = (dict, Node)
+
+
+def decoder() -> json.JSONDecoder:
+    # A decoder for the compact form. The type names and leaves are shared by everything it decodes.
+    names = {}
+    leaves = {}
+
+    def node_from_dict(o: dict):
+        t = o.get('t')
+        if type(t) is not str or len(o) > 2 or (len(o) == 2 and 'c' not in o):
+            return o
+        t = names.setdefault(t, t)
+        if len(o) == 1:
+            leaf = leaves.get(t)
+            if leaf is None:
+                leaf = leaves[t] = Node(t)
+            return leaf
+        if o['c'] is None:
+            return o
+        return Node(t, o['c'])
+
+    return json.JSONDecoder(object_hook=node_from_dict)
+
+
+def loads(data):
+    # Parses pandoc's JSON (str or bytes) directly into the compact form.
+    if type(data) is not str:
+        data = data.decode('utf-8')
+    return decoder().decode(data)
+
+
+def loads_tree(data):
+    if COMPACT_AST:
+        return loads(data)
+    return fast_json.loads(data)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import pypandoc
+from pandoc_backend import PANDOC_FORMAT, PANDOC_EXTRA_ARGS
+
+CONVERSION_CACHE_BYTES = int(os.environ.get("CONVERSION_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 disables
+
+_pandoc_version = None  # type: str
+
+
+def pandoc_version() -> str:
+    global _pandoc_version
+    if _pandoc_version is None:
+        _pandoc_version = pypandoc.get_pandoc_version()
+    return _pandoc_version
+
+
+def cache_key(markdown, reader: str) -> bytes:
+    # markdown is bytes or a list of byte chunks, which are hashed without joining them.
+    key_hash = hashlib.sha256()
+    for option in [pandoc_version(), PANDOC_FORMAT, " ".join(PANDOC_EXTRA_ARGS), reader]:
+        key_hash.update(option.encode('utf-8') + b"\0")
+    if type(markdown) is bytes:
+        markdown = [markdown]
+    for chunk in markdown:
+        key_hash.update(chunk)
+    return key_hash.digest()
+
+
+# Least recently used entries are evicted as soon as the stored bytes exceed max_bytes.
+class ConversionCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: bytes) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= len(key) + len(self._entries.pop(key))
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self.current_bytes -= len(old_key) + len(old_value)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "entries": len(self._entries),
+                    "bytes": self.current_bytes,
+                    "max_bytes": self.max_bytes}
+
+
+conversion_cache = ConversionCache(CONVERSION_CACHE_BYTES)
@@ -1,24 +1,218 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, request
-from helpers import json_from_markdown
+from werkzeug.sansio.multipart import MultipartDecoder, Data, Epilogue, Field, File, NeedData
+from helpers import iter_json_from_markdown, iter_json_from_pandoc_tree, read_pandoc_pipe, MARKDOWN_READER
+from conversion_cache import conversion_cache, cache_key
+from incremental import iter_json_from_markdown_incremental, chunk_cache, INCREMENTAL_CONVERSION
+from batching import pandoc_batcher, PANDOC_BATCHING
+from pandoc_backend import PandocPipe, PANDOC_BACKEND
+from compression import negotiate_encoding, compress
+from assets import TYPED_ASSETS, write_json
+from concurrent.futures import ThreadPoolExecutor
+import fast_json
+import itertools
 import json
+import os
 app = Flask(__name__)
 
 
-@app.route("/", methods=['POST'])
-def convert():
-    md_str = request.get_data(as_text=True)
-    data = {
-        "type": "conversion-container",
-        "blocks": json_from_markdown(md_str)}
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "0") == "1"
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", str(32 * 1024 * 1024)))  # 413 above, 0 disables
+REQUEST_CHUNK_BYTES = int(os.environ.get("REQUEST_CHUNK_BYTES", str(64 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES if MAX_REQUEST_BYTES > 0 else None
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "8"))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+
+def iter_assets_from_bytes(md_bytes: bytes):
+    if INCREMENTAL_CONVERSION:
+        return iter_json_from_markdown_incremental(md_bytes.decode('utf-8', errors='replace'))
+    return iter_json_from_markdown(md_bytes)
+
+
+def iter_response_parts(assets, key: bytes):
+    # Serializes {"type": "conversion-container", "blocks": [...]} asset by asset
+    # and puts it into the cache after the last asset unless it got too big for it.
+    part = b'{"type":"conversion-container","blocks":['
+    cached_parts = [part]
+    cached_bytes = len(part)
+    yield part
+    for i, asset in enumerate(assets):
+        if TYPED_ASSETS:
+            part = bytearray(b"," if i > 0 else b"")
+            write_json(asset, part)
+            part = bytes(part)
+        else:
+            part = (b"," if i > 0 else b"") + fast_json.dumps(asset)
+        if cached_parts is not None:
+            cached_parts.append(part)
+            cached_bytes += len(part)
+            if cached_bytes > conversion_cache.max_bytes:
+                cached_parts = None
+        yield part
+    yield b"]}"
+    if cached_parts is not None:
+        conversion_cache.put(key, b"".join(cached_parts) + b"]}")
+
+
+def iter_streamed_parts(assets, key: bytes):
+    # The first asset is converted before the response starts, so the errors up to it still end up as status 500.
+    # A later error can not change the status any more: It is logged and the response ends without "]}".
+    assets = iter(assets)
+    first_assets = list(itertools.islice(assets, 1))
+    response_parts = iter_response_parts(itertools.chain(first_assets, assets), key)
+
+    def iter_parts():
+        try:
+            yield from response_parts
+        except Exception:
+            app.logger.exception("Exception while streaming / [POST]")
+    return iter_parts()
+
+
+def convert_bytes(md_bytes: bytes) -> bytes:
+    key = cache_key(md_bytes, MARKDOWN_READER)
+    response_bytes = conversion_cache.get(key)
+    if response_bytes is None:
+        response_bytes = b"".join(iter_response_parts(iter_assets_from_bytes(md_bytes), key))
+    return response_bytes
+
+
+def pipe_to_pandoc() -> bool:
+    # Only the plain pandoc subprocess reads the markdown as it is.
+    return PANDOC_BACKEND == "subprocess" and MARKDOWN_READER == "pandoc" and not PANDOC_BATCHING \
+        and not INCREMENTAL_CONVERSION
+
+
+def read_request_chunks():
+    # Reads the body chunk by chunk. Flask answers with 413 as soon as the Content-Length or the bytes read so far
+    # exceed MAX_REQUEST_BYTES. Bodies with more than one chunk go to a pandoc subprocess while they arrive.
+    chunks = []
+    pipe = None
+    try:
+        while True:
+            chunk = request.stream.read(REQUEST_CHUNK_BYTES)
+            if len(chunk) == 0:
+                return chunks, pipe
+            if pipe is None and len(chunks) == 1 and pipe_to_pandoc():
+                pipe = PandocPipe(chunks)
+            if pipe is not None:
+                pipe.write(chunk)
+            else:
+                chunks.append(chunk)
+    except BaseException:
+        if pipe is not None:
+            pipe.kill()
+        raise
+
+
+def convert_batch_item(md_bytes: bytes) -> bytes:
+    # The message may contain pandoc's stderr or paths of the server, so it only goes to the log.
+    try:
+        return convert_bytes(md_bytes)
+    except Exception as error:
+        app.logger.exception("Exception in a document of /batch [POST]")
+        return fast_json.dumps({"type": "conversion-error", "error": type(error).__name__})
+
+
+def compress_response(response_bytes: bytes, accept_encodings, key: bytes = None) -> tuple:
+    # Compresses big responses if the client accepts it and returns the bytes with their encoding (None if they
+    # are not compressed). Compressed responses are cached next to the plain ones.
+    encoding = negotiate_encoding(accept_encodings, len(response_bytes))
+    if encoding is None:
+        return response_bytes, None
+    compressed_bytes = conversion_cache.get(key + encoding.encode('ascii')) if key is not None else None
+    if compressed_bytes is None:
+        compressed_bytes = compress(response_bytes, encoding)
+        if key is not None:
+            conversion_cache.put(key + encoding.encode('ascii'), compressed_bytes)
+    return compressed_bytes, encoding
+
+
+def json_response(response_bytes: bytes, key: bytes = None):
+    response_bytes, encoding = compress_response(response_bytes, request.accept_encodings, key)
     response = app.response_class(
-        response=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+        response=response_bytes,
         status=200,
         mimetype='application/json'
     )
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.content_encoding = encoding
     return response
 
 
+@app.route("/", methods=['POST'])
+def convert():
+    chunks, pipe = read_request_chunks()
+    key = cache_key(chunks, MARKDOWN_READER)
+    response_bytes = conversion_cache.get(key)
+    if response_bytes is not None and pipe is not None:
+        pipe.kill()
+    if response_bytes is None:
+        if pipe is not None:
+            assets = iter_json_from_pandoc_tree(read_pandoc_pipe(pipe))
+        else:
+            assets = iter_assets_from_bytes(b"".join(chunks))
+        if STREAM_RESPONSES:
+            response = app.response_class(
+                response=iter_streamed_parts(assets, key),
+                status=200,
+                mimetype='application/json'
+            )
+            return response
+        response_bytes = b"".join(iter_response_parts(assets, key))
+    return json_response(response_bytes, key)
+
+
+def read_multipart_documents() -> list:
+    # request.files and request.form lose the order of file and field parts, so the parts are decoded in the
+    # order they arrive. Raises ValueError for a malformed body.
+    boundary = request.mimetype_params.get('boundary')
+    if boundary is None:
+        raise ValueError("Missing multipart boundary")
+    decoder = MultipartDecoder(boundary.encode('latin1'))
+    documents = []
+    while True:
+        chunk = request.stream.read(REQUEST_CHUNK_BYTES)
+        decoder.receive_data(chunk if len(chunk) > 0 else None)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, (Field, File)):
+                documents.append([])
+            elif isinstance(event, Data):
+                documents[-1].append(event.data)
+            event = decoder.next_event()
+        if isinstance(event, Epilogue):
+            return [b"".join(parts) for parts in documents]
+        if len(chunk) == 0:
+            raise ValueError("Incomplete multipart body")
+
+
+@app.route("/batch", methods=['POST'])
+def batch():
+    if request.mimetype == 'multipart/form-data':
+        try:
+            documents = read_multipart_documents()
+        except ValueError:
+            documents = None
+        error = "Expected one multipart part per document."
+    else:
+        documents = request.get_json(force=True, silent=True)
+        if type(documents) is list and all(type(document) is str for document in documents):
+            documents = [document.encode('utf-8') for document in documents]
+        else:
+            documents = None
+        error = "Expected a JSON array of markdown strings."
+    if documents is None:
+        return app.response_class(
+            response=json.dumps({"error": error}),
+            status=400,
+            mimetype='application/json'
+        )
+    return json_response(b"[" + b",".join(batch_executor.map(convert_batch_item, documents)) + b"]")
+
+
 @app.route("/live", methods=['GET'])
 def live():
     response = app.response_class(
@@ -29,5 +223,17 @@ def live():
     return response
 
 
+@app.route("/stats", methods=['GET'])
+def stats():
+    response = app.response_class(
+        response=json.dumps({"cache": conversion_cache.stats(),
+                             "chunk_cache": chunk_cache.stats(),
+                             "batching": pandoc_batcher.stats()}),
+        status=200,
+        mimetype='application/json'
+    )
+    return response
+
+
 if __name__ == "__main__":  # pragma: no mutate
     app.run()
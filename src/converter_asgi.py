@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# An asyncio entry point for / and /live. pandoc runs as an asyncio subprocess and the tree conversion
+# runs in a bounded thread pool, so one worker keeps many conversions in flight. The pandoc server, micro-batching,
+# the incremental, parallel and pipelined conversion block, so with any of them the conversion of the Flask app
+# runs in a thread instead. Serve it with any ASGI server:
+#   uvicorn converter_asgi:app --host 0.0.0.0 --port 8080
+import asyncio
+import logging
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import InternalServerError
+from werkzeug.http import parse_accept_header
+from pandoc_backend import convert_with_subprocess_async, PANDOC_BACKEND
+from markdown_reader import read_markdown, check_against_pandoc, UnsupportedMarkdown
+from helpers import iter_json_from_pandoc_tree, loads_pandoc_tree, markdown_text, MARKDOWN_READER, PIPELINED_PARSING
+from batching import PANDOC_BATCHING
+from incremental import INCREMENTAL_CONVERSION
+from parallel import PARALLEL_CONVERSION_BYTES
+from conversion_cache import conversion_cache, cache_key
+from converter import iter_assets_from_bytes, iter_response_parts, compress_response, MAX_REQUEST_BYTES
+
+ASYNC_PANDOC_JOBS = int(os.environ.get("ASYNC_PANDOC_JOBS", "32"))
+ASYNC_CONVERSION_WORKERS = int(os.environ.get("ASYNC_CONVERSION_WORKERS", "4"))
+
+conversion_executor = ThreadPoolExecutor(max_workers=ASYNC_CONVERSION_WORKERS)
+_pandoc_jobs = weakref.WeakKeyDictionary()  # one semaphore per event loop
+logger = logging.getLogger(__name__)
+
+
+async def read_pandoc_tree_async(markdown, reader: str = None) -> dict:
+    if reader is None:
+        reader = MARKDOWN_READER
+    loop = asyncio.get_running_loop()
+    if reader == "python":
+        try:
+            return await loop.run_in_executor(conversion_executor, read_markdown, markdown_text(markdown))
+        except UnsupportedMarkdown:
+            pass  # pandoc reads everything
+    if loop not in _pandoc_jobs:
+        _pandoc_jobs[loop] = asyncio.Semaphore(ASYNC_PANDOC_JOBS)
+    async with _pandoc_jobs[loop]:
+        pandoc_json = await convert_with_subprocess_async(markdown)
+    pandoc_tree = await loop.run_in_executor(conversion_executor, loads_pandoc_tree, pandoc_json, reader)
+    if reader == "differential":
+        await loop.run_in_executor(conversion_executor, check_against_pandoc, markdown_text(markdown), pandoc_tree)
+    return pandoc_tree
+
+
+def uses_async_pandoc() -> bool:
+    return PANDOC_BACKEND == "subprocess" and not PANDOC_BATCHING and not INCREMENTAL_CONVERSION \
+        and not PIPELINED_PARSING and PARALLEL_CONVERSION_BYTES <= 0
+
+
+async def convert_bytes_async(md_bytes: bytes, key: bytes) -> bytes:
+    response_bytes = conversion_cache.get(key)
+    if response_bytes is not None:
+        return response_bytes
+    loop = asyncio.get_running_loop()
+    if not uses_async_pandoc():
+        return await loop.run_in_executor(
+            None, lambda: b"".join(iter_response_parts(iter_assets_from_bytes(md_bytes), key)))
+    pandoc_tree = await read_pandoc_tree_async(md_bytes)
+    return await loop.run_in_executor(
+        conversion_executor,
+        lambda: b"".join(iter_response_parts(iter_json_from_pandoc_tree(pandoc_tree), key)))
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def header_value(scope, header_name: bytes) -> bytes:
+    for name, value in scope["headers"]:
+        if name.lower() == header_name:
+            return value
+    return None
+
+
+def content_length(scope) -> int:
+    value = header_value(scope, b"content-length")
+    if value is not None and value.isdigit():
+        return int(value)
+    return None
+
+
+async def read_body(receive, max_bytes: int = 0) -> bytes:
+    # Raises ClientDisconnected if the client leaves before the end of the body.
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        body += message.get("body", b"")
+        if 0 < max_bytes < len(body):
+            raise RequestTooLarge()
+        if not message.get("more_body", False):
+            break
+    return bytes(body)
+
+
+async def send_response(send, status: int, body: bytes, content_type: bytes, headers: list = ()) -> None:
+    await send({"type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", content_type),
+                            (b"content-length", str(len(body)).encode('ascii'))] + list(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    if scope["path"] == "/" and scope["method"] == "POST":
+        length = content_length(scope)
+        try:
+            if MAX_REQUEST_BYTES > 0 and length is not None and length > MAX_REQUEST_BYTES:
+                raise RequestTooLarge()
+            md_bytes = await read_body(receive, MAX_REQUEST_BYTES)
+        except RequestTooLarge:
+            await send_response(send, 413, b"Content Too Large", b"text/plain; charset=utf-8")
+            return
+        except ClientDisconnected:
+            return  # nobody waits for the conversion of an incomplete body
+        key = cache_key(md_bytes, MARKDOWN_READER)
+        accept_encoding = header_value(scope, b"accept-encoding")
+        try:
+            response_bytes = await convert_bytes_async(md_bytes, key)
+            response_bytes, encoding = await asyncio.get_running_loop().run_in_executor(
+                conversion_executor, compress_response, response_bytes,
+                parse_accept_header(accept_encoding.decode('latin1') if accept_encoding is not None else None), key)
+        except Exception:
+            # Like the Flask app: the error goes to the log, the client gets the generic page.
+            logger.exception("Exception on / [POST]")
+            await send_response(send, 500, InternalServerError().get_body().encode('utf-8'),
+                                b"text/html; charset=utf-8")
+            return
+        headers = [(b"vary", b"Accept-Encoding")]
+        if encoding is not None:
+            headers.append((b"content-encoding", encoding.encode('ascii')))
+        await send_response(send, 200, response_bytes, b"application/json", headers)
+    elif scope["path"] == "/live" and scope["method"] in ["GET", "HEAD"]:
+        await send_response(send, 200, b"", b"text/plain; charset=utf-8")
+    elif scope["path"] in ["/", "/live"]:
+        await send_response(send, 405, b"Method Not Allowed", b"text/plain; charset=utf-8")
+    else:
+        await send_response(send, 404, b"Not Found", b"text/plain; charset=utf-8")
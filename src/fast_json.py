@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# orjson parses and writes bytes directly and much faster than the json module,
+# which is used if orjson is not installed.
+import json
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def as_dict(o) -> dict:
+    # Objects with keys() and o[key] like the nodes of compact_ast are written as objects.
+    if hasattr(o, "keys"):
+        return {key: o[key] for key in o.keys()}
+    raise TypeError("Type is not JSON serializable: " + type(o).__name__)
+
+
+def dumps(data) -> bytes:
+    # Compact UTF-8 JSON. Keys which are no strings (YAML allows numbers) become strings like in the json module.
+    if orjson is not None:
+        return orjson.dumps(data, default=as_dict, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=as_dict, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
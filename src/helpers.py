@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
-import json
+import functools
+import os
+import pickle
+import fast_json
 import yaml
-import pypandoc
-import re
+from pandoc_backend import convert_markdown, iter_with_subprocess, PandocPipe, PANDOC_BACKEND
+from markdown_reader import read_markdown, check_against_pandoc, UnsupportedMarkdown
+from batching import pandoc_batcher, PANDOC_BATCHING
+from parallel import split_segments, get_executor, PARALLEL_CONVERSION_BYTES, PARALLEL_WORKERS
+from tree_walker import TreeWalker
+from html_scanner import scan_tag, is_empty_comment, magic_comment_text
+import compact_ast
+import lazy_ast
+from compact_ast import Node, NODE_TYPES
+from assets import TYPED_ASSETS
 
 PANDOC_SPAN_TYPES = {
     "Strong": "span-strong",
@@ -15,106 +26,204 @@ CHARACTER_TYPES = {
     "SingleQuote": "'",
     "SoftBreak": "\n"
 }
+TEXT_ONLY_MARKERS = {
+    "Emph": "*",
+    "Strong": "**",
+    "Strikeout": "~~"
+}
+SPAN_CONTENT_KEYS = {
+    "span-listing": "listing_text",
+    "span-container": "spans"
+}
+MARKDOWN_READER = os.environ.get("MARKDOWN_READER", "pandoc")  # "pandoc", "python" or "differential"
+YAML_CACHE_SIZE = int(os.environ.get("YAML_CACHE_SIZE", "256"))  # magic blocks, 0 disables
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml if PyYAML was built with it
+LOW_MEMORY_CONVERSION = os.environ.get("LOW_MEMORY_CONVERSION", "0") == "1"  # frees every block once converted
+PIPELINED_PARSING = os.environ.get("PIPELINED_PARSING", "0") == "1"  # converts blocks while pandoc writes them
 
 
-def create_span(span_type: str, content: str) -> dict:
-    if span_type == "span-listing":
-        return {"type": "span-listing", "listing_text": content}
-    return {"type": span_type, "text": content}
+if TYPED_ASSETS:
+    # The same arguments, but __slots__ objects instead of dicts.
+    from assets import text_span as create_span, ContainerSpan as container_span, LinkSpan as link_span, \
+        PathSpan as path_span, ProgramSpan as program_span, AbbreviationSpan as abbreviation_span, \
+        MathmlSpan as mathml_span, CtLinkSpan as ct_link_span, ImageBlock as image_block, \
+        ParagraphBlock as paragraph_block, HeadingBlock as heading_block, CitationBlock as citation_block, \
+        ListBlock as list_block, ListingBlock as listing_block
+else:
+    def create_span(span_type: str, content: str) -> dict:
+        if span_type == "span-listing":
+            return {"type": "span-listing", "listing_text": content}
+        return {"type": span_type, "text": content}
 
+    def container_span(spans: list, span_type: str = "span-container") -> dict:
+        return {"type": span_type, "spans": spans}
 
-def consume_str(span_list: list) -> str:
-    text = ""
-    for elem in span_list:
-        if elem['t'] in CHARACTER_TYPES.keys():
-            text += CHARACTER_TYPES[elem['t']]
-            continue
-        if elem['t'] == "Str":
-            text += elem['c']
-            continue
-        if 'c' in elem.keys() and type(elem['c']) is list:
-            text += consume_str(elem['c'])
+    def link_span(link_text: str, url: str, span_type: str = "span-link") -> dict:
+        return {"type": span_type, "link_text": link_text, "url": url}
+
+    def path_span(path: str) -> dict:
+        return {"type": "span-path", "path": path}
+
+    def program_span(program_name: str) -> dict:
+        return {"type": "span-program", "program_name": program_name}
+
+    def abbreviation_span(abbreviation: str, long_name: str) -> dict:
+        return {"type": "span-abbreviation", "abbreviation": abbreviation, "long_name": long_name}
+
+    def mathml_span(formula: str) -> dict:
+        return {"type": "span-mathml", "formula": formula}
+
+    def ct_link_span() -> dict:
+        return {"type": "span-ct-link"}
+
+    def image_block(image_uri: str, caption: list, alt: str) -> dict:
+        return {"type": "block-image", "image_uri": image_uri, "caption": caption, "alt": alt}
+
+    def paragraph_block(spans: list) -> dict:
+        return {"type": "block-paragraph", "spans": spans}
+
+    def heading_block(block_type: str, heading: str) -> dict:
+        return {"type": block_type, "heading": heading}
+
+    def citation_block(statement: str, attribution: str) -> dict:
+        return {"type": "block-citation", "statement": statement, "attribution": attribution}
+
+    def list_block(block_type: str, items: list) -> dict:
+        return {"type": block_type, "items": items}
+
+    def listing_block(language: str, code: str) -> dict:
+        return {"type": "block-listing", "language": language, "code": code}
+
+
+def merge_spans(span_list: list) -> list:
+    # Merges every run of adjacent spans with the same type into its first span in a single pass.
+    merged_spans = []
+    run_start = 0
+    for pos in range(1, len(span_list) + 1):
+        if pos < len(span_list) and span_list[pos]['type'] == span_list[run_start]['type']:
             continue
-        raise SyntaxError("Unable to consume: " + str(elem))
-    return text
+        first_span = span_list[run_start]
+        if pos - run_start > 1:
+            content_key = SPAN_CONTENT_KEYS.get(first_span['type'], "text")
+            if content_key == "spans":
+                for span in span_list[run_start + 1:pos]:
+                    first_span[content_key].extend(span[content_key])
+            else:
+                first_span[content_key] = "".join([first_span[content_key]] +
+                                                  [span[content_key] for span in span_list[run_start + 1:pos]])
+        merged_spans.append(first_span)
+        run_start = pos
+    return merged_spans
+
+
+def visit_str(walker: TreeWalker, elem: dict) -> None:
+    if elem['t'] == "Str":
+        walker.output.append(elem['c'])
+        return
+    if elem['t'] in CHARACTER_TYPES.keys():
+        walker.output.append(CHARACTER_TYPES[elem['t']])
+        return
+    if 'c' in elem.keys() and type(elem['c']) is list:
+        walker.descend(elem['c'], visit_str)
+        return
+    raise SyntaxError("Unable to consume: " + str(elem))
+
+
+def consume_str(span_list: list) -> str:
+    parts = []
+    TreeWalker(parts).walk(span_list, visit_str)
+    return "".join(parts)
+
+
+def leave_known_text_only(walker: TreeWalker, state: list) -> None:
+    known, elem_list, suffix = state
+    if not known:
+        raise TypeError("Unable to convert to text: " + str(elem_list[-1]))
+    if suffix is not None:
+        walker.output.append(suffix)
+
+
+def descend_known_text_only(walker: TreeWalker, elem_list: list, suffix: str = None) -> None:
+    walker.descend(elem_list, visit_text_only, leave_known_text_only, [True, elem_list, suffix])
+
+
+def visit_text_only(walker: TreeWalker, elem: dict) -> None:
+    # state[0] of the list is False if its last element has an unknown type. The text is None then.
+    # Known elements after an unknown one are an error.
+    parts = walker.output
+    state = walker.states[-1]
+    if elem['t'] == "Str":
+        parts.append(elem['c'])
+    elif elem['t'] == "SoftBreak":
+        parts.append(" ")
+    elif elem['t'] in CHARACTER_TYPES.keys():
+        parts.append(CHARACTER_TYPES[elem['t']])
+    elif elem['t'] == "Para":
+        descend_known_text_only(walker, elem['c'], "\n")
+    elif elem['t'] == "Quoted":
+        if type(elem['c'][0]) in NODE_TYPES:
+            descend_known_text_only(walker, [elem['c'][0]])
+            descend_known_text_only(walker, elem['c'][1])
+            descend_known_text_only(walker, [elem['c'][0]])
+        else:
+            parts.append(elem['c'][0])
+            descend_known_text_only(walker, elem['c'][1], elem['c'][0])
+    elif elem['t'] in TEXT_ONLY_MARKERS.keys():
+        parts.append(TEXT_ONLY_MARKERS[elem['t']])
+        descend_known_text_only(walker, elem['c'], TEXT_ONLY_MARKERS[elem['t']])
+    elif elem['t'] == "Code":
+        parts.append(elem['c'][1])
+    elif elem['t'] == "Link":
+        walker.descend(elem['c'][1], visit_str)
+    elif elem['t'] == "RawInline" and len(elem['c']) >= 3 and elem['c'][0] == "html":
+        descend_known_text_only(walker, elem['c'][2])
+    else:
+        state[0] = False
+        return
+    if not state[0]:
+        raise TypeError("Unable to convert to text after an unknown element: " + str(elem))
 
 
 def convert_list_text_only(elem_list: list) -> str:
-    def extract_elem_text(accumulated_text: str, elem: dict):
-        if elem['t'] == "Para":
-            accumulated_text += convert_list_text_only(elem['c']) + "\n"
-            return accumulated_text
-        if elem['t'] == "Quoted":
-            if type(elem['c'][0]) is dict:
-                accumulated_text = extract_elem_text(accumulated_text, elem['c'][0])
-                accumulated_text += convert_list_text_only(elem['c'][1])
-                accumulated_text = extract_elem_text(accumulated_text, elem['c'][0])
-            else:
-                accumulated_text += elem['c'][0] + convert_list_text_only(elem['c'][1]) + elem['c'][0]
-            return accumulated_text
-        if elem['t'] == "SoftBreak":
-            accumulated_text += " "
-            return accumulated_text
-        if elem['t'] in CHARACTER_TYPES.keys():
-            accumulated_text += CHARACTER_TYPES[elem['t']]
-            return accumulated_text
-        if elem['t'] == "Str":
-            accumulated_text += elem['c']
-            return accumulated_text
-        if elem['t'] == "Emph":
-            accumulated_text += "*" + convert_list_text_only(elem['c']) + "*"
-            return accumulated_text
-        if elem['t'] == "Strong":
-            accumulated_text += "**" + convert_list_text_only(elem['c']) + "**"
-            return accumulated_text
-        if elem['t'] == "Strikeout":
-            accumulated_text += "~~" + convert_list_text_only(elem['c']) + "~~"
-            return accumulated_text
-        if elem['t'] == "Code":
-            accumulated_text += elem['c'][1]
-            return accumulated_text
-        if elem['t'] == "Link":
-            accumulated_text += consume_str(elem['c'][1])
-            return accumulated_text
-        if elem['t'] == "RawInline" and len(elem['c']) >= 3 and elem['c'][0] == "html":
-            accumulated_text += convert_list_text_only(elem['c'][2])
-            return accumulated_text
-        if elem['t'] in PANDOC_SPAN_TYPES.keys():
-            accumulated_text += convert_list_text_only(elem['c'])
-            return accumulated_text
-
-    text = ""
-    for element in elem_list:
-        text = extract_elem_text(text, element)
-    return text
+    parts = []
+    if not TreeWalker(parts).walk(elem_list, visit_text_only, [True])[0]:
+        return None
+    return "".join(parts)
+
+
+def leave_xml_content(walker: TreeWalker, state: list) -> None:
+    known, content_start, tag_name = state
+    if not known:
+        del walker.output[content_start:]
+        walker.output.append("None")
+    walker.output.append("</" + tag_name + ">")
+
+
+def visit_xml(walker: TreeWalker, elem: dict) -> None:
+    parts = walker.output
+    state = walker.states[-1]
+    if elem['t'] == "Str":
+        parts.append(elem['c'])
+    elif elem['t'] == "SoftBreak":
+        parts.append("\n")
+    elif elem['t'] in CHARACTER_TYPES.keys():
+        parts.append(CHARACTER_TYPES[elem['t']])
+    elif elem['t'] == "RawInline" and len(elem['c']) >= 3 and elem['c'][0] == "html":
+        tag = scan_tag(elem['c'][1])
+        parts.append("<" + tag.name + (tag.properties if tag.properties else "") + ">")
+        walker.descend(elem['c'][2], visit_text_only, leave_xml_content, [True, len(parts), tag.name])
+    else:
+        state[0] = False
+        return
+    if not state[0]:
+        raise TypeError("Unable to convert to xml after an unknown element: " + str(elem))
 
 
 def convert_list_xml(elem_list: list) -> str:
-    def extract_elem_text(accumulated_text: str, elem: dict):
-        if elem['t'] == "Str":
-            accumulated_text += elem['c']
-            return accumulated_text
-        if elem['t'] == "SoftBreak":
-            accumulated_text += "\n"
-            return accumulated_text
-        if elem['t'] in CHARACTER_TYPES.keys():
-            accumulated_text += CHARACTER_TYPES[elem['t']]
-            return accumulated_text
-        if elem['t'] == "RawInline" and len(elem['c']) >= 3 and elem['c'][0] == "html":
-            mobj = re.match(
-                r"^<(?P<end_tag>/)?(?P<tag_name>[\w\-_]+)" +
-                r"(?P<properties>( [\w\-_]+=\"[^\"]+\"))?(?P<empty_tag>[ ]?/)?>$",
-                elem['c'][1])
-            accumulated_text += "<{0}{2}>{1}</{0}>".format(
-                mobj.group('tag_name'),
-                convert_list_text_only(elem['c'][2]),
-                mobj.group('properties') if mobj.group('properties') else "")
-            return accumulated_text
-
-    text = ""
-    for element in elem_list:
-        text = extract_elem_text(text, element)
-    return text
+    parts = []
+    if not TreeWalker(parts).walk(elem_list, visit_xml, [True])[0]:
+        return None
+    return "".join(parts)
 
 
 def convert_list_for_caption_spans(span_list: list, span_type: str = "caption-span-regular") -> list:
@@ -135,333 +244,577 @@ def convert_list_for_caption_spans(span_list: list, span_type: str = "caption-sp
             spans.append(create_span("caption-span-strong", convert_list_text_only(span_elem['c'])))
             return
         if span_elem['t'] == "Link":
-            spans.append({
-                "type": "caption-span-link",
-                "link_text": consume_str(span_elem['c'][1]),
-                "url": span_elem['c'][2][0]
-            })
+            spans.append(link_span(consume_str(span_elem['c'][1]), span_elem['c'][2][0], "caption-span-link"))
             return
 
-    def merge_list(long_span_list: list) -> None:
-        pos = 0
-        while len(long_span_list) > pos+1:
-            if long_span_list[pos]['type'] == long_span_list[pos + 1]['type']:
-                content_key = "text"
-                pop_item = long_span_list.pop(pos + 1)
-                long_span_list[pos][content_key] += pop_item[content_key]
-            else:
-                pos += 1
-
     converted_spans = []
     for span_element in span_list:
         convert_elem(converted_spans, span_element)
-    merge_list(converted_spans)
-    return converted_spans
+    return merge_spans(converted_spans)
 
 
-def convert_list(span_list: list, block_list: list, span_type: str = "span-regular", indent: str = "") -> list:
-    def convert_elem(spans: list, span_elem: dict) -> None:
-        if span_elem['t'] == "Quoted":
-            if type(span_elem['c'][0]) is dict:
-                spans += convert_list([span_elem['c'][0]] +
-                                      span_elem['c'][1] +
-                                      [span_elem['c'][0]],
-                                      block_list, span_type,
-                                      indent + "  ")
-            else:
-                spans += convert_list([{'t': 'Str', 'c': span_elem['c'][0]}] +
-                                      span_elem['c'][1] +
-                                      [{'t': 'Str', 'c': span_elem['c'][0]}],
-                                      block_list, span_type,
-                                      indent + "  ")
-            return
-        if span_elem['t'] in ["Plain", "Para"]:
-            spans.append({"type": "span-container",
-                          "spans": convert_list(span_elem['c'], block_list, span_type, indent + "  ")})
-            return
-        if span_elem['t'] in CHARACTER_TYPES.keys():
-            spans.append(create_span(span_type, CHARACTER_TYPES[span_elem['t']]))
-            return
-        if span_elem['t'] == "Str":
-            spans.append(create_span(span_type, span_elem['c']))
-            return
-        if span_elem['t'] == "Code":
-            spans.append(create_span("span-listing", span_elem['c'][1]))
-            return
-        if span_elem['t'] == "RawInline" and span_elem['c'][0] == "html" and span_elem['c'][1] == "</fs-path>" \
-                and len(span_elem['c']) >= 3:
-            spans.append({"type": "span-path", "path": convert_list_text_only(span_elem['c'][2])})
-            return
-        if span_elem['t'] == "RawInline" and span_elem['c'][0] == "html" and span_elem['c'][1] == "</program-name>" \
-                and len(span_elem['c']) >= 3:
-            spans.append({"type": "span-program", "program_name": convert_list_text_only(span_elem['c'][2])})
-            return
-        if span_elem['t'] == "RawInline" and span_elem['c'][0] == "html" and \
-                span_elem['c'][1].startswith("<ctlink") and span_elem['c'][1].endswith("/>"):
-            spans.append({"type": "span-ct-link"})
-            return
-        if span_elem['t'] == "RawInline" and span_elem['c'][0] == "html" and span_elem['c'][1] == "</abbr>" \
-                and len(span_elem['c']) >= 3:
-            abbr_long = ""
-            for child_pos, child in enumerate(span_elem['c'][2]):
-                if child['t'] == "RawInline" and child['c'][0] == "html" and child['c'][1] == "</abbr-long>" \
-                        and len(child['c']) >= 3:
-                    abbr_long = convert_list_text_only([span_elem['c'][2].pop(child_pos)])
-                    break
-            spans.append({"type": "span-abbreviation",
-                          "abbreviation": convert_list_text_only(span_elem['c'][2]),
-                          "long_name": abbr_long})
-            return
-        if span_elem['t'] == "RawInline" and span_elem['c'][0] == "html" and span_elem['c'][1] == "</math>":
-            spans.append({"type": "span-mathml", "formula": convert_list_xml(span_elem['c'][2])})
-            return
-        if span_elem['t'] == "Link":
-            spans.append({
-                "type": "span-link",
-                "link_text": consume_str(span_elem['c'][1]),
-                "url": span_elem['c'][2][0]
-            })
-            return
-        if span_elem['t'] in PANDOC_SPAN_TYPES.keys() and span_type in PANDOC_SPAN_TYPES.values():
-            spans += convert_list(span_elem['c'], block_list, "span-strong-emphasized", indent + "  ")
-            return
-        if span_elem['t'] in PANDOC_SPAN_TYPES.keys():
-            spans += convert_list(span_elem['c'], block_list, PANDOC_SPAN_TYPES[span_elem['t']], indent + "  ")
-            return
-        if span_elem['t'] == "Image":
-            block_list.append({
-                "type": "block-image",
-                "image_uri": span_elem['c'][2][0],
-                "caption": convert_list_for_caption_spans(span_elem['c'][1]),
-                "alt": span_elem['c'][2][1]
-            })
-            return
-        raise SyntaxError(indent + "Unknown type: " + str(span_elem))
-
-    def merge_list(long_span_list: list) -> None:
-        pos = 0
-        while len(long_span_list) > pos+1:
-            if long_span_list[pos]['type'] == long_span_list[pos + 1]['type']:
-                content_key = "text"
-                if long_span_list[pos]['type'] == "span-listing":
-                    content_key = "listing_text"
-                elif long_span_list[pos]['type'] == "span-container":
-                    content_key = "spans"
-                pop_item = long_span_list.pop(pos + 1)
-                long_span_list[pos][content_key] += pop_item[content_key]
-            else:
-                pos += 1
+def unknown_span_type(walker: TreeWalker, span_elem: dict) -> SyntaxError:
+    return SyntaxError("  " * walker.depth + "Unknown type: " + str(span_elem))
+
+
+def descend_spans(walker: TreeWalker, span_list: list, spans: list, span_type: str) -> None:
+    # Converts span_list into spans before the next sibling. The spans are merged by the owner of spans.
+    walker.descend(span_list, visit_span, None, (spans, span_type, None))
+
+
+def leave_quoted(walker: TreeWalker, state: tuple) -> None:
+    spans, span_type, quote_mark = state
+    spans.append(create_span(span_type, quote_mark))
+
+
+def convert_quoted(span_elem: dict, spans: list, block_list: list, span_type: str,
+                   walker: TreeWalker) -> None:
+    quote_mark = span_elem['c'][0]
+    if type(quote_mark) in NODE_TYPES:
+        if quote_mark['t'] not in CHARACTER_TYPES.keys():
+            raise SyntaxError("  " * (walker.depth + 1) + "Unknown type: " + str(quote_mark))
+        quote_mark = CHARACTER_TYPES[quote_mark['t']]
+    spans.append(create_span(span_type, quote_mark))
+    walker.descend(span_elem['c'][1], visit_span, leave_quoted, (spans, span_type, quote_mark))
+
+
+def leave_container(walker: TreeWalker, state: tuple) -> None:
+    container_spans, span_type, spans = state
+    spans.append(container_span(merge_spans(container_spans)))
+
+
+def convert_container(span_elem: dict, spans: list, block_list: list, span_type: str,
+                      walker: TreeWalker) -> None:
+    walker.descend(span_elem['c'], visit_span, leave_container, ([], span_type, spans))
+
+
+def convert_character(span_elem: dict, spans: list, block_list: list, span_type: str,
+                      walker: TreeWalker) -> None:
+    spans.append(create_span(span_type, CHARACTER_TYPES[span_elem['t']]))
+
+
+def convert_str(span_elem: dict, spans: list, block_list: list, span_type: str,
+                walker: TreeWalker) -> None:
+    spans.append(create_span(span_type, span_elem['c']))
+
+
+def convert_code(span_elem: dict, spans: list, block_list: list, span_type: str,
+                 walker: TreeWalker) -> None:
+    spans.append(create_span("span-listing", span_elem['c'][1]))
+
+
+def convert_link(span_elem: dict, spans: list, block_list: list, span_type: str,
+                 walker: TreeWalker) -> None:
+    spans.append(link_span(consume_str(span_elem['c'][1]), span_elem['c'][2][0]))
+
+
+def convert_emphasis(span_elem: dict, spans: list, block_list: list, span_type: str,
+                     walker: TreeWalker) -> None:
+    if span_type in PANDOC_SPAN_TYPES.values():
+        descend_spans(walker, span_elem['c'], spans, "span-strong-emphasized")
+    else:
+        descend_spans(walker, span_elem['c'], spans, PANDOC_SPAN_TYPES[span_elem['t']])
+
+
+def convert_image(span_elem: dict, spans: list, block_list: list, span_type: str,
+                  walker: TreeWalker) -> None:
+    block_list.append(image_block(span_elem['c'][2][0], convert_list_for_caption_spans(span_elem['c'][1]),
+                                  span_elem['c'][2][1]))
+
+
+def convert_path(span_elem: dict, spans: list, block_list: list, span_type: str,
+                 walker: TreeWalker) -> None:
+    spans.append(path_span(convert_list_text_only(span_elem['c'][2])))
+
+
+def convert_program_name(span_elem: dict, spans: list, block_list: list, span_type: str,
+                         walker: TreeWalker) -> None:
+    spans.append(program_span(convert_list_text_only(span_elem['c'][2])))
+
+
+def convert_abbreviation(span_elem: dict, spans: list, block_list: list, span_type: str,
+                         walker: TreeWalker) -> None:
+    abbr_long = ""
+    for child_pos, child in enumerate(span_elem['c'][2]):
+        if child['t'] == "RawInline" and child['c'][0] == "html" and child['c'][1] == "</abbr-long>" \
+                and len(child['c']) >= 3:
+            abbr_long = convert_list_text_only([span_elem['c'][2].pop(child_pos)])
+            break
+    spans.append(abbreviation_span(convert_list_text_only(span_elem['c'][2]), abbr_long))
+
+
+def convert_mathml(span_elem: dict, spans: list, block_list: list, span_type: str,
+                   walker: TreeWalker) -> None:
+    spans.append(mathml_span(convert_list_xml(span_elem['c'][2])))
+
+
+def convert_ct_link(span_elem: dict, spans: list, block_list: list, span_type: str,
+                    walker: TreeWalker) -> None:
+    spans.append(ct_link_span())
+
 
+def html_span_converter(span_elem: dict):
+    tag = scan_tag(span_elem['c'][1])
+    if tag is None:
+        return None
+    if tag.closing:
+        if len(span_elem['c']) < 3:
+            return None
+        return HTML_SPAN_CONVERTERS.get(tag.name)
+    if tag.empty:
+        return HTML_EMPTY_SPAN_CONVERTERS.get(tag.name)
+    return None
+
+
+def convert_raw_inline(span_elem: dict, spans: list, block_list: list, span_type: str,
+                       walker: TreeWalker) -> None:
+    converter = html_span_converter(span_elem) if span_elem['c'][0] == "html" else None
+    if converter is None:
+        raise unknown_span_type(walker, span_elem)
+    converter(span_elem, spans, block_list, span_type, walker)
+
+
+# Converters for the nodes in convert_list by pandoc node type. The html tags collected by
+# collect_html_content are converted by their tag name: HTML_SPAN_CONVERTERS gets the closing
+# tag with the collected content, HTML_EMPTY_SPAN_CONVERTERS gets empty tags like <ctlink />.
+# A converter appends the spans to spans and the blocks to block_list. Nested lists of nodes are
+# converted with descend_spans() after the converter returned.
+SPAN_CONVERTERS = {
+    "Quoted": convert_quoted,
+    "Plain": convert_container,
+    "Para": convert_container,
+    "Str": convert_str,
+    "Code": convert_code,
+    "RawInline": convert_raw_inline,
+    "Link": convert_link,
+    "Image": convert_image
+}
+SPAN_CONVERTERS.update({character_type: convert_character for character_type in CHARACTER_TYPES.keys()})
+SPAN_CONVERTERS.update({pandoc_span_type: convert_emphasis for pandoc_span_type in PANDOC_SPAN_TYPES.keys()})
+HTML_SPAN_CONVERTERS = {
+    "fs-path": convert_path,
+    "program-name": convert_program_name,
+    "abbr": convert_abbreviation,
+    "math": convert_mathml
+}
+HTML_EMPTY_SPAN_CONVERTERS = {
+    "ctlink": convert_ct_link
+}
+BUILTIN_CONVERTERS = (dict(SPAN_CONVERTERS), dict(HTML_SPAN_CONVERTERS), dict(HTML_EMPTY_SPAN_CONVERTERS))
+
+
+def visit_span(walker: TreeWalker, span_elem: dict) -> None:
+    converter = SPAN_CONVERTERS.get(span_elem['t'])
+    if converter is None:
+        raise unknown_span_type(walker, span_elem)
+    state = walker.states[-1]
+    converter(span_elem, state[0], walker.output, state[1], walker)
+
+
+def convert_list(span_list: list, block_list: list, span_type: str = "span-regular") -> list:
     converted_spans = []
-    for span_element in span_list:
-        convert_elem(converted_spans, span_element)
-    merge_list(converted_spans)
-    return converted_spans
+    TreeWalker(block_list).walk(span_list, visit_span, (converted_spans, span_type, None))
+    return merge_spans(converted_spans)
 
 
-def json_from_markdown(markdown: str) -> list:
-    def add_to_asset_list(asset_block: dict) -> None:
-        if len(unfinished_key) >= 1 and unfinished_key[-1] is None:
-            raise Exception("There are embedded assets at a position where no embedding is allowed! " +
-                            "Maybe a key: MD_BLOCK is missing.")
-        if len(unfinished_key) > 0:
-            unfinished_block[-1][unfinished_key[-1]].append(asset_block)
-        else:
-            block_assets_list.append(asset_block)
-
-    def extract_list_items(list_block_items: list) -> list:
-        items = []
-        for para in list_block_items:
-            paras_list = []
-            if len(para) > 0:
-                paras_list.append(convert_list(para[:1],
-                                               unfinished_block[-1][unfinished_key[-1]]
-                                               if len(unfinished_key) > 0 and len(unfinished_block) > 0 else
-                                               block_assets_list
-                                               )[0])
-            if len(para) > 1:
-                paras_list.append({"type": "span-line-break-container",
-                                   "spans": convert_list(para[1:],
-                                                         unfinished_block[-1][unfinished_key[-1]]
-                                                         if len(unfinished_key) > 0 and len(unfinished_block) > 0 else
-                                                         block_assets_list)})
-            items.append({"type": "span-container", "spans": paras_list})
-        return items
-
-    def is_typed_sublist(o: dict) -> bool:
-        if 'c' not in o.keys():
-            return False
-        if type(o['c']) is not list:
-            return False
-        child_list = o['c']
+def markdown_text(markdown) -> str:
+    if type(markdown) is bytes:
+        return markdown.decode('utf-8', errors='replace')
+    return markdown
+
+
+def loads_pandoc_tree(pandoc_json, reader: str = None) -> dict:
+    # The differential reader compares the dicts of both readers.
+    if (reader or MARKDOWN_READER) == "differential":
+        return fast_json.loads(pandoc_json)
+    if LOW_MEMORY_CONVERSION:
+        return lazy_ast.loads(pandoc_json)
+    return compact_ast.loads_tree(pandoc_json)
+
+
+def read_pandoc_tree(markdown, reader: str = None, shared_pandoc: bool = True) -> dict:
+    # markdown is a str or UTF-8 bytes. Bytes go to pandoc without being decoded. Without shared_pandoc pandoc
+    # runs as a subprocess and never through the batcher or the pandoc server.
+    if reader is None:
+        reader = MARKDOWN_READER
+    if reader == "python":
+        try:
+            return read_markdown(markdown_text(markdown))
+        except UnsupportedMarkdown:
+            pass  # pandoc reads everything
+    if PANDOC_BATCHING and shared_pandoc and reader != "differential":  # header identifiers differ in batches
+        return pandoc_batcher.convert(markdown_text(markdown))
+    backend = PANDOC_BACKEND if shared_pandoc else "subprocess"
+    if PIPELINED_PARSING and backend == "subprocess" and reader != "differential":
+        return lazy_ast.loads_chunks(iter_with_subprocess(markdown))
+    pandoc_tree = loads_pandoc_tree(convert_markdown(markdown, backend), reader)
+    if reader == "differential":
+        check_against_pandoc(markdown_text(markdown), pandoc_tree)
+    return pandoc_tree
+
+
+def read_pandoc_pipe(pipe: PandocPipe) -> dict:
+    if PIPELINED_PARSING:
+        return lazy_ast.loads_chunks(pipe.iter_result())
+    return loads_pandoc_tree(pipe.result())
+
+
+def extract_list_items(list_block_items: list, block_list: list) -> list:
+    items = []
+    for para in list_block_items:
+        paras_list = []
+        if len(para) > 0:
+            paras_list.append(convert_list(para[:1], block_list)[0])
+        if len(para) > 1:
+            paras_list.append(container_span(convert_list(para[1:], block_list), "span-line-break-container"))
+        items.append(container_span(paras_list))
+    return items
+
+
+def is_typed_sublist(o: dict) -> bool:
+    if 'c' not in o.keys():
+        return False
+    if type(o['c']) is not list:
+        return False
+    child_list = o['c']
+    if o['t'] == 'OrderedList':
+        child_list = o['c'][1][0]
+    elif o['t'] == 'BulletList':
+        child_list = o['c'][0]
+    all_typed = True
+    for child_item in child_list:
+        if type(child_item) is not Node and (type(child_item) is not dict or 't' not in child_item.keys()):
+            all_typed = False
+    return all_typed
+
+
+class Rope:
+    # Lazy concatenation of two non-empty ropes. The leaves are non-empty tuples.
+    __slots__ = ("left", "right")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+def rope_concat(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return Rope(left, right)
+
+
+def rope_pop(rope) -> tuple:
+    lefts = []
+    while type(rope) is Rope:
+        lefts.append(rope.left)
+        rope = rope.right
+    item = rope[-1]
+    rest = rope[:-1] if len(rope) > 1 else None
+    for left in reversed(lefts):
+        rest = rope_concat(left, rest)
+    return item, rest
+
+
+class HtmlContent:
+    # The content lists of the open elements of one tag name. After every sublist the lists of all tags
+    # are duplicated (html_content used to be merged into itself). The duplicates stay behind as residue
+    # when the elements close and closing tags without an open element take their content from there.
+    __slots__ = ("open_lists", "residue")
+
+    def __init__(self):
+        self.open_lists = []
+        self.residue = None
+
+    def duplicate(self) -> None:
+        self.residue = rope_concat(rope_concat(self.residue, tuple(self.open_lists) or None), self.residue)
+
+    def pop(self) -> list:
+        if len(self.open_lists) > 0:
+            return self.open_lists.pop()
+        content, self.residue = rope_pop(self.residue)
+        return content
+
+    def is_empty(self) -> bool:
+        return len(self.open_lists) == 0 and self.residue is None
+
+
+def keep_html_node(walker: TreeWalker, kept: list, o: dict) -> None:
+    html_content, current_tag_stack = walker.output
+    if len(current_tag_stack) > 0:
+        html_content[current_tag_stack[-1]].open_lists[-1].append(o)
+    else:
+        kept.append(o)
+
+
+def leave_html_sublist(walker: TreeWalker, state: tuple) -> None:
+    sublist, kept = state
+    sublist[:] = kept
+    for tag_content in walker.output[0].values():
+        tag_content.duplicate()
+
+
+def leave_typed_sublist(walker: TreeWalker, state: tuple) -> None:
+    kept, o = state
+    keep_html_node(walker, kept, o)
+
+
+def visit_html_content(walker: TreeWalker, o: dict) -> None:
+    html_content, current_tag_stack = walker.output
+    kept = walker.states[-1][1]
+    content = o.get('c') if type(o) is dict else getattr(o, 'c', None)
+    if type(content) is list and is_typed_sublist(o):
         if o['t'] == 'OrderedList':
-            child_list = o['c'][1][0]
+            sublists = o['c'][1]
         elif o['t'] == 'BulletList':
-            child_list = o['c'][0]
-        all_typed = True
-        for child_item in child_list:
-            if type(child_item) is not dict or 't' not in child_item.keys():
-                all_typed = False
-        return all_typed
-
-    def collect_html_content(o_list: list, html_content: dict, current_tag_stack: list) -> dict:
-        def merge_content(old_content: dict, new_content: dict):
-            for content_key in new_content.keys():
-                if content_key in old_content.keys():
-                    old_content[content_key] += new_content[content_key]
-                else:
-                    old_content[content_key] = new_content[content_key]
-
-        i = 0
-        while i < len(o_list):
-            o = o_list[i]
-            if is_typed_sublist(o):
-                if o['t'] == 'OrderedList':
-                    for item_spans in o['c'][1]:
-                        merge_content(html_content,
-                                      collect_html_content(item_spans, html_content, current_tag_stack))
-                elif o['t'] == 'BulletList':
-                    for item_spans in o['c']:
-                        merge_content(html_content,
-                                      collect_html_content(item_spans, html_content, current_tag_stack))
-                else:
-                    merge_content(html_content,
-                                  collect_html_content(o['c'], html_content, current_tag_stack))
-            if o['t'] in ['RawInline'] and o['c'][0] == 'html':
-                if re.match(r"^<!---\s*-->$", o['c'][1]):
-                    i += 1
-                    continue
-                html_regex_matches = re.finditer(
-                    r"^<(?P<end_tag>/)?(?P<tag_name>[\w\-_]+)" +
-                    r"(?P<properties>( [\w\-_]+=\"[^\"]+\"))?(?P<empty_tag>[ ]?/)?>$",
-                    o['c'][1])
-                for match in html_regex_matches:
-                    if match.group('empty_tag') is not None:
-                        o['c'].append([])
-                        i += 1
-                        break
-                    if match.group('end_tag') is None:
-                        if match.group('tag_name') not in html_content.keys():
-                            html_content[match.group('tag_name')] = [[]]
-                        else:
-                            html_content[match.group('tag_name')].append([])
-                        current_tag_stack.append(match.group('tag_name'))
-                        o_list.pop(i)
-                        break
-                    else:  # closing tag
-                        for current_tag_stack_counter in range(len(current_tag_stack)-1, -1, -1):
-                            if current_tag_stack[current_tag_stack_counter] == match.group('tag_name'):
-                                current_tag_stack.pop(current_tag_stack_counter)
-                        o['c'].append(html_content[match.group('tag_name')].pop(-1))
-                        if len(html_content[match.group('tag_name')]) == 0:
-                            html_content.pop(match.group('tag_name'), None)
-                        if len(current_tag_stack) > 0:
-                            html_content[current_tag_stack[-1]][-1].append(o)
-                            o_list.pop(i)
-                        else:
-                            i += 1
-                        break
-                continue
-            else:
-                if len(current_tag_stack) > 0:
-                    html_content[current_tag_stack[-1]][-1].append(o)
-                    o_list.pop(i)
-                else:
-                    i += 1
-        return html_content
-
-    def replace_specials(tree: dict):
-        for tree_key in tree.keys():
-            if type(tree[tree_key]) is dict:
-                tree[tree_key] = replace_specials(tree[tree_key])
-            elif type(tree[tree_key]) in [float, int]:
-                tree[tree_key] = str(tree[tree_key])
-            elif tree[tree_key] is None:
-                tree[tree_key] = []
-            elif tree[tree_key] in ['<ctlink />', '<ctlink/>']:
-                tree[tree_key] = {'type': 'span-ct-link'}
-        return tree
-
-    def replace_specials_list(element_list: list):
-        for i, element_list_item in enumerate(element_list):
-            if type(element_list_item) is list:
-                element_list[i] = replace_specials_list(element_list_item)
-            elif type(element_list_item) is dict:
-                element_list[i] = replace_specials(element_list_item)
-            elif element_list_item is None:
-                element_list[i] = []
-        return element_list
-
-    block_assets_list = []
-    pandoc_tree = json.loads(pypandoc.convert_text(markdown, to='json', format='markdown_github-smart',
-                                                   extra_args=['--preserve-tabs']))
-    # print(json.dumps(pandoc_tree, indent=2))
-    collect_html_content(pandoc_tree['blocks'], {}, current_tag_stack=[])
+            sublists = o['c']
+        else:
+            sublists = [o['c']]
+        # o itself is kept after all of its sublists were collected.
+        walker.descend((), None, leave_typed_sublist, (kept, o))
+        for sublist in reversed(sublists):
+            walker.descend(sublist, visit_html_content, leave_html_sublist, (sublist, []))
+        return
+    if o['t'] == 'RawInline' and o['c'][0] == 'html':
+        if is_empty_comment(o['c'][1]):
+            kept.append(o)
+            return
+        tag = scan_tag(o['c'][1])
+        if tag is not None:
+            tag_name = tag.name
+            if tag.empty:
+                o['c'].append([])
+                kept.append(o)
+                return
+            if not tag.closing:
+                if tag_name not in html_content:
+                    html_content[tag_name] = HtmlContent()
+                html_content[tag_name].open_lists.append([])
+                current_tag_stack.append(tag_name)
+                return
+            current_tag_stack[:] = [open_tag for open_tag in current_tag_stack if open_tag != tag_name]
+            o['c'].append(html_content[tag_name].pop())
+            if html_content[tag_name].is_empty():
+                del html_content[tag_name]
+    keep_html_node(walker, kept, o)
+
+
+def collect_html_content(o_list: list, html_content: dict, current_tag_stack: list) -> dict:
+    # Moves everything between an opening and a closing html tag into the closing RawInline as o['c'][2].
+    # The opening tags are removed. Every list is rebuilt once instead of popping the moved elements.
+    walker = TreeWalker((html_content, current_tag_stack))
+    o_list[:] = walker.walk(o_list, visit_html_content, (o_list, []))[1]
+    return html_content
+
+
+def isolated_block_events(blocks: list):
+    # The events of blocks which are converted without the rest of the document. Returns None if html tags are
+    # left open at the end: Their content is collected across the boundary, so the blocks can not be converted
+    # on their own.
+    html_content = {}
+    current_tag_stack = []
+    try:
+        collect_html_content(blocks, html_content, current_tag_stack)
+    except (KeyError, IndexError):
+        return None
+    if len(html_content) > 0 or len(current_tag_stack) > 0:
+        return None
+    return [event for block in blocks for event in block_events(block)]
+
+
+def visit_special(walker: TreeWalker, tree_key) -> None:
+    tree = walker.states[-1]
+    if type(tree[tree_key]) is dict:
+        descend_specials(walker, tree[tree_key])
+    elif type(tree[tree_key]) in [float, int]:
+        tree[tree_key] = str(tree[tree_key])
+    elif tree[tree_key] is None:
+        tree[tree_key] = []
+    elif tree[tree_key] in ['<ctlink />', '<ctlink/>']:
+        tree[tree_key] = ct_link_span()
+
+
+def visit_special_list_item(walker: TreeWalker, i: int) -> None:
+    element_list = walker.states[-1]
+    if type(element_list[i]) in [list, dict]:
+        descend_specials(walker, element_list[i])
+    elif element_list[i] is None:
+        element_list[i] = []
+
+
+def descend_specials(walker: TreeWalker, tree) -> None:
+    # YAML aliases may share or even nest a dict or list. Each of them is replaced once.
+    if id(tree) in walker.output:
+        return
+    walker.output.add(id(tree))
+    if type(tree) is dict:
+        walker.descend(list(tree.keys()), visit_special, state=tree)
+    else:
+        walker.descend(range(len(tree)), visit_special_list_item, state=tree)
+
+
+def replace_specials(tree: dict):
+    TreeWalker({id(tree)}).walk(list(tree.keys()), visit_special, tree)
+    return tree
+
+
+def replace_specials_list(element_list: list):
+    TreeWalker({id(element_list)}).walk(range(len(element_list)), visit_special_list_item, element_list)
+    return element_list
+
+
+def block_events(block: dict) -> list:
+    # Converts one top-level pandoc block without knowing where it ends up. The result is a list of
+    # assets (dicts or typed assets) and the YAML texts (strs) of magic blocks, which iter_assets() puts together.
+    embedded_assets = []
+    if block['t'] == 'Para':
+        paragraph_asset = paragraph_block(convert_list(block['c'], embedded_assets))
+        if len(paragraph_asset["spans"]) > 0:
+            return embedded_assets + [paragraph_asset]
+        return embedded_assets
+    elif block['t'] == 'Header':
+        return [heading_block("block-" + "sub"*(block['c'][0]-1) + "heading", convert_list_text_only(block['c'][2]))]
+    elif block['t'] == 'BlockQuote':
+        return [citation_block(convert_list_text_only(block['c']), "")]
+    elif block['t'] == 'OrderedList':
+        list_asset = list_block("block-ordered-list", extract_list_items(block['c'][1], embedded_assets))
+        return embedded_assets + [list_asset]
+    elif block['t'] == 'BulletList':
+        list_asset = list_block("block-unordered-list", extract_list_items(block['c'], embedded_assets))
+        return embedded_assets + [list_asset]
+    elif block['t'] == 'CodeBlock':
+        return [listing_block(block['c'][0][1][0], block['c'][1])]
+    elif block['t'] == "RawBlock":
+        yaml_text = magic_comment_text(block['c'][1])
+        if yaml_text is not None:
+            return [yaml_text]
+    return []
+
+
+@functools.lru_cache(maxsize=YAML_CACHE_SIZE)
+def pickled_yaml(yaml_text: str) -> bytes:
+    return pickle.dumps(yaml.load(yaml_text, Loader=YAML_LOADER), pickle.HIGHEST_PROTOCOL)
+
 
+def load_yaml(yaml_text: str):
+    # The same headers repeat in every article, so they are parsed once per worker. The memo keeps the
+    # parsed tree pickled: Every call gets a fresh copy which iter_assets may modify.
+    if YAML_CACHE_SIZE <= 0:
+        return yaml.load(yaml_text, Loader=YAML_LOADER)
+    return pickle.loads(pickled_yaml(yaml_text))
+
+
+def iter_assets(events):
+    # Yields every top-level asset as soon as it is finished.
     unfinished_block = []
     unfinished_key = []
-    for block in pandoc_tree['blocks']:
-        if block['t'] == 'Para':
-            paragraph_asset = {"type": 'block-paragraph',
-                               "spans": convert_list(block['c'],
-                                                     block_assets_list if len(unfinished_block) <= 0 else
-                                                     unfinished_block[-1][unfinished_key[-1]])}
-            if len(paragraph_asset["spans"]) > 0:
-                add_to_asset_list(paragraph_asset)
-        elif block['t'] == 'Header':
-            header_asset = {"type": "block-" + "sub"*(block['c'][0]-1) + "heading",
-                            "heading": convert_list_text_only(block['c'][2])}
-            add_to_asset_list(header_asset)
-        elif block['t'] == 'BlockQuote':
-            quote_asset = {"type": 'block-citation',
-                           "statement": convert_list_text_only(block['c']),
-                           "attribution": ""}
-            add_to_asset_list(quote_asset)
-        elif block['t'] == 'OrderedList':
-            list_asset = {"type": "block-ordered-list", "items": extract_list_items(block['c'][1])}
-            add_to_asset_list(list_asset)
-        elif block['t'] == 'BulletList':
-            list_asset = {"type": "block-unordered-list", "items": extract_list_items(block['c'])}
-            add_to_asset_list(list_asset)
-        elif block['t'] == 'CodeBlock':
-            code_asset = {"type": 'block-listing',
-                          "language": block['c'][0][1][0],
-                          "code": block['c'][1]}
-            add_to_asset_list(code_asset)
-        elif block['t'] == "RawBlock":
-            yaml_regex = r"^<!---(?P<yaml>[\s\S]*?)-->$"
-            matches = re.match(yaml_regex, block['c'][1])
-            if matches:
-                yaml_tree = yaml.safe_load(matches.groupdict()['yaml'])
-                if yaml_tree is None:
-                    yaml_tree = {}
-                if 'type' in yaml_tree.keys():
-                    unfinished_block.append({})
-                    unfinished_key.append(None)
-                block_with_markdown = False  # type: bool
-                if len(unfinished_block) <= 0:
-                    continue  # This is a invalid magic block because it has no type and it is also no continuation.
-                for key in yaml_tree:
-                    if yaml_tree[key] in ["MD_BLOCK", "MD_BLOCK\n",
-                                          "MD-BLOCK", "MD-BLOCK\n",
-                                          "MDBLOCK", "MDBLOCK\n"]:
-                        block_with_markdown = True
-                        unfinished_key[-1] = key
-                        unfinished_block[-1][key] = []
-                    else:
-                        if type(yaml_tree[key]) is list:
-                            unfinished_block[-1][key] = replace_specials_list(yaml_tree[key])
-                        elif type(yaml_tree[key]) is dict:
-                            unfinished_block[-1][key] = replace_specials(yaml_tree[key])
-                        elif yaml_tree[key] is None:
-                            unfinished_block[-1][key] = []
-                        else:
-                            unfinished_block[-1][key] = str(yaml_tree[key])
-                if block_with_markdown is False:
-                    finished_key = unfinished_key.pop()
-                    finished_block = unfinished_block.pop()
-                    if len(unfinished_block) > 0:
-                        unfinished_block[-1][unfinished_key[-1]].append(finished_block)
-                    else:
-                        block_assets_list.append(finished_block)
-    return block_assets_list
+    for event in events:
+        if type(event) is not str:
+            if len(unfinished_key) >= 1 and unfinished_key[-1] is None:
+                raise Exception("There are embedded assets at a position where no embedding is allowed! " +
+                                "Maybe a key: MD_BLOCK is missing.")
+            if len(unfinished_key) > 0:
+                unfinished_block[-1][unfinished_key[-1]].append(event)
+            else:
+                yield event
+            continue
+        yaml_tree = load_yaml(event)
+        if yaml_tree is None:
+            yaml_tree = {}
+        if 'type' in yaml_tree.keys():
+            unfinished_block.append({})
+            unfinished_key.append(None)
+        block_with_markdown = False  # type: bool
+        if len(unfinished_block) <= 0:
+            continue  # This is a invalid magic block because it has no type and it is also no continuation.
+        for key in yaml_tree:
+            if yaml_tree[key] in ["MD_BLOCK", "MD_BLOCK\n",
+                                  "MD-BLOCK", "MD-BLOCK\n",
+                                  "MDBLOCK", "MDBLOCK\n"]:
+                block_with_markdown = True
+                unfinished_key[-1] = key
+                unfinished_block[-1][key] = []
+            else:
+                if type(yaml_tree[key]) is list:
+                    unfinished_block[-1][key] = replace_specials_list(yaml_tree[key])
+                elif type(yaml_tree[key]) is dict:
+                    unfinished_block[-1][key] = replace_specials(yaml_tree[key])
+                elif yaml_tree[key] is None:
+                    unfinished_block[-1][key] = []
+                else:
+                    unfinished_block[-1][key] = str(yaml_tree[key])
+        if block_with_markdown is False:
+            finished_key = unfinished_key.pop()
+            finished_block = unfinished_block.pop()
+            if len(unfinished_block) > 0:
+                unfinished_block[-1][unfinished_key[-1]].append(finished_block)
+            else:
+                yield finished_block
+
+
+def iter_consumed(blocks: list):
+    blocks.reverse()
+    while len(blocks) > 0:
+        yield blocks.pop()
+
+
+def iter_block_events(blocks):
+    # Groups the html tags of the blocks like collect_html_content() and yields the events of every block
+    # which stays on the top level as soon as it is final.
+    # blocks may also be an iterator. With it or LOW_MEMORY_CONVERSION the grouped blocks are not kept and a list
+    # is emptied block by block, so every block is freed once it is converted.
+    consume = LOW_MEMORY_CONVERSION or type(blocks) is not list
+    walker = TreeWalker(({}, []))
+    kept_blocks = []
+    for block in iter_consumed(blocks) if consume and type(blocks) is list else blocks:
+        if consume:
+            kept_blocks.clear()
+        kept_count = len(kept_blocks)
+        walker.walk((block,), visit_html_content, (None, kept_blocks))
+        if len(kept_blocks) > kept_count:
+            yield from block_events(block)
+    if not consume:
+        blocks[:] = kept_blocks
+
+
+def iter_json_from_pandoc_tree(pandoc_tree: dict):
+    return iter_assets(iter_block_events(pandoc_tree['blocks']))
+
+
+def json_from_pandoc_tree(pandoc_tree: dict) -> list:
+    return list(iter_json_from_pandoc_tree(pandoc_tree))
+
+
+def segment_events(segment: str, reader: str):
+    # Runs in a worker of the process pool. A batcher or pandoc server of the worker would only add its window or
+    # its start, so pandoc runs as a subprocess. The events go back as JSON, which is faster to pass than pickles.
+    events = isolated_block_events(list(read_pandoc_tree(segment, reader, shared_pandoc=False)['blocks']))
+    if events is None:
+        return None
+    return fast_json.dumps(events)
+
+
+def iter_parallel_events(markdown: str, reader: str):
+    # Returns None if the document is converted in one piece.
+    if len(markdown) < PARALLEL_CONVERSION_BYTES or PARALLEL_CONVERSION_BYTES <= 0 or \
+            (SPAN_CONVERTERS, HTML_SPAN_CONVERTERS, HTML_EMPTY_SPAN_CONVERTERS) != BUILTIN_CONVERTERS:
+        return None  # custom converters are not registered in the workers
+    segments = split_segments(markdown_text(markdown), PARALLEL_WORKERS)
+    if segments is None:
+        return None
+    results = list(get_executor().map(segment_events, segments, [reader] * len(segments)))
+    if None in results:
+        return None
+    return (event for events in results for event in fast_json.loads(events))
+
+
+def iter_json_from_markdown(markdown: str, reader: str = None):
+    events = iter_parallel_events(markdown, reader)
+    if events is not None:
+        return iter_assets(events)
+    return iter_json_from_pandoc_tree(read_pandoc_tree(markdown, reader))
+
+
+def json_from_markdown(markdown: str, reader: str = None) -> list:
+    return list(iter_json_from_markdown(markdown, reader))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Scans the html of pandoc's RawInline and RawBlock nodes: tags like <fs-path>, </abbr>, <ctlink /> and
+# <mi mathvariant="normal">, empty comments <!--- --> and the magic comments <!--- yaml -->. The scanner
+# accepts the same strings as the regular expressions it replaced. It only compares the ends of a string
+# and searches it with str methods, so its time is linear in the length of the string without backtracking.
+# Like $ in a regular expression, a single newline is allowed after the closing >.
+
+COMMENT_START = "<!---"
+COMMENT_END = "-->"
+
+
+class HtmlTag:
+    # properties is the single attribute of a tag including its leading space, e.g. ' mathvariant="normal"'.
+    __slots__ = ("name", "closing", "empty", "properties")
+
+    def __init__(self, name: str, closing: bool, empty: bool, properties: str = None):
+        self.name = name
+        self.closing = closing
+        self.empty = empty
+        self.properties = properties
+
+
+def text_end(raw: str) -> int:
+    if raw.endswith("\n"):
+        return len(raw) - 1
+    return len(raw)
+
+
+def is_name(text: str) -> bool:
+    # Letters, digits, "_" and "-" like [\w\-_]+.
+    return len(text) > 0 and text.replace("-", "_").replace("_", "a").isalnum()
+
+
+def scan_tag(raw: str):
+    # Returns an HtmlTag or None if raw is not a single tag with at most one attribute.
+    end = len(raw)
+    if raw.endswith("\n"):
+        end -= 1
+    if end < 3 or raw[0] != "<" or raw[end - 1] != ">":
+        return None
+    closing = raw[1] == "/"
+    start = 2 if closing else 1
+    stop = end - 1
+    empty = raw.endswith("/", start, stop)
+    if empty:
+        stop -= 2 if raw.endswith(" /", start, stop) else 1
+    space = raw.find(" ", start, stop)
+    if space < 0:
+        name = raw[start:stop]
+        return HtmlTag(name, closing, empty) if is_name(name) else None
+    name = raw[start:space]
+    equals = raw.find("=", space, stop)
+    if not is_name(name) or equals < 0 or not is_name(raw[space + 1:equals]):
+        return None
+    # The value in quotes must not be empty and must not contain quotes.
+    if stop - equals < 4 or raw[equals + 1] != '"' or raw[stop - 1] != '"' or \
+            raw.find('"', equals + 2, stop - 1) >= 0:
+        return None
+    return HtmlTag(name, closing, empty, raw[space:stop])
+
+
+def is_empty_comment(raw: str) -> bool:
+    # <!--- followed by whitespace only and -->.
+    end = text_end(raw)
+    if not raw.startswith(COMMENT_START) or not raw.endswith(COMMENT_END, 0, end) or end < 8:
+        return False
+    whitespace = raw[len(COMMENT_START):end - len(COMMENT_END)]
+    return len(whitespace) == 0 or whitespace.isspace()
+
+
+def magic_comment_text(raw: str):
+    # Returns the text between <!--- and --> or None if raw is no magic comment.
+    end = text_end(raw)
+    if not raw.startswith(COMMENT_START) or not raw.endswith(COMMENT_END, 0, end) or end < 8:
+        return None
+    return raw[len(COMMENT_START):end - len(COMMENT_END)]
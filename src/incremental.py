@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import compact_ast
+import fast_json
+import os
+from conversion_cache import ConversionCache, cache_key
+from helpers import read_pandoc_tree, isolated_block_events, iter_assets, \
+    iter_json_from_pandoc_tree, iter_json_from_markdown, MARKDOWN_READER
+from block_chunks import split_chunks, join_chunks, split_blocks
+
+INCREMENTAL_CONVERSION = os.environ.get("INCREMENTAL_CONVERSION", "0") == "1"
+CHUNK_CACHE_BYTES = int(os.environ.get("CHUNK_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 disables
+
+chunk_cache = ConversionCache(CHUNK_CACHE_BYTES)
+
+
+def read_blocks(markdown: str, reader: str) -> list:
+    # A list even if LOW_MEMORY_CONVERSION reads the blocks lazily: they are cached as a whole.
+    return list(read_pandoc_tree(markdown, reader)['blocks'])
+
+
+def read_chunks(chunks: list, reader: str) -> list:
+    if len(chunks) == 1:
+        return [read_blocks(chunks[0], reader)]
+    # All changed chunks go through one pandoc run.
+    joined_markdown, separator = join_chunks(chunks)
+    chunk_blocks = split_blocks(read_blocks(joined_markdown, reader), separator)
+    if len(chunk_blocks) != len(chunks):
+        return [read_blocks(chunk, reader) for chunk in chunks]
+    return chunk_blocks
+
+
+def chunk_asts(chunks: list, keys: list, reader: str) -> list:
+    asts = [chunk_cache.get(b"ast" + key) for key in keys]
+    missing = [i for i, ast in enumerate(asts) if ast is None]
+    if len(missing) > 0:
+        for i, blocks in zip(missing, read_chunks([chunks[i] for i in missing], reader)):
+            asts[i] = fast_json.dumps(blocks)
+            chunk_cache.put(b"ast" + keys[i], asts[i])
+    return asts
+
+
+def chunk_events(ast: bytes):
+    # Returns None if html tags are left open at the end of the chunk.
+    return isolated_block_events(compact_ast.loads_tree(ast))
+
+
+def iter_json_from_markdown_incremental(markdown: str, reader: str = None):
+    if reader is None:
+        reader = MARKDOWN_READER
+    chunks = split_chunks(markdown)
+    if chunks is None:
+        return iter_json_from_markdown(markdown, reader)
+    keys = [cache_key(chunk.encode('utf-8'), reader) for chunk in chunks]
+    events = [chunk_cache.get(b"events" + key) for key in keys]
+    if None in events:
+        asts = chunk_asts(chunks, keys, reader)
+        for i, ast in enumerate(asts):
+            if events[i] is not None:
+                continue
+            new_events = chunk_events(ast)
+            if new_events is None:
+                blocks = [block for ast in asts for block in compact_ast.loads_tree(ast)]
+                return iter_json_from_pandoc_tree({"blocks": blocks})
+            events[i] = fast_json.dumps(new_events)
+            chunk_cache.put(b"events" + keys[i], events[i])
+    return iter_assets(event for chunk_events_json in events for event in fast_json.loads(chunk_events_json))
+
+
+def json_from_markdown_incremental(markdown: str, reader: str = None) -> list:
+    return list(iter_json_from_markdown_incremental(markdown, reader))
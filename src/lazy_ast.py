@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Reads pandoc's JSON with the blocks as an iterator. Everything before "blocks" is parsed right away, every
+# block is parsed when the converter asks for it, so only the JSON text and the current block are in memory
+# instead of the whole tree. pandoc writes "blocks" as the last key, anything after it is not read.
+# The JSON may also arrive in chunks like pandoc's stdout: A block is parsed as soon as its text is complete
+# and the parsed text is dropped.
+import codecs
+import json
+import re
+import compact_ast
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JsonStream:
+    __slots__ = ("chunks", "utf8", "text", "pos", "ended")
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ""
+        self.pos = 0
+        self.ended = False
+
+    def read(self, size: int) -> None:
+        # Reads chunks until at least size characters are not parsed yet or the chunks end.
+        parts = [self.text[self.pos:]]
+        available = len(parts[0])
+        while available < size and not self.ended:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.ended = True
+                part = self.utf8.decode(b"", True)
+            elif type(chunk) is str:
+                part = chunk
+            else:
+                part = self.utf8.decode(chunk)
+            parts.append(part)
+            available += len(part)
+        self.text = "".join(parts)
+        self.pos = 0
+
+    def skip_whitespace(self) -> None:
+        self.pos = WHITESPACE.match(self.text, self.pos).end()
+        while self.pos >= len(self.text) and not self.ended:
+            self.read(1)
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+
+    def startswith(self, expected: str) -> bool:
+        self.skip_whitespace()
+        if len(self.text) - self.pos < len(expected):
+            self.read(len(expected))
+        return self.text.startswith(expected, self.pos)
+
+    def skip(self, expected: str) -> None:
+        if not self.startswith(expected):
+            raise ValueError("Expected " + repr(expected) + " in pandoc's JSON")
+        self.pos += len(expected)
+
+    def skip_separator(self) -> None:
+        if self.startswith(","):
+            self.pos += 1
+
+    def decode(self, decoder: json.JSONDecoder):
+        # pandoc's values are objects, arrays and strings, which can not be complete before their end. The text
+        # for a retry grows geometrically, so a long value is parsed a few times and not once per chunk.
+        self.skip_whitespace()
+        while True:
+            try:
+                value, self.pos = decoder.raw_decode(self.text, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if self.ended:
+                    raise
+                self.read(2 * (len(self.text) - self.pos) + 1)
+
+
+def iter_array(stream: JsonStream, decoder: json.JSONDecoder):
+    stream.skip("[")
+    while not stream.startswith("]"):
+        yield stream.decode(decoder)
+        stream.skip_separator()
+
+
+def loads_chunks(chunks) -> dict:
+    # chunks are str or UTF-8 bytes, which may end in the middle of a character.
+    stream = JsonStream(chunks)
+    decoder = compact_ast.decoder() if compact_ast.COMPACT_AST else json.JSONDecoder()
+    tree = {}
+    stream.skip("{")
+    while not stream.startswith("}"):
+        key = stream.decode(decoder)
+        stream.skip(":")
+        if key == "blocks":
+            tree[key] = iter_array(stream, decoder)
+            break
+        tree[key] = stream.decode(decoder)
+        stream.skip_separator()
+    return tree
+
+
+def loads(data) -> dict:
+    return loads_chunks((data,))
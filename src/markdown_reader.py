@@ -0,0 +1,826 @@
+# -*- coding: utf-8 -*-
+# A pure Python reader for the subset of pandoc's markdown_github-smart which is used in our articles.
+# It produces the same JSON AST as `pandoc -f markdown_github-smart -t json --preserve-tabs` and
+# raises UnsupportedMarkdown for everything outside of that subset, so the caller can fall back to pandoc.
+import html.entities
+import re
+import sys
+
+PANDOC_API_VERSION = [1, 23, 1, 1]
+NULL_ATTR = ["", [], []]
+
+BLOCK_HTML_TAGS = {
+    "address", "applet", "area", "article", "aside", "audio", "blockquote", "body", "button", "canvas", "caption",
+    "center", "col", "colgroup", "dd", "del", "details", "dialog", "dir", "div", "dl", "dt", "embed", "fieldset",
+    "figcaption", "figure", "footer", "form", "frame", "frameset", "h1", "h2", "h3", "h4", "h5", "h6", "head",
+    "header", "hgroup", "hr", "html", "iframe", "ins", "isindex", "legend", "li", "link", "main", "map", "menu",
+    "meta", "nav", "noframes", "noscript", "object", "ol", "optgroup", "option", "output", "p", "pre", "progress",
+    "script", "section", "source", "style", "summary", "svg", "table", "tbody", "td", "template", "textarea",
+    "tfoot", "th", "thead", "title", "tr", "track", "ul", "video"
+}
+LANGUAGE_IDS = {"c++": "cpp", "objective-c": "objectivec"}
+
+BLANK_LINE_REGEX = re.compile(r"^[ \t]*$")
+SPACES_BEFORE_TAB_REGEX = re.compile(r"^ +\t")
+TRAILING_BREAK_REGEX = re.compile(r"[ \t]{2}$|\t$")
+FENCE_REGEX = re.compile(r"^( {0,3})(`{3,}|~{3,})[ \t]*([^ \t]*)[ \t]*$")
+ATX_HEADER_REGEX = re.compile(r"^(#{1,6})(?:[ \t]+(.*))?$")
+ATX_CLOSING_REGEX = re.compile(r"#*[ \t]*$")
+SETEXT_UNDERLINE_REGEX = re.compile(r"^(=+|-+)[ \t]*$")
+HRULE_REGEX = re.compile(r"^[ \t]*([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+BULLET_START_REGEX = re.compile(r"^( {0,3})[*+-](?=[ \t]|$)")
+ORDERED_START_REGEX = re.compile(r"^( {0,3})[0-9]+\.(?=[ \t]|$)")
+DEFINITION_START_REGEX = re.compile(r"^[ \t]*[:~](?=[ \t]|$)")
+FANCY_LIST_START_REGEX = re.compile(r"^[ \t]*\(?(?:#|[A-Za-z]|[ivxlcdmIVXLCDM]+|[0-9]+)[.)](?=[ \t]|$)")
+BLOCKQUOTE_START_REGEX = re.compile(r"^ {0,3}> ?")
+REFERENCE_KEY_REGEX = re.compile(r"^ {0,3}\[[^\]]*\]:")
+PIPE_TABLE_SEPARATOR_REGEX = re.compile(r"^[ \t]*\|?[ \t]*:?-+:?[ \t]*(\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+TASK_LIST_REGEX = re.compile(r"^\[[ xX]\]([ \t]|$)")
+BLOCK_HTML_START_REGEX = re.compile(r"^<(?:/?([A-Za-z][A-Za-z0-9-]*)|[?!])")
+HTML_OPEN_TAG_REGEX = re.compile(
+    r"<[A-Za-z][A-Za-z0-9-]*"
+    r"(?:\s+[A-Za-z_][-A-Za-z0-9_:.]*(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'=<>`]+))?)*"
+    r"\s*/?>")
+HTML_CLOSE_TAG_REGEX = re.compile(r"</[A-Za-z][A-Za-z0-9-]*\s*>")
+AUTOLINK_REGEX = re.compile(r"<(?:[A-Za-z][A-Za-z0-9+.-]*:[^\s<>]*|[^\s<>@]+@[^\s<>@]+)>")
+BARE_URI_REGEX = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:[^\s]|[^\s@]@[^\s@]+\.[A-Za-z]")
+EMOJI_REGEX = re.compile(r":[a-z0-9_+-]+:")
+ENTITY_REGEX = re.compile(r"&(#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);")
+STR_REGEX = re.compile(r"[^ \t\n`*_\[!<\\&~]+")
+
+
+class UnsupportedMarkdown(Exception):
+    pass
+
+
+def is_blank(line: str) -> bool:
+    return BLANK_LINE_REGEX.match(line) is not None
+
+
+def gobble_spaces(line: str, count: int):
+    # Removes exactly `count` columns of indentation like pandoc does. A tab which reaches past `count`
+    # is partially consumed and its remaining columns are put back as spaces. Returns None if the line
+    # is not indented far enough.
+    column = 0
+    for pos, char in enumerate(line):
+        if column >= count:
+            return line[pos:]
+        if char == " ":
+            column += 1
+        elif char == "\t":
+            column += 4 - column % 4
+            if column > count:
+                return " " * (column - count) + line[pos + 1:]
+        else:
+            return None
+    return "" if column >= count else None
+
+
+def list_start(line: str):
+    # Returns the column where the content of a list item starts and the content of the first line
+    # or None if this line starts no list item.
+    if HRULE_REGEX.match(line):
+        return None
+    match = BULLET_START_REGEX.match(line) or ORDERED_START_REGEX.match(line)
+    if match is None:
+        return None
+    marker_end = match.end()
+    content_start = marker_end
+    while content_start < len(line) and line[content_start] in " \t":
+        content_start += 1
+    if content_start == len(line):
+        return min(marker_end + 1, content_start), ""
+    spaces = len(line[:content_start].expandtabs(4)) - marker_end
+    gobbled = min(spaces, 4)
+    return marker_end + gobbled, " " * (spaces - gobbled) + line[content_start:]
+
+
+def is_list_start(line: str) -> bool:
+    return list_start(line) is not None
+
+
+def header_identifier(inlines: list) -> str:
+    text = "".join(
+        char if char.isspace() is False else "-"
+        for char in stringify(inlines).lower()
+        if char.isspace() or char.isalnum() or char in "_-")
+    return text if text != "" else "section"
+
+
+def stringify(inlines: list) -> str:
+    text = ""
+    for inline in inlines:
+        if inline['t'] == "Str":
+            text += inline['c']
+        elif inline['t'] in ["Space", "SoftBreak", "LineBreak"]:
+            text += " "
+        elif inline['t'] == "Code":
+            text += inline['c'][1]
+        elif inline['t'] in ["Link", "Image"]:
+            text += stringify(inline['c'][1])
+        elif inline['t'] in ["Emph", "Strong", "Strikeout"]:
+            text += stringify(inline['c'])
+    return text
+
+
+def append_inline(inlines: list, inline: dict) -> None:
+    # Appends like pandoc's Inlines monoid: neighbouring strings, spaces and formatting get merged.
+    if len(inlines) == 0:
+        inlines.append(inline)
+        return
+    last = inlines[-1]
+    pair = (last['t'], inline['t'])
+    if pair == ("Str", "Str"):
+        inlines[-1] = {'t': 'Str', 'c': last['c'] + inline['c']}
+    elif pair in [("Space", "Space")]:
+        pass
+    elif pair in [("Space", "SoftBreak"), ("Space", "LineBreak"), ("SoftBreak", "LineBreak")]:
+        inlines[-1] = inline
+    elif pair in [("SoftBreak", "Space"), ("LineBreak", "Space"), ("LineBreak", "SoftBreak"),
+                  ("SoftBreak", "SoftBreak")]:
+        pass
+    elif last['t'] == inline['t'] and last['t'] in ["Emph", "Strong", "Strikeout"]:
+        merged = list(last['c'])
+        extend_inlines(merged, inline['c'])
+        inlines[-1] = {'t': last['t'], 'c': merged}
+    else:
+        inlines.append(inline)
+
+
+def extend_inlines(inlines: list, new_inlines: list) -> None:
+    for inline in new_inlines:
+        append_inline(inlines, inline)
+
+
+def trim_inlines(inlines: list) -> list:
+    start = 0
+    end = len(inlines)
+    while start < end and inlines[start]['t'] in ["Space", "SoftBreak", "LineBreak"]:
+        start += 1
+    while end > start and inlines[end - 1]['t'] in ["Space", "SoftBreak", "LineBreak"]:
+        end -= 1
+    return inlines[start:end]
+
+
+def balanced_brackets(text: str) -> bool:
+    depth = 0
+    for char in text:
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def check_supported_strings(inlines: list) -> None:
+    for index, inline in enumerate(inlines):
+        if inline['t'] == "Str":
+            if inline['c'].endswith("]") and index + 1 < len(inlines) and inlines[index + 1]['t'] in ["Link", "Image"]:
+                raise UnsupportedMarkdown("Brackets in front of links are not supported: " + inline['c'])
+            if BARE_URI_REGEX.search(inline['c']) or EMOJI_REGEX.search(inline['c']):
+                raise UnsupportedMarkdown("Bare URIs and emoji are not supported: " + inline['c'])
+            if not balanced_brackets(inline['c']):
+                raise UnsupportedMarkdown("Unmatched brackets are not supported: " + inline['c'])
+        elif inline['t'] in ["Emph", "Strong", "Strikeout"]:
+            check_supported_strings(inline['c'])
+        elif inline['t'] in ["Link", "Image"]:
+            check_supported_strings(inline['c'][1])
+
+
+class InlineParser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.last_str_pos = -1
+
+    def parse(self) -> list:
+        inlines = []
+        while self.pos < len(self.text):
+            extend_inlines(inlines, self.inline())
+        inlines = trim_inlines(inlines)
+        check_supported_strings(inlines)
+        return inlines
+
+    def inline(self) -> list:
+        char = self.text[self.pos]
+        if char in " \t":
+            return self.whitespace()
+        if char == "\n":
+            self.pos += 1
+            self.skip_spaces()
+            return [{'t': 'SoftBreak'}]
+        if char == "`":
+            return self.code()
+        if char in "*_":
+            return self.enclosure(char)
+        if char == "~":
+            return self.strikeout()
+        if char == "[":
+            return self.link("Link") or self.symbol()
+        if char == "!" and self.text.startswith("[", self.pos + 1):
+            self.pos += 1
+            image = self.link("Image")
+            if image is not None:
+                return image
+            self.pos -= 1
+            return self.symbol()
+        if char == "<":
+            return self.html()
+        if char == "\\":
+            return self.escaped_char()
+        if char == "&":
+            return self.entity()
+        match = STR_REGEX.match(self.text, self.pos)
+        if match is None:
+            return self.symbol()
+        self.pos = match.end()
+        self.last_str_pos = self.pos
+        return [{'t': 'Str', 'c': match.group(0)}]
+
+    def unmatched(self, delimiter: str) -> UnsupportedMarkdown:
+        # pandoc may pair the delimiters which would be left over as text differently.
+        return UnsupportedMarkdown("Unmatched " + delimiter + " is not supported: " + self.text[:80])
+
+    def symbol(self) -> list:
+        self.pos += 1
+        return [{'t': 'Str', 'c': self.text[self.pos - 1]}]
+
+    def skip_spaces(self) -> None:
+        while self.pos < len(self.text) and self.text[self.pos] in " \t":
+            self.pos += 1
+
+    def whitespace(self) -> list:
+        start = self.pos
+        self.skip_spaces()
+        if self.pos - start >= 2 and self.text.startswith("\n", self.pos):
+            self.pos += 1
+            self.skip_spaces()
+            return [{'t': 'LineBreak'}]
+        return [{'t': 'Space'}]
+
+    def code(self) -> list:
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] == "`":
+            self.pos += 1
+        ticks = self.pos - start
+        search_pos = self.pos
+        while True:
+            close = self.text.find("`" * ticks, search_pos)
+            if close < 0:
+                raise self.unmatched("`" * ticks)
+            close_end = close + ticks
+            if self.text.startswith("`", close_end):
+                while self.text.startswith("`", close_end):
+                    close_end += 1
+                search_pos = close_end
+                continue
+            content = self.text[self.pos:close].replace("\n", " ").lstrip(" \t").rstrip(" \t")
+            self.pos = close_end
+            return [{'t': 'Code', 'c': [NULL_ATTR, content]}]
+
+    def ender(self, char: str, count: int) -> bool:
+        if not self.text.startswith(char * count, self.pos):
+            return False
+        if char == "*":
+            return True
+        after = self.pos + count
+        return after >= len(self.text) or not self.text[after].isalnum()
+
+    def enclosure(self, char: str) -> list:
+        if char == "_" and self.last_str_pos == self.pos:
+            if not self.text[self.pos - 1].isalnum() or not self.text[self.pos + 1:self.pos + 2].isalnum():
+                raise self.unmatched(char)
+            return self.symbol()
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] == char:
+            self.pos += 1
+        run = self.text[start:self.pos]
+        if self.pos < len(self.text) and self.text[self.pos] in " \t":
+            raise self.unmatched(run)
+        if len(run) == 1:
+            return self.one(char, [])
+        if len(run) == 2:
+            return self.two(char, [])
+        if len(run) == 3:
+            return self.three(char)
+        raise self.unmatched(run)
+
+    def one(self, char: str, prefix: list) -> list:
+        contents = []
+        while self.pos < len(self.text):
+            if self.ender(char, 1):
+                if self.text.startswith(char * 2, self.pos):
+                    self.pos += 2
+                    if not self.ender(char, 1):
+                        extend_inlines(contents, self.two(char, []))
+                        continue
+                    self.pos -= 2
+                break
+            extend_inlines(contents, self.inline())
+        if self.ender(char, 1):
+            self.pos += 1
+            self.last_str_pos = self.pos
+            inner = list(prefix)
+            extend_inlines(inner, contents)
+            return [{'t': 'Emph', 'c': inner}]
+        raise self.unmatched(char)
+
+    def two(self, char: str, prefix: list) -> list:
+        contents = []
+        while self.pos < len(self.text) and not self.ender(char, 2):
+            extend_inlines(contents, self.inline())
+        if self.ender(char, 2):
+            self.pos += 2
+            self.last_str_pos = self.pos
+            inner = list(prefix)
+            extend_inlines(inner, contents)
+            return [{'t': 'Strong', 'c': inner}]
+        raise self.unmatched(char * 2)
+
+    def three(self, char: str) -> list:
+        contents = []
+        while self.pos < len(self.text) and not self.ender(char, 1):
+            extend_inlines(contents, self.inline())
+        if self.ender(char, 3):
+            self.pos += 3
+            self.last_str_pos = self.pos
+            return [{'t': 'Strong', 'c': [{'t': 'Emph', 'c': contents}]}]
+        if self.ender(char, 2):
+            self.pos += 2
+            return self.one(char, [{'t': 'Strong', 'c': contents}])
+        if self.ender(char, 1):
+            self.pos += 1
+            return self.two(char, [{'t': 'Emph', 'c': contents}])
+        raise self.unmatched(char * 3)
+
+    def strikeout(self) -> list:
+        if not self.text.startswith("~~", self.pos) or self.pos + 2 >= len(self.text) or \
+                self.text[self.pos + 2] in " \t\n~":
+            raise self.unmatched("~")
+        self.pos += 2
+        contents = []
+        while self.pos < len(self.text):
+            if len(contents) > 0 and self.text.startswith("~~", self.pos):
+                self.pos += 2
+                return [{'t': 'Strikeout', 'c': trim_inlines(contents)}]
+            if self.text[self.pos] in " \t":
+                space = self.whitespace()
+                if self.text.startswith("~~", self.pos):
+                    break
+                extend_inlines(contents, space)
+                continue
+            extend_inlines(contents, self.inline())
+        raise self.unmatched("~~")
+
+    def find_closing_bracket(self, start: int) -> int:
+        depth = 0
+        pos = start
+        while pos < len(self.text):
+            char = self.text[pos]
+            if char == "\\":
+                pos += 2
+                continue
+            if char == "`":
+                raise UnsupportedMarkdown("Code in brackets is not supported.")
+            if char == "[":
+                depth += 1
+            elif char == "]":
+                depth -= 1
+                if depth == 0:
+                    return pos
+            pos += 1
+        return -1
+
+    def link(self, link_type: str):
+        start = self.pos
+        if self.text.startswith("[^", start):
+            raise UnsupportedMarkdown("Footnotes are not supported.")
+        close = self.find_closing_bracket(start)
+        if close < 0 or not self.text.startswith("(", close + 1):
+            return None
+        url, title, end = self.link_source(close + 1)
+        self.pos = end
+        label = InlineParser(self.text[start + 1:close]).parse()
+        return [{'t': link_type, 'c': [NULL_ATTR, label, [escape_uri(url), title]]}]
+
+    def link_source(self, pos: int):
+        # (url "title") with an optional <url> and an optional 'title'.
+        unsupported = UnsupportedMarkdown("Only simple link targets are supported: " + self.text[pos:pos + 80])
+        pos += 1
+        while self.text.startswith((" ", "\t"), pos):
+            pos += 1
+        if self.text.startswith("<", pos):
+            close = self.text.find(">", pos)
+            if close < 0:
+                raise unsupported
+            url = self.text[pos + 1:close]
+            pos = close + 1
+        else:
+            url = ""
+            while pos < len(self.text):
+                char = self.text[pos]
+                if char == "(":
+                    close = self.text.find(")", pos)
+                    if close < 0:
+                        raise unsupported
+                    url += self.text[pos:close + 1]
+                    pos = close + 1
+                elif char in " \t":
+                    space_end = pos
+                    while self.text.startswith((" ", "\t"), space_end):
+                        space_end += 1
+                    if space_end < len(self.text) and self.text[space_end] in "\"')":
+                        break
+                    url += self.text[pos:space_end]
+                    pos = space_end
+                elif char == ")":
+                    break
+                else:
+                    url += char
+                    pos += 1
+            url = " ".join(url.split())
+        title = ""
+        title_match = re.compile(r"[ \t]*\n?[ \t]*(\"([^\"\n]*)\"|'([^'\n]*)')").match(self.text, pos)
+        if title_match:
+            title = " ".join((title_match.group(2) if title_match.group(2) is not None
+                              else title_match.group(3)).split())
+            pos = title_match.end()
+        while self.text.startswith((" ", "\t"), pos):
+            pos += 1
+        if not self.text.startswith(")", pos) or "\\" in url + title or "&" in url + title or "\n" in url:
+            raise unsupported
+        return url.rstrip(), title, pos + 1
+
+    def html(self) -> list:
+        if self.text.startswith("<!--", self.pos):
+            close = self.text.find("-->", self.pos + 4)
+            if close < 0:
+                raise UnsupportedMarkdown("Unclosed HTML comment.")
+            raw = self.text[self.pos:close + 3]
+            self.pos = close + 3
+            return [{'t': 'RawInline', 'c': ["html", raw]}]
+        if AUTOLINK_REGEX.match(self.text, self.pos):
+            raise UnsupportedMarkdown("Autolinks are not supported.")
+        match = HTML_OPEN_TAG_REGEX.match(self.text, self.pos) or HTML_CLOSE_TAG_REGEX.match(self.text, self.pos)
+        if match is not None and "\t" not in match.group(0):
+            self.pos = match.end()
+            return [{'t': 'RawInline', 'c': ["html", match.group(0)]}]
+        if re.match(r"</?[A-Za-z!?]", self.text[self.pos:self.pos + 2]):
+            raise UnsupportedMarkdown("Unsupported HTML: " + self.text[self.pos:self.pos + 80])
+        return self.symbol()
+
+    def escaped_char(self) -> list:
+        if self.pos + 1 >= len(self.text) or self.text[self.pos + 1].isalnum() or self.text[self.pos + 1] == "\n":
+            return self.symbol()
+        self.pos += 2
+        if self.text[self.pos - 1] == " ":
+            return [{'t': 'Str', 'c': "\u00a0"}]
+        return [{'t': 'Str', 'c': self.text[self.pos - 1]}]
+
+    def entity(self) -> list:
+        match = ENTITY_REGEX.match(self.text, self.pos)
+        if match is None:
+            return self.symbol()
+        name = match.group(1)
+        if name.startswith("#x") or name.startswith("#X"):
+            char = chr(int(name[2:], 16))
+        elif name.startswith("#"):
+            char = chr(int(name[1:]))
+        elif name + ";" in html.entities.html5:
+            char = html.entities.html5[name + ";"]
+        else:
+            return self.symbol()
+        self.pos = match.end()
+        return [{'t': 'Str', 'c': char}]
+
+
+def escape_uri(url: str) -> str:
+    return "".join("%{:02X}".format(ord(char)) if char.isspace() or char in "<>|\"{}[]^`" else char
+                   for char in url)
+
+
+def parse_inlines(text: str) -> list:
+    return InlineParser(text).parse()
+
+
+class BlockParser:
+    def __init__(self):
+        self.used_identifiers = set()
+
+    def unique_identifier(self, inlines: list) -> str:
+        identifier = header_identifier(inlines)
+        if identifier in self.used_identifiers:
+            counter = 1
+            while identifier + "-" + str(counter) in self.used_identifiers:
+                counter += 1
+            identifier = identifier + "-" + str(counter)
+        self.used_identifiers.add(identifier)
+        return identifier
+
+    def header(self, level: int, text: str) -> dict:
+        if text.endswith("\\"):
+            raise UnsupportedMarkdown("Backslashes at the end of headers are not supported: " + text)
+        inlines = parse_inlines(text)
+        return {'t': 'Header', 'c': [level, [self.unique_identifier(inlines), [], []], inlines]}
+
+    def parse_blocks(self, lines: list, in_list: bool = False) -> list:
+        blocks = []
+        lines = list(lines)
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if is_blank(line):
+                i += 1
+                continue
+            fenced = self.fenced_code(lines, i)
+            if fenced is not None:
+                block, i = fenced
+                blocks.append(block)
+                continue
+            if BULLET_START_REGEX.match(line) and is_list_start(line):
+                items, i = self.list_items(lines, i, BULLET_START_REGEX, in_list)
+                blocks.append({'t': 'BulletList', 'c': items})
+                continue
+            atx_match = ATX_HEADER_REGEX.match(line)
+            if atx_match:
+                text = atx_match.group(2) or ""
+                closing = ATX_CLOSING_REGEX.search(text)
+                text = text[:closing.start()]
+                blocks.append(self.header(len(atx_match.group(1)), text))
+                i += 1
+                continue
+            if i + 1 < len(lines) and SETEXT_UNDERLINE_REGEX.match(lines[i + 1]):
+                level = 1 if lines[i + 1].startswith("=") else 2
+                blocks.append(self.header(level, line))
+                i += 2
+                continue
+            block_html = BLOCK_HTML_START_REGEX.match(line)
+            if block_html:
+                if line.startswith("<!--"):
+                    block, i = self.html_comment(lines, i)
+                    blocks.append(block)
+                    continue
+                if block_html.group(1) is None or block_html.group(1).lower() in BLOCK_HTML_TAGS:
+                    raise UnsupportedMarkdown("HTML blocks are not supported: " + line)
+            if SPACES_BEFORE_TAB_REGEX.match(line):
+                raise UnsupportedMarkdown("Spaces in front of a tab are not supported: " + line)
+            if gobble_spaces(line, 4) is not None:
+                block, i = self.indented_code(lines, i)
+                blocks.append(block)
+                continue
+            if BLOCKQUOTE_START_REGEX.match(line):
+                block, i = self.block_quote(lines, i, in_list)
+                blocks.append(block)
+                continue
+            if HRULE_REGEX.match(line):
+                blocks.append({'t': 'HorizontalRule'})
+                i += 1
+                continue
+            if ORDERED_START_REGEX.match(line) and is_list_start(line):
+                items, i = self.list_items(lines, i, ORDERED_START_REGEX, in_list)
+                blocks.append({'t': 'OrderedList', 'c': [[1, {'t': 'DefaultStyle'}, {'t': 'DefaultDelim'}], items]})
+                continue
+            if REFERENCE_KEY_REGEX.match(line):
+                raise UnsupportedMarkdown("Reference links and footnotes are not supported: " + line)
+            block, i = self.paragraph(lines, i, in_list)
+            blocks.append(block)
+        return blocks
+
+    def fenced_code(self, lines: list, i: int):
+        match = FENCE_REGEX.match(lines[i])
+        if match is None:
+            if re.match(r"^ {0,3}(`{3,}|~{3,})", lines[i]):
+                raise UnsupportedMarkdown("Code fences with attributes are not supported: " + lines[i])
+            return None
+        indent, fence, info = match.groups()
+        if fence[0] == "`" and "`" in info:
+            return None
+        closing_regex = re.compile("^ {0,3}" + re.escape(fence[0]) + "{" + str(len(fence)) + r",}[ \t]*$")
+        for end in range(i + 1, len(lines)):
+            if closing_regex.match(lines[end]):
+                code_lines = []
+                for code_line in lines[i + 1:end]:
+                    for _ in range(len(indent)):
+                        if code_line.startswith(" "):
+                            code_line = code_line[1:]
+                    code_lines.append(code_line)
+                language = info.lower()
+                classes = [LANGUAGE_IDS.get(language, language)] if language != "" else []
+                return {'t': 'CodeBlock', 'c': [["", classes, []], "\n".join(code_lines)]}, end + 1
+        raise UnsupportedMarkdown("Unclosed code fence: " + lines[i])
+
+    def html_comment(self, lines: list, i: int):
+        end = i
+        close = lines[i].find("-->", 4)
+        while close < 0:
+            end += 1
+            if end >= len(lines):
+                raise UnsupportedMarkdown("Unclosed HTML comment.")
+            close = lines[end].find("-->")
+        block = {'t': 'RawBlock', 'c': ["html", "\n".join(lines[i:end] + [lines[end][:close + 3]])]}
+        rest = lines[end][close + 3:].lstrip(" \t")
+        if rest != "":
+            lines[end] = rest  # The rest of the line after the comment starts a new block.
+            return block, end
+        return block, end + 1
+
+    def indented_code(self, lines: list, i: int):
+        code_lines = []
+        while i < len(lines):
+            if SPACES_BEFORE_TAB_REGEX.match(lines[i]):
+                raise UnsupportedMarkdown("Spaces in front of a tab are not supported: " + lines[i])
+            code_line = gobble_spaces(lines[i], 4)
+            if code_line is not None and not is_blank(lines[i]):
+                code_lines.append(code_line)
+                i += 1
+                continue
+            blank_end = i
+            while blank_end < len(lines) and is_blank(lines[blank_end]):
+                if gobble_spaces(lines[blank_end], 4) not in [None, ""]:
+                    raise UnsupportedMarkdown("Whitespace lines in indented code are not supported.")
+                blank_end += 1
+            if blank_end == i or blank_end >= len(lines) or gobble_spaces(lines[blank_end], 4) is None:
+                break
+            code_lines += [""] * (blank_end - i)
+            i = blank_end
+        while i < len(lines) and is_blank(lines[i]):
+            i += 1
+        return {'t': 'CodeBlock', 'c': [NULL_ATTR, "\n".join(code_lines)]}, i
+
+    def is_lazy_continuation(self, line: str) -> bool:
+        return not is_blank(line) and not is_list_start(line) and not line.startswith("#") and \
+            not (line.startswith("`") and FENCE_REGEX.match(line))
+
+    def block_quote(self, lines: list, i: int, in_list: bool):
+        quote_lines = [lines[i][BLOCKQUOTE_START_REGEX.match(lines[i]).end():]]
+        if quote_lines[0].startswith("[!"):
+            raise UnsupportedMarkdown("Alerts are not supported: " + lines[i])
+        i += 1
+        while i < len(lines):
+            match = BLOCKQUOTE_START_REGEX.match(lines[i])
+            if match:
+                quote_lines.append(lines[i][match.end():])
+            elif self.is_lazy_continuation(lines[i]):
+                if gobble_spaces(lines[i], 4) is not None or lines[i].lstrip(" ").startswith("#"):
+                    raise UnsupportedMarkdown("Indented lazy continuation lines are not supported: " + lines[i])
+                quote_lines.append(lines[i])
+            else:
+                break
+            i += 1
+        while i < len(lines) and is_blank(lines[i]):
+            i += 1
+        return {'t': 'BlockQuote', 'c': self.parse_blocks(quote_lines + [""], in_list)}, i
+
+    def list_items(self, lines: list, i: int, start_regex, in_list: bool):
+        items = []
+        while i < len(lines) and start_regex.match(lines[i]) and is_list_start(lines[i]):
+            width, first_line = list_start(lines[i])
+            if TASK_LIST_REGEX.match(first_line.lstrip(" ")):
+                raise UnsupportedMarkdown("Task lists are not supported: " + lines[i])
+            if is_blank(first_line):
+                raise UnsupportedMarkdown("Empty list items are not supported: " + lines[i])
+            if first_line[0] in " \t":
+                raise UnsupportedMarkdown("More than four spaces after list markers are not supported: " + lines[i])
+            item_lines = [first_line]
+            i += 1
+            while i < len(lines) and not is_blank(lines[i]) and not is_list_start(lines[i].lstrip(" \t")) and \
+                    not (FENCE_REGEX.match(lines[i]) and self.fenced_code(lines, i) is not None):
+                gobbled = gobble_spaces(lines[i], width)
+                item_lines.append(gobbled if gobbled is not None else lines[i])
+                i += 1
+            while i < len(lines) and is_blank(lines[i]):
+                item_lines.append("")
+                i += 1
+            while i < len(lines) and not is_blank(lines[i]) and gobble_spaces(lines[i], width) is not None:
+                item_lines.append(gobble_spaces(lines[i], width))
+                i += 1
+                while i < len(lines) and not is_blank(lines[i]):
+                    gobbled = gobble_spaces(lines[i], width)
+                    if gobbled is not None:
+                        item_lines.append(gobbled)
+                    elif not is_list_start(lines[i]):
+                        item_lines.append(lines[i])
+                    else:
+                        break
+                    i += 1
+                while i < len(lines) and is_blank(lines[i]):
+                    item_lines.append("")
+                    i += 1
+            items.append(self.parse_blocks(item_lines, in_list=True))
+        return compactify(items), i
+
+    def paragraph(self, lines: list, i: int, in_list: bool):
+        para_lines = [lines[i]]
+        i += 1
+        while i < len(lines) and not is_blank(lines[i]) and not is_list_start(lines[i]) and \
+                not BLOCKQUOTE_START_REGEX.match(lines[i]) and not lines[i].startswith("#") and \
+                not (lines[i].startswith("`") and FENCE_REGEX.match(lines[i])):
+            para_lines.append(lines[i])
+            i += 1
+        if i < len(lines) and lines[i].startswith("#") and not ATX_HEADER_REGEX.match(lines[i]):
+            raise UnsupportedMarkdown("Paragraphs followed by a # line are not supported: " + lines[i])
+        for para_line in para_lines:
+            if "|" in para_line and PIPE_TABLE_SEPARATOR_REGEX.match(para_line):
+                raise UnsupportedMarkdown("Tables are not supported.")
+            if FANCY_LIST_START_REGEX.match(para_line) and not ORDERED_START_REGEX.match(para_line):
+                raise UnsupportedMarkdown("Only bullets and numbers with a dot start lists: " + para_line)
+            if DEFINITION_START_REGEX.match(para_line):
+                raise UnsupportedMarkdown("Definition lists are not supported: " + para_line)
+        if in_list and TRAILING_BREAK_REGEX.search(para_lines[-1]):
+            raise UnsupportedMarkdown("Line breaks at the end of list items are not supported: " + para_lines[-1])
+        inlines = parse_inlines("\n".join(para_lines).lstrip(" \t"))
+        block_type = "Plain"
+        if i < len(lines):
+            next_line = lines[i]
+            if is_blank(next_line) or BLOCKQUOTE_START_REGEX.match(next_line) or \
+                    (next_line.startswith("`") and FENCE_REGEX.match(next_line)) or \
+                    ATX_HEADER_REGEX.match(next_line) or (is_list_start(next_line) and not in_list):
+                block_type = "Para"
+        while i < len(lines) and is_blank(lines[i]):
+            i += 1
+        return {'t': block_type, 'c': inlines}, i
+
+
+def compactify(items: list) -> list:
+    # Tight lists consist of Plain blocks. A single Para at the very end comes from the blank line which
+    # ends the list and is turned into Plain, while any other Para makes the whole list loose.
+    if len(items) == 0:
+        return items
+    other_paras = [block for item in items[:-1] for block in item if block['t'] == "Para"]
+    final = items[-1]
+    if len(final) > 0 and final[-1]['t'] == "Para" and \
+            len(other_paras + [block for block in final[:-1] if block['t'] == "Para"]) == 0:
+        return items[:-1] + [final[:-1] + [{'t': 'Plain', 'c': final[-1]['c']}]]
+    if len([block for item in items for block in item if block['t'] == "Para"]) == 0:
+        return items
+    return [[{'t': 'Para', 'c': block['c']} if block['t'] == "Plain" else block for block in item]
+            for item in items]
+
+
+def read_markdown(markdown: str) -> dict:
+    text = markdown.replace("\r\n", "\n") + "\n\n"
+    lines = text.split("\n")[:-1]
+    return {"pandoc-api-version": PANDOC_API_VERSION,
+            "meta": {},
+            "blocks": BlockParser().parse_blocks(lines)}
+
+
+class ReaderMismatch(Exception):
+    pass
+
+
+def find_difference(expected, actual, path: str = "$"):
+    if type(expected) is not type(actual):
+        return path + ": " + repr(expected) + " != " + repr(actual)
+    if type(expected) is dict:
+        for key in sorted(set(expected.keys()) | set(actual.keys())):
+            if key not in expected or key not in actual:
+                return path + ": key " + repr(key) + " is missing on one side"
+            difference = find_difference(expected[key], actual[key], path + "." + key)
+            if difference is not None:
+                return difference
+        return None
+    if type(expected) is list:
+        for index, (expected_item, actual_item) in enumerate(zip(expected, actual)):
+            difference = find_difference(expected_item, actual_item, path + "[" + str(index) + "]")
+            if difference is not None:
+                return difference
+        if len(expected) != len(actual):
+            return path + ": " + str(len(expected)) + " != " + str(len(actual)) + " items"
+        return None
+    if expected != actual:
+        return path + ": " + repr(expected) + " != " + repr(actual)
+    return None
+
+
+def check_against_pandoc(markdown: str, pandoc_tree: dict) -> None:
+    # Differential test mode: the Python reader must either give up or produce exactly pandoc's tree.
+    try:
+        tree = read_markdown(markdown)
+    except UnsupportedMarkdown:
+        return
+    tree["pandoc-api-version"] = pandoc_tree.get("pandoc-api-version")  # depends on the installed pandoc
+    difference = find_difference(pandoc_tree, tree)
+    if difference is not None:
+        raise ReaderMismatch("The Python reader differs from pandoc at " + difference)
+
+
+if __name__ == "__main__":  # pragma: no mutate
+    import json
+    from pandoc_backend import convert_markdown
+    mismatches = 0
+    for file_name in sys.argv[1:]:
+        with open(file_name, 'r') as md_file:
+            markdown_text = md_file.read()
+        try:
+            read_markdown(markdown_text)
+            check_against_pandoc(markdown_text, json.loads(convert_markdown(markdown_text)))
+            print("OK          " + file_name)
+        except UnsupportedMarkdown as ex:
+            print("UNSUPPORTED " + file_name + ": " + str(ex))
+        except ReaderMismatch as ex:
+            mismatches += 1
+            print("MISMATCH    " + file_name + ": " + str(ex))
+    sys.exit(1 if mismatches > 0 else 0)
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import atexit
+import codecs
+import http.client
+import json
+import os
+import queue
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+import pypandoc
+
+PANDOC_FORMAT = "markdown_github-smart"
+PANDOC_EXTRA_ARGS = ["--preserve-tabs"]
+
+PANDOC_BACKEND = os.environ.get("PANDOC_BACKEND", "subprocess")  # "subprocess" or "server"
+PANDOC_SERVER_URL = os.environ.get("PANDOC_SERVER_URL", "")  # a per-host server; empty spawns one per worker
+PANDOC_SERVER_POOL_SIZE = int(os.environ.get("PANDOC_SERVER_POOL_SIZE", "4"))
+PANDOC_SERVER_TIMEOUT = float(os.environ.get("PANDOC_SERVER_TIMEOUT", "30"))
+PANDOC_SERVER_HEALTH_INTERVAL = float(os.environ.get("PANDOC_SERVER_HEALTH_INTERVAL", "10"))
+PANDOC_SERVER_RETRY_INTERVAL = float(os.environ.get("PANDOC_SERVER_RETRY_INTERVAL", "60"))
+OUTPUT_CHUNK_BYTES = 64 * 1024
+
+
+class PandocServerError(Exception):
+    pass
+
+
+def to_utf8(markdown) -> bytes:
+    # Invalid UTF-8 is replaced before pandoc starts, see replace_invalid_utf8().
+    if type(markdown) is str:
+        return markdown.encode('utf-8')
+    if not is_utf8(markdown):
+        return replace_invalid_utf8(markdown)
+    return markdown
+
+
+def is_utf8(markdown: bytes) -> bool:
+    try:
+        markdown.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def replace_invalid_utf8(markdown: bytes) -> bytes:
+    # pandoc reads invalid UTF-8 as latin1. The converter always replaced invalid bytes with U+FFFD instead.
+    return markdown.decode('utf-8', errors='replace').encode('utf-8')
+
+
+def pandoc_command() -> list:
+    return [pypandoc.get_pandoc_path(), "--from", PANDOC_FORMAT, "--to", "json"] + PANDOC_EXTRA_ARGS
+
+
+def check_pandoc_result(returncode: int, stderr: bytes) -> None:
+    if returncode != 0:
+        raise RuntimeError('Pandoc died with exitcode "' + str(returncode) + '" during conversion: ' +
+                           stderr.decode('utf-8', errors='replace'))
+
+
+def convert_with_subprocess(markdown) -> bytes:
+    # The markdown goes to pandoc's stdin as UTF-8 bytes and the JSON comes back as bytes without decoding.
+    process = subprocess.run(pandoc_command(), input=to_utf8(markdown), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    check_pandoc_result(process.returncode, process.stderr)
+    return process.stdout
+
+
+async def convert_with_subprocess_async(markdown) -> bytes:
+    process = await asyncio.create_subprocess_exec(*pandoc_command(),
+                                                   stdin=subprocess.PIPE,
+                                                   stdout=subprocess.PIPE,
+                                                   stderr=subprocess.PIPE)
+    stdout, stderr = await process.communicate(to_utf8(markdown))
+    check_pandoc_result(process.returncode, stderr)
+    return stdout
+
+
+def start_pandoc() -> tuple:
+    # stderr goes to a file, so pandoc never waits for a full stderr pipe while stdout is read.
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(pandoc_command(),
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=stderr_file)
+    return process, stderr_file
+
+
+def finish_pandoc(process: subprocess.Popen, stderr_file) -> bytes:
+    process.wait()
+    stderr_file.seek(0)
+    stderr = stderr_file.read()
+    stderr_file.close()
+    check_pandoc_result(process.returncode, stderr)
+    return stderr
+
+
+def iter_stdout(process: subprocess.Popen, stderr_file):
+    # Yields pandoc's JSON while pandoc writes it and raises pandoc's error after the last chunk.
+    try:
+        while True:
+            chunk = process.stdout.read1(OUTPUT_CHUNK_BYTES)
+            if len(chunk) == 0:
+                break
+            yield chunk
+    except BaseException:
+        process.kill()
+        process.wait()
+        stderr_file.close()
+        raise
+    finally:
+        process.stdout.close()
+    finish_pandoc(process, stderr_file)
+
+
+def iter_with_subprocess(markdown):
+    # Like convert_with_subprocess(), but the JSON is yielded chunk by chunk.
+    markdown = to_utf8(markdown)
+    process, stderr_file = start_pandoc()
+    try:
+        process.stdin.write(markdown)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # pandoc died, iter_stdout() raises its error
+    return iter_stdout(process, stderr_file)
+
+
+# A pandoc subprocess which gets the markdown chunk by chunk while it arrives. pandoc reads all of stdin
+# before it writes anything, so the chunks are written without a thread. chunks keeps them for a second run
+# if the markdown is not valid UTF-8.
+class PandocPipe:
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.valid_utf8 = True
+        self.process, self.stderr_file = start_pandoc()
+        for chunk in chunks:
+            self._write(chunk)
+
+    def _write(self, chunk: bytes) -> None:
+        if self.valid_utf8:
+            try:
+                self.utf8.decode(chunk)
+            except UnicodeDecodeError:
+                self.valid_utf8 = False
+        try:
+            self.process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # pandoc died, result() raises its error
+
+    def write(self, chunk: bytes) -> None:
+        self.chunks.append(chunk)
+        self._write(chunk)
+
+    def _check_utf8(self) -> bool:
+        # Also fails for a sequence which is cut off at the end of the last chunk.
+        if self.valid_utf8:
+            try:
+                self.utf8.decode(b"", True)
+            except UnicodeDecodeError:
+                self.valid_utf8 = False
+        return self.valid_utf8
+
+    def result(self) -> bytes:
+        # pandoc already read invalid UTF-8 as latin1, so it runs again with the invalid bytes replaced.
+        if not self._check_utf8():
+            self.kill()
+            return convert_with_subprocess(b"".join(self.chunks))
+        stdout = self.process.communicate()[0]
+        finish_pandoc(self.process, self.stderr_file)
+        return stdout
+
+    def iter_result(self):
+        # Like result(), but the JSON is yielded while pandoc writes it if the markdown was valid UTF-8.
+        if not self._check_utf8():
+            return iter((self.result(),))
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return iter_stdout(self.process, self.stderr_file)
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.communicate()
+        self.stderr_file.close()
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Without a url the pandoc server is spawned lazily on a free port by the process which uses it first,
+# so every gunicorn worker gets its own server. A url points to a per-host server which is never restarted.
+# After a failed start or health check the server is not used for retry_interval seconds. One thread starts
+# or checks the server without holding the lock, the other threads fall back to the subprocess meanwhile.
+class PandocServer:
+    def __init__(self, url: str = "", pool_size: int = 4, timeout: float = 30.0,
+                 health_interval: float = 10.0, command: list = None, retry_interval: float = 60.0):
+        self.managed = url == ""
+        self.host = "127.0.0.1"
+        self.port = None
+        if not self.managed:
+            parsed_url = urlparse(url)
+            self.host = parsed_url.hostname
+            self.port = parsed_url.port or 80
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.retry_interval = retry_interval
+        self.command = command
+        self.process = None
+        self.owner_pid = None
+        self.last_health_check = 0.0
+        self.restarts = 0
+        self.starting = False
+        self.retry_at = 0.0
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+
+    def _server_command(self) -> list:
+        if self.command is not None:
+            return self.command + ["--port", str(self.port)]
+        return [pypandoc.get_pandoc_path(), "server", "--port", str(self.port),
+                "--timeout", str(int(self.timeout))]
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _close_pool(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def start(self) -> None:
+        if not self.managed:
+            return
+        self.stop()
+        self.port = find_free_port()
+        try:
+            self.process = subprocess.Popen(self._server_command(),
+                                            stdin=subprocess.DEVNULL,
+                                            stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL)
+        except OSError as error:
+            raise PandocServerError("pandoc server could not be started: " + str(error))
+        self.owner_pid = os.getpid()
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                returncode = self.process.returncode
+                self.stop()
+                raise PandocServerError("pandoc server exited with code " + str(returncode))
+            try:
+                if self._get_version():
+                    return
+            except (ConnectionRefusedError, TimeoutError):
+                pass  # not listening yet
+            except (OSError, http.client.HTTPException) as error:
+                # pandoc without the threaded runtime listens, but drops every connection.
+                self.stop()
+                raise PandocServerError("pandoc server does not answer: " + repr(error))
+            time.sleep(0.05)
+        self.stop()
+        raise PandocServerError("pandoc server did not become healthy within " + str(self.timeout) + "s")
+
+    def stop(self) -> None:
+        self._close_pool()
+        if self.process is not None and self.owner_pid == os.getpid():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def _get_version(self) -> bool:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=min(self.timeout, 2.0))
+        try:
+            connection.request("GET", "/version")
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        if response.status != 200:
+            return False
+        self.last_health_check = time.monotonic()
+        return True
+
+    def is_healthy(self) -> bool:
+        try:
+            return self._get_version()
+        except (OSError, http.client.HTTPException):
+            return False
+
+    def ensure_running(self) -> None:
+        with self._lock:
+            if self.starting or time.monotonic() < self.retry_at:
+                raise PandocServerError("pandoc server is not available")
+            check_health = False
+            if self.managed and (self.process is None or self.owner_pid != os.getpid()):
+                # Never reuse a server inherited through fork(): it belongs to the parent.
+                self.process = None
+                self._pool = queue.LifoQueue(maxsize=self.pool_size)
+            elif self.managed and self.process.poll() is not None:
+                self.restarts += 1
+            elif time.monotonic() - self.last_health_check > self.health_interval:
+                check_health = True
+            else:
+                return
+            self.starting = True
+        self._start_outside_lock(check_health)
+
+    def restart(self) -> None:
+        with self._lock:
+            if self.starting:
+                raise PandocServerError("pandoc server is not available")
+            self.restarts += 1
+            self.starting = True
+        self._start_outside_lock(False)
+
+    def _start_outside_lock(self, check_health: bool) -> None:
+        # Called by the thread which set self.starting.
+        try:
+            if check_health:
+                if self.is_healthy():
+                    return
+                if not self.managed:
+                    raise PandocServerError("pandoc server at " + self.host + ":" + str(self.port) +
+                                            " is not healthy")
+                self.restarts += 1
+            self.start()
+        except PandocServerError:
+            self.retry_at = time.monotonic() + self.retry_interval
+            raise
+        finally:
+            self.starting = False
+
+    def _acquire(self) -> tuple:
+        # Returns the connection and whether it was used before.
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _post(self, connection: http.client.HTTPConnection, body: bytes) -> bytes:
+        try:
+            connection.request("POST", "/", body=body, headers={"Content-Type": "application/json",
+                                                                 "Accept": "text/plain"})
+            response = connection.getresponse()
+            output = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            raise
+        if response.status != 200:
+            connection.close()
+            raise PandocServerError("pandoc server returned " + str(response.status) + ": " +
+                                    output.decode('utf-8', errors='replace'))
+        self._release(connection)
+        return output
+
+    def convert(self, markdown) -> bytes:
+        self.ensure_running()
+        if type(markdown) is bytes:
+            markdown = markdown.decode('utf-8', errors='replace')  # the server only takes JSON strings
+        body = json.dumps({"text": markdown,
+                           "from": PANDOC_FORMAT,
+                           "to": "json",
+                           "preserve-tabs": True}).encode('utf-8')
+        connection, reused = self._acquire()
+        try:
+            return self._post(connection, body)
+        except (ConnectionResetError, BrokenPipeError):  # RemoteDisconnected is a ConnectionResetError
+            # A pooled keep-alive connection may have been closed by the server in the meantime. Retry once on
+            # a fresh connection and restart a managed server if it is not healthy. Timeouts are not retried:
+            # The same document would only take as long again.
+            if not reused:
+                raise
+            self._close_pool()
+            if self.managed and not self.is_healthy():
+                self.restart()
+            return self._post(self._new_connection(), body)
+
+
+_pandoc_server = None  # type: PandocServer
+_pandoc_server_lock = threading.Lock()
+
+
+def get_pandoc_server() -> PandocServer:
+    global _pandoc_server
+    with _pandoc_server_lock:
+        if _pandoc_server is None:
+            _pandoc_server = PandocServer(url=PANDOC_SERVER_URL,
+                                          pool_size=PANDOC_SERVER_POOL_SIZE,
+                                          timeout=PANDOC_SERVER_TIMEOUT,
+                                          health_interval=PANDOC_SERVER_HEALTH_INTERVAL,
+                                          retry_interval=PANDOC_SERVER_RETRY_INTERVAL)
+            atexit.register(_pandoc_server.stop)
+        return _pandoc_server
+
+
+def convert_markdown(markdown, backend: str = None) -> bytes:
+    if backend is None:
+        backend = PANDOC_BACKEND
+    if backend == "server":
+        try:
+            return get_pandoc_server().convert(markdown)
+        except (PandocServerError, OSError, http.client.HTTPException):
+            pass  # The subprocess is slower but always available.
+    return convert_with_subprocess(markdown)
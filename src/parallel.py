@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Splits big documents in front of top-level magic blocks, so the segments can be read by pandoc and
+# converted in a process pool. helpers.iter_json_from_markdown() assembles the magic block nesting of all
+# segments afterwards, like the incremental conversion does for its chunks.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from block_chunks import split_chunks
+
+PARALLEL_CONVERSION_BYTES = int(os.environ.get("PARALLEL_CONVERSION_BYTES", "0"))  # bigger documents, 0 disables
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", str(os.cpu_count() or 1)))
+
+_executor = None  # type: ProcessPoolExecutor
+_executor_lock = threading.Lock()
+
+
+def split_segments(markdown: str, segment_count: int):
+    # Returns about segment_count segments of similar size, or None if the markdown can not be split safely
+    # (see split_chunks()) or has no magic block to split at.
+    chunks = split_chunks(markdown)
+    if chunks is None:
+        return None
+    segment_size = len(markdown) // max(segment_count, 1)
+    segments = []
+    segment_chunks = []
+    current_size = 0
+    for chunk in chunks:
+        if current_size >= segment_size and chunk.startswith("<!---") and len(segments) < segment_count - 1:
+            segments.append("".join(segment_chunks))
+            segment_chunks = []
+            current_size = 0
+        segment_chunks.append(chunk)
+        current_size += len(chunk)
+    segments.append("".join(segment_chunks))
+    if len(segments) < 2:
+        return None
+    return segments
+
+
+def get_executor() -> ProcessPoolExecutor:
+    # The workers are started by a fork server: A fork of the worker process could copy a lock of the batcher, the
+    # pandoc server or another thread while it is held.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS,
+                                            mp_context=multiprocessing.get_context("forkserver"))
+        return _executor
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Minimal stand-in for `pandoc server` which speaks the same HTTP protocol but converts with the
+# pandoc binary, because not every pandoc build ships the server (it needs the threaded runtime).
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import pypandoc
+
+
+class PandocServerStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()  # client addresses which posted conversions
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/version":
+            self._send(200, pypandoc.get_pandoc_version().encode('utf-8'))
+        else:
+            self._send(404, b"")
+
+    def do_POST(self):
+        PandocServerStubHandler.connections.add(self.client_address)
+        params = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        try:
+            output = pypandoc.convert_text(params['text'], to=params['to'], format=params['from'],
+                                           extra_args=['--preserve-tabs'] if params.get('preserve-tabs') else [])
+        except RuntimeError as ex:
+            self._send(500, str(ex).encode('utf-8'))
+            return
+        self._send(200, output.encode('utf-8'))
+
+
+def create_server(port: int = 0) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer(("127.0.0.1", port), PandocServerStubHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=3030)
+    create_server(parser.parse_args().port).serve_forever()
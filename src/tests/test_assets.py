@@ -0,0 +1,84 @@
+import json
+import os
+import unittest
+from unittest import mock
+import assets
+import fast_json
+from assets import TextSpan, ListingSpan, ContainerSpan, LinkSpan, CtLinkSpan, ParagraphBlock
+from helpers import convert_list, json_from_markdown, merge_spans
+
+
+class TestAssets(unittest.TestCase):
+    def test_dict_view(self):
+        span = TextSpan("span-regular", "Foo")
+        self.assertEqual("span-regular", span['type'])
+        self.assertEqual(("type", "text"), span.keys())
+        self.assertEqual({"type": "span-regular", "text": "Foo"}, span)
+        self.assertEqual(span, TextSpan("span-regular", "Foo"))
+        self.assertNotEqual(span, TextSpan("span-regular", "Bar"))
+        self.assertIsNone(span.get("url"))
+        self.assertIn("text", span)
+        self.assertEqual("{'type': 'span-regular', 'text': 'Foo'}", repr(span))
+        span['text'] = "Bar"
+        self.assertEqual("Bar", span.text)
+        self.assertEqual({"type": "span-link", "link_text": "a", "url": "b"}, LinkSpan("a", "b").as_dict())
+
+    def test_merge_typed_spans(self):
+        self.assertEqual([{"type": "span-regular", "text": "ab"},
+                          {"type": "span-listing", "listing_text": "cd"},
+                          {"type": "span-container", "spans": [1, 2]}],
+                         merge_spans([TextSpan("span-regular", "a"), TextSpan("span-regular", "b"),
+                                      ListingSpan("c"), ListingSpan("d"),
+                                      ContainerSpan([1]), ContainerSpan([2])]))
+
+    def test_write_json(self):
+        values = [
+            ParagraphBlock([TextSpan("span-regular", "Grüße \"\n "), CtLinkSpan(), ContainerSpan([])]),
+            {"type": "block-custom", 1: [None, True, False, 1.5, 3, {}], "spans": [LinkSpan("a", "b")]},
+            [],
+            "text"
+        ]
+        for value in values:
+            with self.subTest(repr(value)):
+                self.assertEqual(fast_json.dumps(value), assets.dumps(value))
+        with mock.patch("fast_json.orjson", None):
+            self.assertEqual(fast_json.dumps(values[0]), assets.dumps(values[0]))
+
+    def test_write_deep_nesting(self):
+        value = TextSpan("span-regular", "Foo")
+        for _ in range(5000):
+            value = ContainerSpan([value])
+        out = bytearray(b",")
+        assets.write_json(value, out)
+        self.assertEqual(b',' + b'{"type":"span-container","spans":[' * 5000 +
+                         b'{"type":"span-regular","text":"Foo"}' + b']}' * 5000, out)
+
+    @unittest.skipIf(assets.TYPED_ASSETS, "TYPED_ASSETS is set")
+    def test_dicts_without_typed_assets(self):
+        blocks = json_from_markdown("Text with [a link](https://ct.de) and <ctlink />.\n\n* Item")
+        self.assertEqual({dict}, {type(asset) for block in blocks for asset in [block] + block.get("spans", [])})
+
+    def test_plain_dicts(self):
+        markdown = "Text with [a link](https://ct.de) and <ctlink />.\n\n* Item *em*"
+        dict_assets = json_from_markdown(markdown)
+        with mock.patch.multiple("helpers", **assets.TYPED_FACTORIES):
+            spans = assets.to_plain(convert_list([{'t': 'Str', 'c': 'Foo.'}], []))
+            typed_assets = json_from_markdown(markdown)
+        self.assertEqual([{"type": "span-regular", "text": "Foo."}], spans)
+        self.assertIs(dict, type(spans[0]))
+        self.assertEqual(fast_json.loads(fast_json.dumps(dict_assets)),
+                         json.loads(json.dumps(assets.to_plain(typed_assets))))
+        self.assertEqual(dict_assets[1], typed_assets[1].as_dict())
+        self.assertIs(dict, type(typed_assets[1].as_dict()["items"][0]))
+
+    def test_same_bytes_as_dicts(self):
+        for file_name in [os.path.join("examples", "1.md"), "mixed_document.md"]:
+            with open(os.path.join(os.path.dirname(__file__), file_name), 'r') as md_file:
+                markdown = md_file.read()
+            dict_assets = json_from_markdown(markdown)
+            with mock.patch.multiple("helpers", **assets.TYPED_FACTORIES):
+                typed_assets = json_from_markdown(markdown)
+            with self.subTest(file_name):
+                self.assertEqual(dict_assets, typed_assets)
+                self.assertEqual(fast_json.dumps(dict_assets), assets.dumps(typed_assets))
+        self.assertIn(ParagraphBlock, [type(block) for block in typed_assets])
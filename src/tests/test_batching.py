@@ -0,0 +1,78 @@
+import json
+import threading
+import unittest
+from batching import MicroBatcher
+from block_chunks import can_be_joined
+from pandoc_backend import convert_markdown
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pandoc_inputs = []
+
+    def counting_convert(self, markdown: str) -> str:
+        self.pandoc_inputs.append(markdown)
+        return convert_markdown(markdown)
+
+    def convert_concurrently(self, batcher: MicroBatcher, markdowns: list) -> list:
+        results = [None] * len(markdowns)
+
+        def convert(index: int):
+            results[index] = batcher.convert(markdowns[index])
+        threads = [threading.Thread(target=convert, args=(i,)) for i in range(len(markdowns))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_documents_share_one_pandoc_run(self):
+        markdowns = ["Teaser *one*", "- a\n- b", "<!---\ncaption: MD_BLOCK\n-->\n\nCaption", "# Author"]
+        batcher = MicroBatcher(window=5.0, max_batch=4, convert=self.counting_convert)
+        results = self.convert_concurrently(batcher, markdowns)
+        self.assertEqual(1, len(self.pandoc_inputs))
+        for markdown, pandoc_tree in zip(markdowns, results):
+            self.assertEqual(json.loads(convert_markdown(markdown))['blocks'], pandoc_tree['blocks'])
+        self.assertEqual({"4": 1}, batcher.stats()["fill_counts"])
+        self.assertEqual(1.0, batcher.stats()["mean_fill"])
+
+    def test_open_blocks_are_converted_alone(self):
+        self.assertFalse(can_be_joined("```\nno end"))
+        self.assertFalse(can_be_joined("[a]\n\n[a]: https://ct.de"))
+        self.assertTrue(can_be_joined("- list\n\n      code"))
+        batcher = MicroBatcher(window=0.0, max_batch=4, convert=self.counting_convert)
+        batcher.convert("```\nno end")
+        self.assertEqual(["```\nno end"], self.pandoc_inputs)
+        self.assertEqual(0, batcher.stats()["batches"])
+
+    def test_big_documents_are_converted_alone(self):
+        batcher = MicroBatcher(window=5.0, max_batch=4, convert=self.counting_convert, max_bytes=10)
+        self.assertEqual("Para", batcher.convert("Grüße Grüß")['blocks'][0]['t'])  # 12 bytes
+        self.assertEqual(["Grüße Grüß"], self.pandoc_inputs)
+        self.assertEqual(0, batcher.stats()["batches"])
+        self.assertFalse(batcher.is_too_big("Grüße Gr"))
+
+    def test_errors_are_reported_per_document(self):
+        def failing_convert(markdown: str) -> str:
+            if "broken" in markdown:
+                raise RuntimeError("pandoc failed")
+            return convert_markdown(markdown)
+        batcher = MicroBatcher(window=5.0, max_batch=2, convert=failing_convert)
+        results = []
+
+        def convert(markdown: str):
+            try:
+                results.append(batcher.convert(markdown)['blocks'][0]['t'])
+            except RuntimeError as error:
+                results.append(str(error))
+        threads = [threading.Thread(target=convert, args=(markdown,)) for markdown in ["fine", "broken"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(["Para", "pandoc failed"], sorted(results))
+        self.assertEqual(1, batcher.stats()["fallbacks"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import os
+import unittest
+import compact_ast
+import fast_json
+from compact_ast import Node
+from helpers import json_from_pandoc_tree, convert_list
+from pandoc_backend import convert_markdown
+
+
+class TestCompactAst(unittest.TestCase):
+    def test_nodes(self):
+        tree = compact_ast.loads(b'{"blocks": [{"t": "Para", "c": [{"t": "Str", "c": "a"}, {"t": "Space"}, ' +
+                                 b'{"t": "Str", "c": "b"}, {"t": "Space"}, ' +
+                                 b'{"t": "Cite", "c": [[{"citationId": "x"}]]}]}]}')
+        para = tree['blocks'][0]
+        self.assertIs(Node, type(para))
+        self.assertEqual("Para", para['t'])
+        self.assertIs(para['c'][1], para['c'][3])
+        self.assertEqual(("t",), para['c'][1].keys())
+        self.assertIs(dict, type(para['c'][4]['c'][0][0]))
+        self.assertEqual({"t": "Str", "c": "a"}, para['c'][0])
+        self.assertEqual("{'t': 'Str', 'c': 'a'}", repr(para['c'][0]))
+        self.assertEqual(b'{"t":"Space"}', fast_json.dumps(para['c'][1]))
+
+    def test_unknown_type_message(self):
+        with self.assertRaises(SyntaxError) as context:
+            convert_list(compact_ast.loads('[{"t": "Strange", "c": "Foo"}]'), [])
+        self.assertEqual("Unknown type: {'t': 'Strange', 'c': 'Foo'}", context.exception.msg)
+
+    def test_same_assets_as_dicts(self):
+        for file_name in [os.path.join("examples", "1.md"), "mixed_document.md"]:
+            with open(os.path.join(os.path.dirname(__file__), file_name), 'r') as md_file:
+                pandoc_json = convert_markdown(md_file.read())
+            with self.subTest(file_name):
+                self.assertEqual(json_from_pandoc_tree(json.loads(pandoc_json)),
+                                 json_from_pandoc_tree(compact_ast.loads(pandoc_json)))
@@ -0,0 +1,62 @@
+import unittest
+from conversion_cache import ConversionCache, cache_key, conversion_cache
+from converter import app
+
+
+class TestConversionCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = ConversionCache(1024)
+        self.assertIsNone(cache.get(b"a"))
+        cache.put(b"a", b"value")
+        self.assertEqual(b"value", cache.get(b"a"))
+        self.assertEqual(1, cache.stats()["hits"])
+        self.assertEqual(1, cache.stats()["misses"])
+        self.assertEqual(6, cache.stats()["bytes"])
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = ConversionCache(30)
+        cache.put(b"a", b"x" * 9)
+        cache.put(b"b", b"x" * 9)
+        cache.put(b"c", b"x" * 9)
+        cache.get(b"a")
+        cache.put(b"d", b"x" * 9)
+        self.assertIsNone(cache.get(b"b"))
+        self.assertIsNotNone(cache.get(b"a"))
+        self.assertEqual(1, cache.stats()["evictions"])
+        self.assertLessEqual(cache.stats()["bytes"], 30)
+
+    def test_oversized_value_is_not_stored(self):
+        cache = ConversionCache(10)
+        cache.put(b"a", b"x" * 10)
+        self.assertEqual(0, cache.stats()["entries"])
+
+    def test_replacing_keeps_byte_count(self):
+        cache = ConversionCache(100)
+        cache.put(b"a", b"x" * 10)
+        cache.put(b"a", b"x" * 20)
+        self.assertEqual(21, cache.stats()["bytes"])
+
+    def test_key_depends_on_content_and_reader(self):
+        self.assertEqual(cache_key(b"Foo", "pandoc"), cache_key(b"Foo", "pandoc"))
+        self.assertNotEqual(cache_key(b"Foo", "pandoc"), cache_key(b"Foo.", "pandoc"))
+        self.assertNotEqual(cache_key(b"Foo", "pandoc"), cache_key(b"Foo", "python"))
+
+
+class TestConvertCaching(unittest.TestCase):
+    def setUp(self) -> None:
+        app.testing = True
+        conversion_cache.clear()
+
+    def test_repeated_request_is_served_from_cache(self):
+        with app.test_client() as test_client:
+            first = test_client.post('/', data="Cached *text*.").data
+            hits = conversion_cache.stats()["hits"]
+            second = test_client.post('/', data="Cached *text*.").data
+            stats = test_client.get('/stats').get_json()
+        self.assertEqual(first, second)
+        self.assertEqual(hits + 1, conversion_cache.stats()["hits"])
+        self.assertIn("evictions", stats["cache"])
+
+
+if __name__ == '__main__':
+    unittest.main()
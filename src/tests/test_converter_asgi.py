@@ -0,0 +1,106 @@
+import asyncio
+import gzip
+import json
+import os
+import unittest
+from unittest import mock
+import converter_asgi
+from converter import app as flask_app
+from converter_asgi import app
+from conversion_cache import conversion_cache
+
+
+async def call_app(method: str, path: str, body: bytes = b"", headers: list = (), messages: list = None) -> tuple:
+    if messages is None:
+        messages = [{"type": "http.request", "body": body[:3], "more_body": True},
+                    {"type": "http.request", "body": body[3:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+    await app({"type": "http", "method": method, "path": path, "headers": list(headers)}, receive, send)
+    if len(sent) == 0:
+        return None, None
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+class TestConverterAsgi(unittest.TestCase):
+    def setUp(self) -> None:
+        conversion_cache.clear()
+
+    def test_same_response_as_flask(self):
+        markdown = "<!---\ntype: block-x\ncontent: MD_BLOCK\n-->\n\n# Head\n\n*Text* \xa5".encode('utf-8')
+        status, body = asyncio.run(call_app("POST", "/", markdown))
+        conversion_cache.clear()
+        with flask_app.test_client() as test_client:
+            expected = test_client.post('/', data=markdown).data
+        self.assertEqual(200, status)
+        self.assertEqual(expected, body)
+
+    def test_many_conversions_in_flight(self):
+        async def convert_all():
+            return await asyncio.gather(*[call_app("POST", "/", ("Paragraph %d" % i).encode('utf-8'))
+                                          for i in range(20)])
+        for i, (status, body) in enumerate(asyncio.run(convert_all())):
+            self.assertEqual(200, status)
+            self.assertEqual("Paragraph %d" % i, json.loads(body)["blocks"][0]["spans"][0]["text"])
+
+    def test_too_large_request(self):
+        with mock.patch("converter_asgi.MAX_REQUEST_BYTES", 10):
+            self.assertEqual(413, asyncio.run(call_app("POST", "/", b"Foo bar baz"))[0])
+            self.assertEqual(200, asyncio.run(call_app("POST", "/", b"Foo bar"))[0])
+
+    def test_blocking_settings_use_the_flask_conversion(self):
+        settings = [("PANDOC_BACKEND", "server"), ("PANDOC_BATCHING", True), ("INCREMENTAL_CONVERSION", True),
+                    ("PIPELINED_PARSING", True), ("PARALLEL_CONVERSION_BYTES", 1)]
+        for name, value in settings:
+            conversion_cache.clear()
+            with self.subTest(name), mock.patch("converter_asgi." + name, value), \
+                    mock.patch("converter_asgi.iter_assets_from_bytes",
+                               wraps=converter_asgi.iter_assets_from_bytes) as iter_mock, \
+                    mock.patch("converter_asgi.convert_with_subprocess_async") as subprocess_mock:
+                status, body = asyncio.run(call_app("POST", "/", b"Foo"))
+                self.assertEqual(200, status)
+                self.assertEqual("Foo", json.loads(body)["blocks"][0]["spans"][0]["text"])
+                self.assertEqual(1, iter_mock.call_count)
+                self.assertEqual(0, subprocess_mock.call_count)
+
+    def test_error_is_not_sent(self):
+        with mock.patch("converter_asgi.MARKDOWN_READER", "pandoc"), \
+                mock.patch("converter_asgi.uses_async_pandoc", return_value=True), \
+                mock.patch("converter_asgi.convert_with_subprocess_async", side_effect=RuntimeError("/secret/path")), \
+                self.assertLogs("converter_asgi", "ERROR"):
+            status, body = asyncio.run(call_app("POST", "/", b"Foo"))
+        flask_app.testing = False
+        with mock.patch("converter.iter_assets_from_bytes", side_effect=RuntimeError("/secret/path")), \
+                flask_app.test_client() as test_client, self.assertLogs(flask_app.logger, "ERROR"):
+            expected = test_client.post('/', data=b"Foo")
+        self.assertEqual((expected.status_code, expected.data), (status, body))
+        self.assertNotIn(b"/secret/path", body)
+
+    def test_compression(self):
+        with open(os.path.join(os.path.dirname(__file__), "examples", "1.md"), 'rb') as md_file:
+            markdown = md_file.read()
+        status, plain = asyncio.run(call_app("POST", "/", markdown))
+        for _ in range(2):  # the second response comes from the cache
+            status, compressed = asyncio.run(call_app("POST", "/", markdown, [(b"accept-encoding", b"br, gzip")]))
+            self.assertEqual(200, status)
+            self.assertEqual(plain, gzip.decompress(compressed))
+
+    def test_disconnect_before_the_end_of_the_body(self):
+        messages = [{"type": "http.request", "body": b"Foo", "more_body": True}, {"type": "http.disconnect"}]
+        with mock.patch("converter_asgi.convert_bytes_async") as convert_mock:
+            self.assertEqual((None, None), asyncio.run(call_app("POST", "/", messages=messages)))
+        self.assertEqual(0, convert_mock.call_count)
+
+    def test_live_and_unknown_routes(self):
+        self.assertEqual((200, b""), asyncio.run(call_app("GET", "/live")))
+        self.assertEqual(405, asyncio.run(call_app("GET", "/"))[0])
+        self.assertEqual(404, asyncio.run(call_app("GET", "/foo"))[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 import unittest
-from helpers import convert_list, convert_list_text_only, json_from_markdown, consume_str
+from unittest import mock
+from helpers import convert_list, convert_list_text_only, json_from_markdown, consume_str, merge_spans, \
+    collect_html_content, HTML_SPAN_CONVERTERS, replace_specials, json_from_pandoc_tree, \
+    iter_json_from_pandoc_tree, load_yaml, pickled_yaml
+from assets import TYPED_ASSETS
 import os
 
 
@@ -49,6 +53,7 @@ class TestConsumeStr(unittest.TestCase):
 
 
 class TestPandocStringConverter(unittest.TestCase):
+    @unittest.skipIf(TYPED_ASSETS, "typed assets are no dicts, see test_assets")
     def test_single_string(self):
         tree = convert_list([
             {'t': 'Str', 'c': 'Foo.'}
@@ -122,6 +127,30 @@ class TestPandocStringConverter(unittest.TestCase):
             {"type": "span-listing", "listing_text": "print(3,1)"}
         ], tree)
 
+    def test_merge_spans(self):
+        self.assertEqual([
+            {"type": "span-regular", "text": "ab"},
+            {"type": "span-container", "spans": [{"type": "span-regular", "text": "c"},
+                                                 {"type": "span-regular", "text": "d"}]},
+            {"type": "span-regular", "text": "e"}
+        ], merge_spans([
+            {"type": "span-regular", "text": "a"},
+            {"type": "span-regular", "text": "b"},
+            {"type": "span-container", "spans": [{"type": "span-regular", "text": "c"}]},
+            {"type": "span-container", "spans": [{"type": "span-regular", "text": "d"}]},
+            {"type": "span-regular", "text": "e"}
+        ]))
+        self.assertEqual([], merge_spans([]))
+
+    def test_long_paragraph_merge(self):
+        words = 100000
+        inlines = [{'t': 'Str', 'c': 'word'}]
+        for _ in range(words - 1):
+            inlines += [{'t': 'Space'}, {'t': 'Str', 'c': 'word'}]
+        tree = convert_list(inlines, [])
+        self.assertEqual(1, len(tree))
+        self.assertEqual(words * 5 - 1, len(tree[0]["text"]))
+
     def test_consume_list_in_link(self):
         tree = convert_list([
             {'t': 'Link',
@@ -211,6 +240,11 @@ class TestPandocStringConverter(unittest.TestCase):
         ])
         self.assertEqual('**some text.**', text)
 
+    def test_convert_text_only_long_list(self):
+        text = convert_list_text_only([{'t': 'Str', 'c': 'word'}, {'t': 'Space'}] * 10000 +
+                                      [{'t': 'Emph', 'c': [{'t': 'Str', 'c': 'end'}]}])
+        self.assertEqual('word ' * 10000 + '*end*', text)
+
     def test_convert_list_quoted_link_strong_emph(self):
         span_list = [
             {'t': 'Str', 'c': 'Write'},
@@ -289,6 +323,58 @@ class TestPandocStringConverter(unittest.TestCase):
             self.assertEqual("  Unknown type: {'t': 'IllegalTypeInQuote'}", ex.msg)
         self.assertRaises(SyntaxError, convert_list, illegal_list, [])
 
+    def test_custom_html_span_converter(self):
+        def convert_kbd(span_elem, spans, block_list, span_type, walker):
+            spans.append({"type": "span-keyboard", "keys": convert_list_text_only(span_elem['c'][2])})
+
+        with mock.patch.dict(HTML_SPAN_CONVERTERS, {"kbd": convert_kbd}):
+            self.assertEqual([{"type": "span-regular", "text": "Press "},
+                              {"type": "span-keyboard", "keys": "Ctrl"}],
+                             json_from_markdown("Press <kbd>Ctrl</kbd>")[0]['spans'])
+        self.assertRaises(SyntaxError, json_from_markdown, "Press <kbd>Ctrl</kbd>")
+
+
+def nested_node(node_types: list, depth: int, leaf: dict) -> dict:
+    node = leaf
+    for i in range(depth):
+        node = {'t': node_types[i % len(node_types)], 'c': [node]}
+    return node
+
+
+class TestDeepNesting(unittest.TestCase):
+    def test_convert_list(self):
+        self.assertEqual([{"type": "span-strong-emphasized", "text": "x"}],
+                         convert_list([nested_node(["Strong", "Emph"], 10000, {'t': 'Str', 'c': 'x'})], []))
+
+    def test_error_context(self):
+        try:
+            convert_list([nested_node(["Emph"], 3, {'t': 'Strange'})], [])
+        except SyntaxError as ex:
+            self.assertEqual("      Unknown type: {'t': 'Strange'}", ex.msg)
+
+    def test_text_only_and_consume_str(self):
+        self.assertEqual("*" * 10000 + "x" + "*" * 10000,
+                         convert_list_text_only([nested_node(["Emph"], 10000, {'t': 'Str', 'c': 'x'})]))
+        self.assertEqual("x", consume_str([nested_node(["Emph"], 10000, {'t': 'Str', 'c': 'x'})]))
+
+    def test_html_content_in_nested_quotes(self):
+        paragraph = {'t': 'Para', 'c': [{'t': 'RawInline', 'c': ['html', '<fs-path>']},
+                                        {'t': 'Str', 'c': 'x'},
+                                        {'t': 'RawInline', 'c': ['html', '</fs-path>']}]}
+        tree = {'blocks': [nested_node(["BlockQuote"], 10000, paragraph)]}
+        with mock.patch("helpers.LOW_MEMORY_CONVERSION", False):  # keeps the grouped blocks in the tree
+            json_from_pandoc_tree(tree)
+        for _ in range(10001):
+            tree = tree['blocks' if 'blocks' in tree else 'c'][0]
+        self.assertEqual([{'t': 'RawInline', 'c': ['html', '</fs-path>', [{'t': 'Str', 'c': 'x'}]]}], tree['c'])
+
+    def test_replace_specials_with_recursive_alias(self):
+        tree = {"a": {"b": 1}}
+        tree["a"]["c"] = tree["a"]
+        replace_specials(tree)
+        self.assertEqual("1", tree["a"]["b"])
+        self.assertIs(tree["a"], tree["a"]["c"])
+
 
 class TestPandocMarkdownConverter(unittest.TestCase):
     def test_two_paragaraps(self):
@@ -833,6 +919,39 @@ class TestPandocMarkdownConverter(unittest.TestCase):
             ]}
         ], block_list)
 
+    def test_tag_across_paragraphs(self):
+        markdown = "A <fs-path>x\n\ny</fs-path> *c*\n\n" + "".join("Line %d.\n\n" % i for i in range(200))
+        block_list = json_from_markdown(markdown)
+        self.assertEqual({"type": "block-paragraph", "spans": [
+            {"type": "span-path", "path": "xA \ny"},
+            {"type": "span-regular", "text": " "},
+            {"type": "span-emphasized", "text": "c"}
+        ]}, block_list[0])
+        self.assertEqual(201, len(block_list))
+
+    def test_blocks_are_yielded_before_an_error_in_a_later_block(self):
+        tree = {'blocks': [
+            {'t': 'Para', 'c': [{'t': 'Str', 'c': 'a'}, {'t': 'RawInline', 'c': ['html', '<abbr>']},
+                                {'t': 'Str', 'c': 'b'}, {'t': 'RawInline', 'c': ['html', '<abbr-long>']},
+                                {'t': 'Str', 'c': 'c'}, {'t': 'RawInline', 'c': ['html', '</abbr-long>']},
+                                {'t': 'RawInline', 'c': ['html', '</abbr>']}]},
+            {'t': 'Para', 'c': [{'t': 'RawInline', 'c': ['html', '</b>']}]}]}
+        assets = iter_json_from_pandoc_tree(tree)
+        self.assertEqual({"type": "block-paragraph", "spans": [
+            {"type": "span-regular", "text": "a"},
+            {"type": "span-abbreviation", "abbreviation": "b", "long_name": "c"}
+        ]}, next(assets))
+        self.assertRaises(KeyError, next, assets)
+
+    def test_collect_html_content_residue(self):
+        tree = [{'t': 'Para', 'c': [{'t': 'RawInline', 'c': ['html', '<b>']}, {'t': 'Str', 'c': 'x'}]},
+                {'t': 'Para', 'c': [{'t': 'RawInline', 'c': ['html', '</b>']}]},
+                {'t': 'Para', 'c': [{'t': 'RawInline', 'c': ['html', '</b>']}]}]
+        html_content = collect_html_content(tree, {}, [])
+        self.assertEqual(2, len(tree))
+        self.assertIs(tree[0]['c'][0]['c'][2], tree[1]['c'][0]['c'][2])
+        self.assertEqual(["b"], list(html_content.keys()))
+
     def test_magic_block_with_conainer_and_ctlink(self):
         markdown = "<!---\ntype: foo\n" + \
                    "content: MD_BLOCK\n-->\n\nText.\n\n<!---\n" + \
@@ -862,6 +981,17 @@ class TestPandocMarkdownConverter(unittest.TestCase):
              'bibliography': []}
             ], block_list)
 
+    def test_memoized_yaml_is_a_copy(self):
+        yaml_text = "\ntype: foo\nlink:\n  link: <ctlink />\nauthors: &a [x, 1]\nreviewers: *a\n"
+        first = load_yaml(yaml_text)
+        first['link']['link'] = None
+        first['authors'].append(2)
+        second = load_yaml(yaml_text)
+        self.assertEqual({'type': 'foo', 'link': {'link': '<ctlink />'},
+                          'authors': ['x', 1], 'reviewers': ['x', 1]}, second)
+        self.assertIs(second['authors'], second['reviewers'])
+        self.assertGreater(pickled_yaml.cache_info().hits, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
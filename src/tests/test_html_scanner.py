@@ -0,0 +1,46 @@
+import unittest
+from html_scanner import scan_tag, is_empty_comment, magic_comment_text
+
+
+class TestScanTag(unittest.TestCase):
+    def assertTag(self, name, closing, empty, properties, raw):
+        tag = scan_tag(raw)
+        self.assertIsNotNone(tag, raw)
+        self.assertEqual((name, closing, empty, properties), (tag.name, tag.closing, tag.empty, tag.properties))
+
+    def test_tags(self):
+        self.assertTag("fs-path", False, False, None, "<fs-path>")
+        self.assertTag("abbr-long", True, False, None, "</abbr-long>")
+        self.assertTag("ctlink", False, True, None, "<ctlink />")
+        self.assertTag("br", False, True, None, "<br/>")
+        self.assertTag("mi", False, False, ' mathvariant="normal"', '<mi mathvariant="normal">')
+        self.assertTag("mo", False, True, ' stretchy="false"', '<mo stretchy="false" />')
+        self.assertTag("a", False, False, None, "<a>\n")
+
+    def test_no_tags(self):
+        for raw in ["", "<>", "</>", "< a>", "<a >", "<a  />", "<a b=c>", '<a b="">', '<a b="c" d="e">',
+                    '<a b="c"d">', "<!--- -->", "<a>\n\n", "<a> ", "a>", "<a", "<a b>"]:
+            self.assertIsNone(scan_tag(raw), raw)
+
+    def test_long_attribute(self):
+        value = "x " * 1000000
+        self.assertEqual(' a="' + value + '"', scan_tag('<mi a="' + value + '">').properties)
+        self.assertIsNone(scan_tag('<mi a="' + value + '" />x'))
+
+
+class TestComments(unittest.TestCase):
+    def test_empty_comment(self):
+        self.assertTrue(is_empty_comment("<!--- -->"))
+        self.assertTrue(is_empty_comment("<!----->"))
+        self.assertTrue(is_empty_comment("<!---\n\t-->\n"))
+        self.assertFalse(is_empty_comment("<!---->"))
+        self.assertFalse(is_empty_comment("<!-- -->"))
+        self.assertFalse(is_empty_comment("<!--- x -->"))
+
+    def test_magic_comment(self):
+        self.assertEqual("\ntype: foo\n", magic_comment_text("<!---\ntype: foo\n-->"))
+        self.assertEqual(" a --> b ", magic_comment_text("<!--- a --> b -->\n"))
+        self.assertEqual("", magic_comment_text("<!----->"))
+        self.assertIsNone(magic_comment_text("<!---->"))
+        self.assertIsNone(magic_comment_text("<!-- a -->"))
+        self.assertIsNone(magic_comment_text("<!--- a --> "))
@@ -0,0 +1,53 @@
+import os
+import unittest
+from unittest import mock
+import helpers
+from helpers import json_from_markdown
+from block_chunks import split_chunks
+from incremental import json_from_markdown_incremental, chunk_cache
+
+
+class TestSplitChunks(unittest.TestCase):
+    def test_split_at_block_boundaries(self):
+        self.assertEqual(["# Head\n\n", "Para\n\n", "<!---\ntype: x\n-->\n"],
+                         split_chunks("# Head\n\nPara\n\n<!---\ntype: x\n-->\n"))
+
+    def test_no_split_inside_blocks(self):
+        self.assertEqual(["```\na\n\nb\n```\n\n", "after"], split_chunks("```\na\n\nb\n```\n\nafter"))
+        self.assertEqual(["<!---\na: b\n\nc: MD_BLOCK\n-->\n\n", "x"],
+                         split_chunks("<!---\na: b\n\nc: MD_BLOCK\n-->\n\nx"))
+        self.assertEqual(["- a\n\n- b\n\n  c\n\n", "d"], split_chunks("- a\n\n- b\n\n  c\n\nd"))
+        self.assertEqual(["> a\n\n> b\n"], split_chunks("> a\n\n> b\n"))
+
+    def test_link_references_are_not_split(self):
+        self.assertIsNone(split_chunks("[a]\n\n[a]: https://ct.de\n"))
+        self.assertIsNone(split_chunks("<div>\n\nx\n\n</div>\n"))
+
+
+class TestIncrementalConversion(unittest.TestCase):
+    def setUp(self) -> None:
+        chunk_cache.clear()
+        with open(os.path.join(os.path.dirname(__file__), "examples", "1.md"), 'r') as md_file:
+            self.article = md_file.read()
+
+    def test_identical_to_full_conversion(self):
+        self.assertEqual(json_from_markdown(self.article), json_from_markdown_incremental(self.article))
+        self.assertEqual(json_from_markdown(self.article), json_from_markdown_incremental(self.article))
+
+    def test_identical_with_tags_across_chunks(self):
+        markdown = "<!---\ntype: block-x\ncontent: MD_BLOCK\n-->\n\nA <fs-path>x\n\ny</fs-path> *c*\n\n" + \
+                   "<!---\nfoo: bar\n-->\n"
+        self.assertEqual(json_from_markdown(markdown), json_from_markdown_incremental(markdown))
+
+    def test_only_edited_chunk_is_converted(self):
+        json_from_markdown_incremental(self.article)
+        edited = self.article.replace("Eine wunderbare Heiterkeit", "Eine große Heiterkeit")
+        with mock.patch("incremental.read_pandoc_tree", wraps=helpers.read_pandoc_tree) as read_mock:
+            blocks = json_from_markdown_incremental(edited)
+        self.assertEqual(1, read_mock.call_count)
+        self.assertLess(len(read_mock.call_args[0][0]), 1000)
+        self.assertEqual(json_from_markdown(edited), blocks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tracemalloc
+import types
+import unittest
+from unittest import mock
+import fast_json
+import lazy_ast
+from compact_ast import Node
+from helpers import json_from_pandoc_tree, json_from_markdown
+from pandoc_backend import convert_markdown, iter_with_subprocess
+
+
+def read_example(file_name: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), file_name), 'r') as md_file:
+        return md_file.read()
+
+
+class TestLazyAst(unittest.TestCase):
+    def test_blocks_are_read_lazily(self):
+        pandoc_json = convert_markdown(read_example("mixed_document.md"))
+        tree = lazy_ast.loads(pandoc_json)
+        self.assertIsInstance(tree['blocks'], types.GeneratorType)
+        expected = fast_json.loads(pandoc_json)
+        self.assertEqual(expected['pandoc-api-version'], tree['pandoc-api-version'])
+        self.assertEqual(expected['blocks'], list(tree['blocks']))
+
+    def test_whitespace_and_compact_form(self):
+        pandoc_json = ' { "meta" : {} , "blocks" : [ {"t": "Para", "c": [{"t": "Space"}]} ,\n{"t": "Null"} ] } '
+        self.assertEqual([{"t": "Para", "c": [{"t": "Space"}]}, {"t": "Null"}],
+                         list(lazy_ast.loads(pandoc_json)['blocks']))
+        with mock.patch("compact_ast.COMPACT_AST", True):
+            self.assertIs(Node, type(next(lazy_ast.loads(pandoc_json)['blocks'])))
+        self.assertEqual([], list(lazy_ast.loads('{"blocks": []}')['blocks']))
+        with self.assertRaises(ValueError):
+            list(lazy_ast.loads('{"blocks": {}}')['blocks'])
+
+    def test_chunks(self):
+        pandoc_json = convert_markdown("# Grüße\n\n" + "\n\n".join("Paragraph %d with *ä*." % i for i in range(50)))
+        expected = fast_json.loads(pandoc_json)
+        for size in [1, 7, 100, len(pandoc_json)]:
+            with self.subTest(size):
+                tree = lazy_ast.loads_chunks(pandoc_json[i:i + size] for i in range(0, len(pandoc_json), size))
+                self.assertEqual(expected['meta'], tree['meta'])
+                self.assertEqual(expected['blocks'], list(tree['blocks']))
+
+    def test_blocks_are_parsed_before_the_end(self):
+        chunks = iter([b'{"blocks":[{"t":"Para","c":[]},', b'{"t":"Null"}', b']}'])
+        blocks = lazy_ast.loads_chunks(chunks)['blocks']
+        self.assertEqual({"t": "Para", "c": []}, next(blocks))
+        self.assertEqual([b'{"t":"Null"}', b']}'], list(chunks))
+
+    def test_pipelined_conversion(self):
+        markdown = read_example("mixed_document.md")
+        with mock.patch("helpers.PIPELINED_PARSING", True), mock.patch("helpers.MARKDOWN_READER", "pandoc"), \
+                mock.patch("helpers.PANDOC_BATCHING", False), mock.patch("helpers.PANDOC_BACKEND", "subprocess"), \
+                mock.patch("helpers.iter_with_subprocess", wraps=iter_with_subprocess) as iter_mock:
+            self.assertEqual(json_from_pandoc_tree(fast_json.loads(convert_markdown(markdown))),
+                             json_from_markdown(markdown))
+        self.assertEqual(1, iter_mock.call_count)
+
+    def test_same_assets_in_low_memory_mode(self):
+        for file_name in [os.path.join("examples", "1.md"), "mixed_document.md"]:
+            pandoc_json = convert_markdown(read_example(file_name))
+            expected = json_from_pandoc_tree(fast_json.loads(pandoc_json))
+            with self.subTest(file_name), mock.patch("helpers.LOW_MEMORY_CONVERSION", True):
+                self.assertEqual(expected, json_from_pandoc_tree(lazy_ast.loads(pandoc_json)))
+                tree = fast_json.loads(pandoc_json)
+                self.assertEqual(expected, json_from_pandoc_tree(tree))
+                self.assertEqual([], tree['blocks'])
+
+    def test_peak_memory_of_10_mb_document(self):
+        # The pandoc JSON of one part is repeated, pandoc would take a minute for 10 MB.
+        word = "Donaudampfschifffahrtsgesellschaftskapitän"
+        paragraph = " ".join([word] * 100)
+        markdown = "# Heading\n\n" + paragraph + " *" + word + "* [link](http://example.com)\n\n" + paragraph
+        copies = 10 * 2 ** 20 // len(markdown.encode('utf-8')) + 1
+        head, _, blocks = convert_markdown(markdown).partition(b'"blocks":[')
+        pandoc_json = head + b'"blocks":[' + b",".join([blocks[:blocks.rindex(b"]")]] * copies) + b"]}"
+        tracemalloc.start()
+        try:
+            with mock.patch("helpers.LOW_MEMORY_CONVERSION", True):
+                assets = json_from_pandoc_tree(lazy_ast.loads(pandoc_json))
+            assets_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(3 * copies, len(assets))
+        self.assertLess(peak_bytes, 4 * assets_bytes)
@@ -0,0 +1,104 @@
+import unittest
+import json
+import os
+from helpers import json_from_markdown
+from markdown_reader import read_markdown, check_against_pandoc, find_difference, \
+    UnsupportedMarkdown, ReaderMismatch
+from pandoc_backend import convert_markdown
+
+EXAMPLES_DIR = os.path.dirname(os.path.realpath(__file__))
+CORPUS_SNIPPETS = [
+    "This is the text of paragraph 1.\n\nThis is the second text.",
+    "The **strong** man *emphasized*: \"I can do ***both***! I can 'strongly' emphasize!\"",
+    "Code can be `inline = 2`. Fascinating!",
+    "An [inline link](https://ct.de \"c't Homepage\") with title.",
+    "As Kayne West said:\n\n> We are living in the future so\n> the present is our past.",
+    "Erste Zeile.\n\n```python\na = 2\n\nprint(a+3)\n```\n\nLetzte Zeile.",
+    "Zeile 1\n\n1. List item\n1. Item 2\n\nAbsatz mit normalem Text\n\n* List item\n* Item 2",
+    "Foo ... is amazing --- so or -- so. \"ABC\" and 'abc'. Mr. Test is watching.",
+    "Foo!\n\n```python\ndef a():\n\tprint(2)\n```\n\nBar.",
+    "Foo.\n\n1. ~~0~~\n1. Punkt 2\n\nBar!",
+    "![Captionism](/foo/img.jpg \"Alt text\")",
+    "Go to <fs-path>/etc/hosts</fs-path> and add <abbr>A<abbr-long>B</abbr-long></abbr> <ctlink /> x",
+    "<!---\ntype: test\nfoo: |\n  MD_BLOCK\n-->\n# H1\n\n<!--- -->",
+    "<math xmlns=\"http://www.w3.org/1998/Math/MathML\">\n<mo>\n∀\n</mo>\n<mi>\nx\n</mi>\n</math>",
+    "Heading\n=======\n\n## Heading\n\n# Heading #",
+    "x `  a   b\nc  ` y ``a`b`` foo_bar_baz _em_ __st__ a*b*c",
+]
+AST_ONLY_SNIPPETS = [  # the converter does not handle these blocks yet
+    "- a\n  - b\n- c\n\n1. a\n2. b\n\n   c\n3. d",
+    "line  \nbreak\\\nescaped \\* \\a &amp; &foo;",
+    "    indented\n\n\tcode\n\nx\n> lazy\nquote",
+]
+
+
+def corpus() -> list:
+    markdown_texts = list(CORPUS_SNIPPETS)
+    for file_name in [os.path.join("examples", "1.md"), "mixed_document.md"]:
+        with open(os.path.join(EXAMPLES_DIR, file_name), 'r') as md_file:
+            markdown_texts.append(md_file.read())
+    return markdown_texts
+
+
+class TestDifferential(unittest.TestCase):
+    def test_corpus_matches_pandoc(self):
+        for markdown in corpus() + AST_ONLY_SNIPPETS:
+            with self.subTest(markdown=markdown[:40]):
+                self.assertEqual(json.loads(convert_markdown(markdown)), read_markdown(markdown))
+
+    def test_differential_reader_mode(self):
+        for markdown in corpus():
+            with self.subTest(markdown=markdown[:40]):
+                self.assertEqual(json_from_markdown(markdown, reader="pandoc"),
+                                 json_from_markdown(markdown, reader="differential"))
+
+    def test_python_reader_gives_same_assets(self):
+        for markdown in corpus():
+            with self.subTest(markdown=markdown[:40]):
+                self.assertEqual(json_from_markdown(markdown, reader="pandoc"),
+                                 json_from_markdown(markdown, reader="python"))
+
+    def test_mismatch_is_reported(self):
+        pandoc_tree = json.loads(convert_markdown("Foo *bar*"))
+        pandoc_tree['blocks'][0]['c'][2]['c'][0]['c'] = "baz"
+        self.assertRaises(ReaderMismatch, check_against_pandoc, "Foo *bar*", pandoc_tree)
+
+    def test_other_pandoc_api_version(self):
+        pandoc_tree = json.loads(convert_markdown("Foo *bar*"))
+        pandoc_tree['pandoc-api-version'] = [1, 22, 2, 1]
+        check_against_pandoc("Foo *bar*", pandoc_tree)
+
+    def test_find_difference_path(self):
+        self.assertIsNone(find_difference({'a': [1, 2]}, {'a': [1, 2]}))
+        self.assertEqual("$.a[1]: 2 != 3", find_difference({'a': [1, 2]}, {'a': [1, 3]}))
+
+
+class TestUnsupportedMarkdown(unittest.TestCase):
+    def test_reference_links(self):
+        markdown = "A [link][ref1] in ref style.\n\n[ref1]: https://ct.de"
+        self.assertRaises(UnsupportedMarkdown, read_markdown, markdown)
+        self.assertEqual(json_from_markdown(markdown, reader="pandoc"),
+                         json_from_markdown(markdown, reader="python"))
+
+    def test_unsupported_constructs(self):
+        for markdown in ["| a | b |\n|---|---|\n| 1 | 2 |",
+                         "<div>\nblock\n</div>",
+                         "See https://ct.de for more.",
+                         "- [ ] task",
+                         "Text[^1]\n\n[^1]: Note",
+                         "> [!NOTE]\n> alert"]:
+            with self.subTest(markdown=markdown):
+                self.assertRaises(UnsupportedMarkdown, read_markdown, markdown)
+
+    def test_fuzzed_differences_are_unsupported(self):
+        # Inputs which pandoc reads differently, found by comparing random snippets with pandoc.
+        for markdown in [',*""\n~~,_*', '# ]_1. # ', ',_b_', '*[*\n ]] ', "[!][a](http://x.de)", 'b\nb.', '#.',
+                         'a\n:', ' \t!', '- a\n-     b', '- x  \n1. y', '# \\  ', '>\n # b', '<b\t>',
+                         '`)\n1. b,`a', '    a\n    \t', '_a<word :>&amp;_']:
+            with self.subTest(markdown=markdown):
+                self.assertRaises(UnsupportedMarkdown, read_markdown, markdown)
+                check_against_pandoc(markdown, json.loads(convert_markdown(markdown)))
+
+
+if __name__ == '__main__':
+    unittest.main()
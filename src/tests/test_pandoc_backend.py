@@ -0,0 +1,180 @@
+import unittest
+import asyncio
+import http.client
+import json
+import fast_json
+from unittest import mock
+import os
+import socket
+import sys
+import threading
+import time
+from pandoc_backend import PandocServer, PandocServerError, PandocPipe, convert_markdown, convert_with_subprocess, \
+    convert_with_subprocess_async, iter_with_subprocess
+from pandoc_server_stub import PandocServerStubHandler, create_server
+
+STUB_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "pandoc_server_stub.py")
+
+
+class TestPandocServerHostMode(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stub_server = create_server()
+        self.stub_thread = threading.Thread(target=self.stub_server.serve_forever, daemon=True)
+        self.stub_thread.start()
+        self.url = "http://127.0.0.1:" + str(self.stub_server.server_address[1])
+        PandocServerStubHandler.connections = set()
+
+    def tearDown(self) -> None:
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+
+    def test_same_tree_as_subprocess(self):
+        markdown = "Some *emphasized* and **strong** text.\n\n\tTabbed code"
+        server = PandocServer(url=self.url)
+        self.assertEqual(json.loads(convert_with_subprocess(markdown)), json.loads(server.convert(markdown)))
+
+    def test_keep_alive_connection_is_reused(self):
+        server = PandocServer(url=self.url, pool_size=2)
+        for _ in range(5):
+            server.convert("Foo")
+        self.assertEqual(1, len(PandocServerStubHandler.connections))
+
+    def test_only_closed_pooled_connections_are_retried(self):
+        server = PandocServer(url=self.url)
+        server.convert("Foo")  # pools a connection
+        with mock.patch.object(server, "_post", side_effect=[http.client.RemoteDisconnected(), b"{}"]) as post_mock:
+            self.assertEqual(b"{}", server.convert("Foo"))
+        self.assertEqual(2, post_mock.call_count)
+        server.convert("Foo")
+        with mock.patch.object(server, "_post", side_effect=socket.timeout()) as post_mock:
+            self.assertRaises(socket.timeout, server.convert, "Foo")
+        self.assertEqual(1, post_mock.call_count)
+        server._close_pool()
+        with mock.patch.object(server, "_post", side_effect=BrokenPipeError()) as post_mock:
+            self.assertRaises(BrokenPipeError, server.convert, "Foo")  # a new connection
+        self.assertEqual(1, post_mock.call_count)
+
+    def test_unreachable_host_server_raises(self):
+        server = PandocServer(url="http://127.0.0.1:1", health_interval=0)
+        self.assertRaises(PandocServerError, server.convert, "Foo")
+
+
+class TestPandocServerWorkerMode(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = PandocServer(command=[sys.executable, STUB_SCRIPT])
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_spawned_lazily(self):
+        self.assertIsNone(self.server.process)
+        self.assertIn("blocks", json.loads(self.server.convert("Foo")))
+        self.assertIsNotNone(self.server.process)
+
+    def test_restart_after_crash(self):
+        self.server.convert("Foo")
+        self.server.process.kill()
+        self.server.process.wait()
+        self.assertIn("blocks", json.loads(self.server.convert("Bar")))
+        self.assertEqual(1, self.server.restarts)
+
+    def test_fails_to_start(self):
+        server = PandocServer(command=[sys.executable, "-c", "import sys; sys.exit(3)"])
+        self.assertRaises(PandocServerError, server.convert, "Foo")
+        self.assertIsNone(server.process)
+        with mock.patch("subprocess.Popen") as popen_mock:
+            self.assertRaises(PandocServerError, server.convert, "Foo")
+        self.assertEqual(0, popen_mock.call_count)
+        self.assertEqual(0, server.restarts)
+
+    def test_missing_command_falls_back(self):
+        server = PandocServer(command=[os.path.join(os.path.dirname(STUB_SCRIPT), "no-pandoc-here")])
+        with mock.patch("pandoc_backend.get_pandoc_server", return_value=server):
+            for _ in range(2):
+                self.assertEqual(json.loads(convert_with_subprocess("Foo")),
+                                 json.loads(convert_markdown("Foo", backend="server")))
+        self.assertIsNone(server.process)
+        self.assertGreater(server.retry_at, time.monotonic())
+
+    def test_no_waiting_for_a_slow_start(self):
+        server = PandocServer(timeout=2, command=[sys.executable, "-c", "import time; time.sleep(10)"])
+        starting = threading.Thread(target=self.assertRaises, args=(PandocServerError, server.convert, "Foo"))
+        starting.start()
+        while server.process is None:
+            time.sleep(0.01)
+        started = time.monotonic()
+        self.assertRaises(PandocServerError, server.convert, "Bar")
+        self.assertLess(time.monotonic() - started, 1)
+        starting.join()
+        self.assertIsNone(server.process)
+
+
+class TestRealPandocServer(unittest.TestCase):
+    def test_convert_or_fall_back_once(self):
+        # pandoc builds without the threaded runtime start `pandoc server`, but drop every connection.
+        server = PandocServer(timeout=10)
+        try:
+            with mock.patch("pandoc_backend.get_pandoc_server", return_value=server):
+                for markdown in ["Foo", "*Bar*", "Baz"]:
+                    started = time.monotonic()
+                    self.assertEqual(json.loads(convert_with_subprocess(markdown)),
+                                     json.loads(convert_markdown(markdown, backend="server")))
+                    self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual(0, server.restarts)
+        finally:
+            server.stop()
+
+
+class TestConvertMarkdown(unittest.TestCase):
+    def test_subprocess_backend(self):
+        self.assertEqual(json.loads(convert_with_subprocess("Foo")),
+                         json.loads(convert_markdown("Foo", backend="subprocess")))
+
+    def test_bytes_in_and_out(self):
+        pandoc_json = convert_with_subprocess("Grüße".encode('utf-8'))
+        self.assertIs(bytes, type(pandoc_json))
+        self.assertEqual(json.loads(convert_with_subprocess("Grüße")), fast_json.loads(pandoc_json))
+        with mock.patch("fast_json.orjson", None):
+            self.assertEqual("Grüße", fast_json.loads(pandoc_json)["blocks"][0]["c"][0]["c"])
+
+    def test_invalid_utf8_is_replaced(self):
+        pandoc_tree = fast_json.loads(convert_with_subprocess(b"a\xa5\xb6"))
+        self.assertEqual("a\ufffd\ufffd", pandoc_tree["blocks"][0]["c"][0]["c"])
+        self.assertEqual(convert_with_subprocess(b"a\xa5\xb6"), b"".join(iter_with_subprocess(b"a\xa5\xb6")))
+
+    def test_invalid_utf8_is_replaced_before_pandoc_starts(self):
+        # A pandoc which echoes its input and warns in no language.
+        command = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())"]
+        with mock.patch("pandoc_backend.pandoc_command", return_value=command):
+            pipe = PandocPipe([b"a\xa5"])
+            pipe.write(b"b\xc3")
+            self.assertEqual(b"a\xef\xbf\xbd", convert_with_subprocess(b"a\xa5"))
+            self.assertEqual(b"a\xef\xbf\xbd", asyncio.run(convert_with_subprocess_async(b"a\xa5")))
+            self.assertEqual(b"a\xef\xbf\xbdb\xef\xbf\xbd", pipe.result())
+
+    def test_output_in_chunks(self):
+        markdown = "\n\n".join("Paragraph %d with *some* words." % i for i in range(5000))
+        with mock.patch("pandoc_backend.OUTPUT_CHUNK_BYTES", 4096):
+            chunks = list(iter_with_subprocess(markdown))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(convert_with_subprocess(markdown), b"".join(chunks))
+
+    def test_error_after_the_output(self):
+        command = [sys.executable, "-c", "import sys; sys.stdout.write('{}'); sys.exit(3)"]
+        with mock.patch("pandoc_backend.pandoc_command", return_value=command):
+            chunks = iter_with_subprocess("Foo")
+            self.assertEqual(b"{}", next(chunks))
+            with self.assertRaises(RuntimeError):
+                next(chunks)
+
+    def test_pipe_output_in_chunks(self):
+        for markdown in [b"Gr\xc3\xbc\xc3", b"\x9fe *a*", b"Foo \xa5"]:
+            with self.subTest(markdown):
+                pipe = PandocPipe([])
+                for i in range(len(markdown)):
+                    pipe.write(markdown[i:i + 1])
+                self.assertEqual(convert_with_subprocess(markdown), b"".join(pipe.iter_result()))
+
+
+if __name__ == '__main__':
+    unittest.main()
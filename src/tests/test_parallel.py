@@ -0,0 +1,76 @@
+import os
+import unittest
+from unittest import mock
+import fast_json
+import helpers
+from helpers import json_from_markdown, segment_events
+from pandoc_backend import convert_markdown
+from parallel import split_segments
+
+
+def read_example(file_name: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), file_name), 'r') as md_file:
+        return md_file.read()
+
+
+class TestSplitSegments(unittest.TestCase):
+    def test_split_before_magic_blocks(self):
+        markdown = "A" * 20 + "\n\n<!---\ntype: block-x\n-->\n\nB\n\n<!---\nend: x\n-->\n\nC\n\nD\n"
+        self.assertEqual(["A" * 20 + "\n\n", "<!---\ntype: block-x\n-->\n\nB\n\n", "<!---\nend: x\n-->\n\nC\n\nD\n"],
+                         split_segments(markdown, 10))
+        self.assertEqual(["A" * 20 + "\n\n<!---\ntype: block-x\n-->\n\nB\n\n", "<!---\nend: x\n-->\n\nC\n\nD\n"],
+                         split_segments(markdown, 2))
+
+    def test_no_split(self):
+        self.assertIsNone(split_segments("A\n\nB\n\nC\n", 4))
+        self.assertIsNone(split_segments("A\n\n<!---\ntype: block-x\n-->\n", 1))
+        self.assertIsNone(split_segments("[a]: http://example.com\n\n<!---\ntype: block-x\n-->\n", 2))
+
+
+class TestParallelConversion(unittest.TestCase):
+    def convert_both(self, markdown: str) -> tuple:
+        try:
+            serial = fast_json.dumps(json_from_markdown(markdown))
+        except Exception as error:
+            serial = repr(error)
+        with mock.patch("helpers.PARALLEL_CONVERSION_BYTES", 1), mock.patch("helpers.PARALLEL_WORKERS", 3), \
+                mock.patch("helpers.get_executor", wraps=helpers.get_executor) as executor_mock:
+            try:
+                parallel = fast_json.dumps(json_from_markdown(markdown))
+            except Exception as error:
+                parallel = repr(error)
+        self.assertEqual(1, executor_mock.call_count)
+        return serial, parallel
+
+    def test_same_output_as_serial(self):
+        example = read_example(os.path.join("examples", "1.md"))
+        documents = [
+            "\n\n".join([example, read_example("mixed_document.md")] * 3),
+            "<!---\ntype: block-x\ncontent: MD_BLOCK\n-->\n\nA\n\n" + example + "\n\n<!---\nend: x\n-->\n\nB",
+            example + "\n\nText <b>bold\n\n" + example + "\n\nmore</b> end\n\n" + example,
+            "<!---\ntype: block-x\n-->\n\nA\n\n" + example
+        ]
+        for i, markdown in enumerate(documents):
+            with self.subTest(i):
+                serial, parallel = self.convert_both(markdown)
+                self.assertEqual(serial, parallel)
+
+    def test_threshold_and_custom_converters(self):
+        markdown = read_example(os.path.join("examples", "1.md"))
+        with mock.patch("helpers.PARALLEL_CONVERSION_BYTES", len(markdown) + 1), \
+                mock.patch("helpers.get_executor") as executor_mock:
+            json_from_markdown(markdown)
+        with mock.patch("helpers.PARALLEL_CONVERSION_BYTES", 1), mock.patch("helpers.get_executor") as custom_mock, \
+                mock.patch.dict(helpers.HTML_SPAN_CONVERTERS, {"custom": helpers.convert_path}):
+            json_from_markdown(markdown)
+        self.assertEqual(0, executor_mock.call_count)
+        self.assertEqual(0, custom_mock.call_count)
+
+    def test_segments_are_read_by_a_pandoc_subprocess(self):
+        with mock.patch("helpers.PANDOC_BATCHING", True), mock.patch("helpers.PANDOC_BACKEND", "server"), \
+                mock.patch("helpers.PIPELINED_PARSING", False), mock.patch("helpers.pandoc_batcher") as batcher_mock, \
+                mock.patch("helpers.convert_markdown", wraps=convert_markdown) as convert_mock:
+            events = fast_json.loads(segment_events("# Head\n\nText.", "pandoc"))
+        self.assertEqual(0, batcher_mock.convert.call_count)
+        convert_mock.assert_called_once_with("# Head\n\nText.", "subprocess")
+        self.assertEqual(["block-heading", "block-paragraph"], [event["type"] for event in events])
@@ -0,0 +1,34 @@
+import unittest
+from tree_walker import TreeWalker
+
+
+def visit_nested(walker: TreeWalker, node) -> None:
+    if type(node) is list:
+        walker.descend(node, visit_nested, leave_nested, 0)
+        walker.output.append("(")
+    else:
+        walker.output.append(node)
+        walker.states[-1] += 1
+
+
+def leave_nested(walker: TreeWalker, state) -> None:
+    walker.output.append(")")
+
+
+class TestTreeWalker(unittest.TestCase):
+    def test_children_before_next_sibling(self):
+        output = []
+        self.assertEqual(2, TreeWalker(output).walk(["a", ["b", ["c"]], "d"], visit_nested, 0))
+        self.assertEqual("a(b(c))d", "".join(output))
+
+    def test_deep_nesting(self):
+        nested = "x"
+        for _ in range(100000):
+            nested = [nested]
+        output = []
+        TreeWalker(output).walk([nested], visit_nested, 0)
+        self.assertEqual("(" * 100000 + "x" + ")" * 100000, "".join(output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,13 @@
 from converter import app, request
+import converter
+from conversion_cache import conversion_cache
+from helpers import iter_json_from_markdown
+import fast_json
+from unittest import mock
 from typing import Union
 import unittest
+import gzip
+import io
 import os
 import json
 
@@ -624,5 +631,161 @@ class RequestContextTestCase(unittest.TestCase):
             self.assertEqual(request.get_data(as_text=True), markdown)
 
 
+class BatchTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        app.testing = True
+
+    def test_json_batch_keeps_order(self):
+        documents = ["# Heading %d" % i for i in range(20)]
+        with app.test_client() as test_client:
+            response = test_client.post('/batch', json=documents)
+            trees = response.get_json()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([{"type": "conversion-container",
+                           "blocks": [{"type": "block-heading", "heading": "Heading %d" % i}]}
+                          for i in range(20)], trees)
+
+    def test_errors_do_not_fail_the_batch(self):
+        with app.test_client() as test_client, self.assertLogs(app.logger, "ERROR") as logs:
+            response = test_client.post('/batch', json=["Fine.", "Unknown <span>tag</span>."])
+            trees = response.get_json()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("conversion-container", trees[0]["type"])
+        self.assertEqual({"type": "conversion-error", "error": "SyntaxError"}, trees[1])
+        self.assertIn("Unknown type", "\n".join(logs.output))
+
+    def test_multipart_batch(self):
+        with app.test_client() as test_client:
+            response = test_client.post('/batch', content_type='multipart/form-data', data={
+                "documents": [(io.BytesIO(b"One."), "1.md"), (io.BytesIO(b"\xa5"), "2.md")]})
+            trees = response.get_json()
+        self.assertEqual("One.", trees[0]["blocks"][0]["spans"][0]["text"])
+        self.assertEqual("\ufffd", trees[1]["blocks"][0]["spans"][0]["text"])
+
+    def test_mixed_multipart_batch_keeps_order(self):
+        boundary = "b0undary"
+        parts = [("file", "First."), ("field", "Second."), ("file", "Third."), ("field", "Fourth.")]
+        body = "".join("--" + boundary + "\r\nContent-Disposition: form-data; name=\"document\"" +
+                       ("; filename=\"document.md\"" if kind == "file" else "") + "\r\n\r\n" + text + "\r\n"
+                       for kind, text in parts) + "--" + boundary + "--\r\n"
+        with app.test_client() as test_client, mock.patch("converter.REQUEST_CHUNK_BYTES", 7):
+            response = test_client.post('/batch', data=body.encode('utf-8'),
+                                        content_type='multipart/form-data; boundary=' + boundary)
+            trees = response.get_json()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([text for _, text in parts], [tree["blocks"][0]["spans"][0]["text"] for tree in trees])
+
+    def test_invalid_batch(self):
+        with app.test_client() as test_client:
+            response = test_client.post('/batch', json={"markdown": "Foo"})
+            self.assertEqual(400, response.status_code)
+            response = test_client.post('/batch', data=b"--b\r\nContent-Disposition: form-data; name=\"a\"\r\n\r\nA",
+                                        content_type='multipart/form-data; boundary=b')
+            self.assertEqual(400, response.status_code)
+
+
+class StreamingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        app.testing = True
+        conversion_cache.clear()
+
+    def test_streamed_response_is_identical(self):
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), "examples", "1.md"), 'r') as md_file:
+            markdown = md_file.read()
+        with app.test_client() as test_client:
+            buffered = test_client.post('/', data=markdown)
+            conversion_cache.clear()
+            with mock.patch("converter.STREAM_RESPONSES", True):
+                streamed = test_client.post('/', data=markdown)
+                self.assertEqual(buffered.data, streamed.data)
+                hits = conversion_cache.stats()["hits"]
+                self.assertEqual(buffered.data, test_client.post('/', data=markdown).data)
+        self.assertEqual(hits + 1, conversion_cache.stats()["hits"])
+
+    def test_errors_in_streamed_responses(self):
+        app.testing = False
+        # The incremental conversion converts all chunks before the first asset.
+        with app.test_client() as test_client, mock.patch("converter.STREAM_RESPONSES", True), \
+                mock.patch("converter.INCREMENTAL_CONVERSION", False):
+            with self.assertLogs(app.logger, "ERROR"):
+                first = test_client.post('/', data="Unknown <span>tag</span>.")
+            with self.assertLogs(app.logger, "ERROR"):
+                later = test_client.post('/', data="First para.\n\nUnknown <span>tag</span>.")
+                later_data = later.data
+        self.assertEqual(500, first.status_code)
+        self.assertEqual(200, later.status_code)
+        # The response ends after the last complete asset, so it is no valid JSON.
+        self.assertEqual(b'{"type":"conversion-container","blocks":[' +
+                         fast_json.dumps({"type": "block-paragraph",
+                                          "spans": [{"type": "span-regular", "text": "First para."}]}), later_data)
+        self.assertEqual(0, conversion_cache.stats()["entries"])
+
+    def test_iter_assets_yields_finished_blocks(self):
+        assets = iter_json_from_markdown("<!---\ntype: block-x\ncontent: MD_BLOCK\n-->\n\nIn x.\n\n" +
+                                         "<!---\nend: here\n-->\n\nAfter x.")
+        self.assertEqual("block-x", next(assets)["type"])
+        self.assertEqual("block-paragraph", next(assets)["type"])
+        self.assertIsNone(next(assets, None))
+
+
+class RequestTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        app.testing = True
+        conversion_cache.clear()
+
+    def test_too_large_request(self):
+        with mock.patch.dict(app.config, {"MAX_CONTENT_LENGTH": 10}):
+            with app.test_client() as test_client:
+                self.assertEqual(413, test_client.post('/', data=b"Foo bar baz").status_code)
+                self.assertEqual(200, test_client.post('/', data=b"Foo bar").status_code)
+
+    def test_request_piped_to_pandoc(self):
+        markdown = "# Head\n\nFoo *bar*.\n\n".encode('utf-8') + b"Strange \xa5\xb6 bytes"
+        with app.test_client() as test_client:
+            expected = test_client.post('/', data=markdown).data
+            conversion_cache.clear()
+            with mock.patch("converter.REQUEST_CHUNK_BYTES", 4), \
+                    mock.patch("converter.pipe_to_pandoc", return_value=True), \
+                    mock.patch("converter.PandocPipe", wraps=converter.PandocPipe) as pipe_mock:
+                self.assertEqual(expected, test_client.post('/', data=markdown).data)
+                self.assertEqual(expected, test_client.post('/', data=markdown).data)  # from the cache
+        self.assertEqual(2, pipe_mock.call_count)
+        self.assertIn("Strange \ufffd\ufffd bytes", expected.decode('utf-8'))
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        app.testing = True
+        streaming_patch = mock.patch("converter.STREAM_RESPONSES", False)  # streamed responses are not compressed
+        streaming_patch.start()
+        self.addCleanup(streaming_patch.stop)
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), "examples", "1.md"), 'r') as md_file:
+            self.markdown = md_file.read()
+
+    def test_big_response_is_gzipped(self):
+        with app.test_client() as test_client:
+            plain = test_client.post('/', data=self.markdown)
+            for _ in range(2):  # the second response comes from the cache
+                compressed = test_client.post('/', data=self.markdown, headers={"Accept-Encoding": "br, gzip"})
+                self.assertEqual("gzip", compressed.headers["Content-Encoding"])
+                self.assertEqual(plain.data, gzip.decompress(compressed.data))
+        self.assertIsNone(plain.headers.get("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+    def test_small_or_refused_responses_are_not_compressed(self):
+        with app.test_client() as test_client:
+            small = test_client.post('/', data="Small.", headers={"Accept-Encoding": "gzip"})
+            refused = test_client.post('/', data=self.markdown, headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertIsNone(small.headers.get("Content-Encoding"))
+        self.assertIsNone(refused.headers.get("Content-Encoding"))
+
+    def test_fallback_serializer(self):
+        data = {"type": "block-x", 1: ["ä", None, "\""]}
+        with mock.patch("fast_json.orjson", None):
+            fallback_bytes = fast_json.dumps(data)
+        self.assertEqual(fast_json.dumps(data), fallback_bytes)
+        self.assertEqual({"type": "block-x", "1": ["ä", None, "\""]}, json.loads(fallback_bytes))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+
+class TreeWalker:
+    # Walks nested lists of nodes with an explicit stack instead of recursion, so the nesting depth of a
+    # document is only limited by memory. visit(walker, node) handles one node. It may call
+    # walker.descend() to walk a list of children before the next sibling. leave(walker, state) runs
+    # after the last child. The state of the current list is walker.states[-1] and output is shared
+    # by all lists of a walk.
+    __slots__ = ("iterators", "visits", "leaves", "states", "output")
+
+    def __init__(self, output=None):
+        self.iterators = []
+        self.visits = []
+        self.leaves = []
+        self.states = []
+        self.output = output
+
+    @property
+    def depth(self) -> int:
+        # The number of lists above the root list, for messages of errors raised in visit.
+        return len(self.iterators) - 1
+
+    def descend(self, nodes, visit, leave=None, state=None) -> None:
+        # Lists passed by one visit call are walked in reverse order.
+        self.iterators.append(iter(nodes))
+        self.visits.append(visit)
+        self.leaves.append(leave)
+        self.states.append(state)
+
+    def walk(self, nodes, visit, state=None):
+        # Returns the state of the root list.
+        iterators = self.iterators
+        self.descend(nodes, visit, None, state)
+        while len(iterators) > 0:
+            depth = len(iterators)
+            visit = self.visits[-1]
+            for node in iterators[-1]:
+                visit(self, node)
+                if len(iterators) != depth:
+                    break
+            else:
+                iterators.pop()
+                self.visits.pop()
+                leave = self.leaves.pop()
+                state = self.states.pop()
+                if leave is not None:
+                    leave(self, state)
+        return state